@@ -1,11 +1,18 @@
 import server
 from .config import register_custom_paths
-from .downloader import handle_download_request, handle_get_active_tasks, handle_cancel_request
+from .downloader import handle_download_request, handle_get_active_tasks, handle_cancel_request, handle_pause_request, handle_resume_request
 from .search import handle_fix_request
+from .materialize import handle_materialize_request
+from .metrics import handle_metrics_request
+from .catalog import handle_catalog_request
+from .file_index import model_index
 
 # 初始化路径映射
 register_custom_paths()
 
+# 后台预热模型文件索引（可用时启用 watchdog 文件监听）
+model_index.start()
+
 # 注册 API 路由
 @server.PromptServer.instance.routes.post("/model_path_fixer/fix")
 async def route_fix(request):
@@ -15,14 +22,34 @@ async def route_fix(request):
 async def route_download(request):
     return await handle_download_request(request)
 
+@server.PromptServer.instance.routes.post("/model_path_fixer/materialize")
+async def route_materialize(request):
+    return await handle_materialize_request(request)
+
 @server.PromptServer.instance.routes.post("/model_path_fixer/cancel")
 async def route_cancel(request):
     return await handle_cancel_request(request)
 
+@server.PromptServer.instance.routes.post("/model_path_fixer/pause")
+async def route_pause(request):
+    return await handle_pause_request(request)
+
+@server.PromptServer.instance.routes.post("/model_path_fixer/resume")
+async def route_resume(request):
+    return await handle_resume_request(request)
+
 @server.PromptServer.instance.routes.get("/model_path_fixer/active_tasks")
 async def route_active(request):
     return await handle_get_active_tasks(request)
 
+@server.PromptServer.instance.routes.get("/model_path_fixer/catalog")
+async def route_catalog(request):
+    return await handle_catalog_request(request)
+
+@server.PromptServer.instance.routes.get("/model_path_fixer/metrics")
+async def route_metrics(request):
+    return await handle_metrics_request(request)
+
 NODE_CLASS_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS = {}
 WEB_DIRECTORY = "./web"
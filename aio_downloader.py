@@ -0,0 +1,277 @@
+import os
+import sys
+import time
+import asyncio
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+from .config import (
+    DOWNLOAD_RETRIES, AIO_LIMIT_PER_HOST, AIO_WRITE_CHUNK_SIZE, AIO_WRITER_THREADS, PART_STATE_SAVE_INTERVAL,
+    DOWNLOAD_PROBE_TIMEOUT
+)
+from .downloader import (
+    USER_AGENT, PermanentDownloadError, parse_content_range, check_html_response, part_paths, clear_part,
+    save_part_state, prepare_range_state, finalize_part, retry_delay, ProgressPrinter, report_progress,
+    remote_sha256, contiguous_done, ensure_disk_space
+)
+from .sources import source_router, SourceRoute, SlowSourceError
+from .diskspace import is_disk_full, preallocate
+
+# 所有下载共用一个 ClientSession：同一镜像的多个任务复用 keep-alive 连接
+_session = None
+# 磁盘写入统一交给小型线程池，事件循环只负责网络 IO
+_writer = ThreadPoolExecutor(max_workers=AIO_WRITER_THREADS, thread_name_prefix="path_fixer_writer")
+
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=AIO_LIMIT_PER_HOST, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'User-Agent': USER_AGENT})
+    return _session
+
+def is_transient_aio_error(e):
+    if isinstance(e, SlowSourceError): return True
+    if isinstance(e, PermanentDownloadError) or is_disk_full(e): return False
+    if isinstance(e, aiohttp.ClientResponseError): return e.status in (408, 425, 429) or e.status >= 500
+    return True
+
+# 哈希计算与写盘一起放在写线程，不占用事件循环
+def _write_at(path, offset, data, hasher=None):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+    if hasher: hasher.update_at(offset, data)
+
+def _append(path, offset, data, hasher=None):
+    with open(path, 'ab') as f:
+        f.write(data)
+    if hasher: hasher.update_at(offset, data)
+
+def _truncate(path, size):
+    with open(path, 'wb') as f:
+        f.truncate(size)
+
+def _ensure_part(part_path, size):
+    if not os.path.exists(part_path) or os.path.getsize(part_path) != size: preallocate(part_path, size)
+
+async def _iter_batches(response, cancel_event, on_chunk=None):
+    # 把网络小块攒成大块再交给写线程，减少线程切换和系统调用；on_chunk(攒批中的字节数) 按网络块回调
+    buffer = bytearray()
+    async for chunk in response.content.iter_chunked(256 * 1024):
+        if cancel_event.is_set(): return
+        buffer += chunk
+        if on_chunk: on_chunk(len(buffer))
+        if len(buffer) >= AIO_WRITE_CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer: yield bytes(buffer)
+
+async def _throttle(throttle_delay, n):
+    if throttle_delay:
+        delay = throttle_delay(n)
+        if delay > 0: await asyncio.sleep(delay)
+
+async def _stream_single(response, part_path, filename_for_msg, cancel_event, total_size, throttle_delay, hasher, watch=None):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_writer, _truncate, part_path, 0)
+    printer = ProgressPrinter(filename_for_msg, total_size)
+    downloaded_size = 0
+    # 慢速时攒满一批要很久，测速按网络块进行
+    on_chunk = (lambda buffered: watch.check(downloaded_size + buffered)) if watch else None
+    async for data in _iter_batches(response, cancel_event, on_chunk):
+        await loop.run_in_executor(_writer, _append, part_path, downloaded_size, data, hasher)
+        downloaded_size += len(data)
+        printer.update(downloaded_size)
+        await _throttle(throttle_delay, len(data))
+    if cancel_event.is_set(): return False, downloaded_size
+    if total_size and downloaded_size != total_size:
+        raise Exception(f"网络中断: 数据不完整 {downloaded_size}/{total_size}")
+    return True, downloaded_size
+
+async def _stream_ranges(session, url, save_path, filename_for_msg, cancel_event, state, throttle_delay, hasher, watch=None):
+    loop = asyncio.get_running_loop()
+    part_path, _ = part_paths(save_path)
+    total_size = state["size"]
+    await loop.run_in_executor(_writer, _ensure_part, part_path, total_size)
+
+    segments = state["segments"]
+    extra = {"If-Range": state["etag"]} if state.get("etag") and not state["etag"].startswith("W/") else {}
+
+    def downloaded():
+        return sum(seg[2] - seg[0] for seg in segments)
+
+    def snapshot():
+        # 写线程保存事件循环上取的快照：写盘期间各 fetch 仍在推进分段进度
+        return dict(state, segments=[list(seg) for seg in segments])
+
+    async def fetch(seg):
+        headers = dict(extra, Range=f"bytes={seg[2]}-{seg[1]}")
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            content_range = parse_content_range(response.headers.get('Content-Range', ''))
+            if response.status != 206 or not content_range or content_range[0] != seg[2]:
+                raise Exception("服务器文件已变化或未按分段返回数据")
+            async for data in _iter_batches(response, cancel_event):
+                data = data[:seg[1] - seg[2] + 1]
+                await loop.run_in_executor(_writer, _write_at, part_path, seg[2], data, hasher)
+                seg[2] += len(data)
+                await _throttle(throttle_delay, len(data))
+                if seg[2] > seg[1]: break
+        if not cancel_event.is_set() and seg[2] <= seg[1]: raise Exception("分段数据提前结束")
+
+    slow = []
+    saving = []
+
+    async def monitor(fetches):
+        printer = ProgressPrinter(filename_for_msg, total_size, downloaded())
+        last_save = loop.time()
+        while True:
+            await asyncio.sleep(0.5)
+            printer.update(downloaded())
+            if watch:
+                try: watch.check(downloaded())
+                except SlowSourceError as e:
+                    # 取消各分段，进度已记录在 segments 中，换端点后从断点继续
+                    slow.append(e)
+                    fetches.cancel()
+                    return
+            if hasher: await loop.run_in_executor(_writer, hasher.catch_up, part_path, contiguous_done(segments))
+            if loop.time() - last_save > PART_STATE_SAVE_INTERVAL:
+                # monitor 被取消时保存仍在写线程进行，由下面的 finally 等它结束，避免两次保存同时写临时文件
+                saving[:] = [loop.run_in_executor(_writer, save_part_state, save_path, snapshot())]
+                await asyncio.shield(saving[0])
+                last_save = loop.time()
+
+    fetches = asyncio.gather(*(fetch(seg) for seg in segments if seg[2] <= seg[1]), return_exceptions=True)
+    monitor_task = asyncio.ensure_future(monitor(fetches))
+    try:
+        results = await fetches
+    except asyncio.CancelledError:
+        if not slow: raise
+        results = slow
+    finally:
+        monitor_task.cancel()
+        if saving: await asyncio.wait(saving)
+        await loop.run_in_executor(_writer, save_part_state, save_path, snapshot())
+
+    if cancel_event.is_set(): return False, downloaded()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors: raise errors[0]
+    if downloaded() != total_size: raise Exception("分段下载大小不一致")
+    return True, total_size
+
+async def _attempt_download(session, url, save_path, filename_for_msg, cancel_event, throttle_delay, hasher, stats, watch=None):
+    loop = asyncio.get_running_loop()
+    part_path, _ = part_paths(save_path)
+    if hasher: hasher.reset()
+    # 与同步引擎一致：Range: bytes=0-0 探测，服务器忽略 Range 时直接沿用该响应
+    async with session.get(url, headers={"Range": "bytes=0-0"}) as response:
+        response.raise_for_status()
+        if stats: stats.first_byte()
+        headers = response.headers
+        if hasher: hasher.remote_hash = remote_sha256(headers)
+        content_range = parse_content_range(headers.get('Content-Range', ''))
+        ranged = response.status == 206 and content_range and content_range[2]
+        if not ranged:
+            total_size = int(headers.get('Content-Length', 0)) if response.status != 206 else 0
+            check_html_response(headers.get('Content-Type', ''), total_size)
+            # 删除旧分段、查询磁盘空间都是阻塞调用，放到写线程
+            await loop.run_in_executor(_writer, clear_part, save_path)
+            await loop.run_in_executor(_writer, ensure_disk_space, save_path, total_size)
+            if response.status != 206:
+                ok, size = await _stream_single(response, part_path, filename_for_msg, cancel_event, total_size, throttle_delay, hasher, watch)
+                return ok, size, total_size
+        else:
+            remote = {"url": url, "size": content_range[2], "etag": headers.get('ETag', ''), "last_modified": headers.get('Last-Modified', ''),
+                      "sha256": remote_sha256(headers)}
+            check_html_response(headers.get('Content-Type', ''), remote["size"])
+
+    if not ranged:
+        # 返回 206 却没有总大小：重新发起完整请求
+        async with session.get(url) as full_response:
+            full_response.raise_for_status()
+            ok, size = await _stream_single(full_response, part_path, filename_for_msg, cancel_event, 0, throttle_delay, hasher, watch)
+            return ok, size, 0
+
+    # 读取 / 校验续传状态、检查磁盘空间、保存新状态
+    state = await loop.run_in_executor(_writer, prepare_range_state, save_path, remote, filename_for_msg)
+    ok, size = await _stream_ranges(session, url, save_path, filename_for_msg, cancel_event, state, throttle_delay, hasher, watch)
+    return ok, size, remote["size"]
+
+async def probe_endpoint_async(session, url):
+    # 与 downloader.probe_endpoint 相同的探测，走共享 ClientSession
+    start = time.perf_counter()
+    try:
+        async with session.get(url, headers={"Range": "bytes=0-0"}, timeout=aiohttp.ClientTimeout(total=DOWNLOAD_PROBE_TIMEOUT)) as response:
+            response.raise_for_status()
+            latency = time.perf_counter() - start
+            headers = response.headers
+            content_range = parse_content_range(headers.get('Content-Range', ''))
+            size = content_range[2] if response.status == 206 and content_range else int(headers.get('Content-Length', 0))
+            check_html_response(headers.get('Content-Type', ''), size)
+            return {"ok": True, "latency": latency, "size": size, "sha256": remote_sha256(headers)}
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return {"ok": False, "permanent": not is_transient_aio_error(e), "error": str(e)}
+
+async def plan_route_async(urls):
+    if len(urls) < 2 or not DOWNLOAD_PROBE_TIMEOUT: return SourceRoute(urls, source_router)
+    session = get_session()
+    tasks = {asyncio.ensure_future(probe_endpoint_async(session, url)): i for i, url in enumerate(urls)}
+    results = [None] * len(urls)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = DOWNLOAD_PROBE_TIMEOUT - (loop.time() - start)
+            if remaining <= 0: break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done: results[tasks[task]] = task.result()
+            if source_router.decided(results, loop.time() - start): break
+    except BaseException:
+        for task in pending: task.cancel()
+        raise
+    # 未返回的探测继续进行（受 DOWNLOAD_PROBE_TIMEOUT 限制），下载中途据其结果判断能否因过慢切换过去
+    return source_router.route(urls, results, {tasks[t]: t for t in pending})
+
+async def download_async(url, save_path, filename_for_msg, cancel_event, throttle_delay=None, hasher=None, stats=None):
+    # url 可以是单个链接，也可以是探测排序后的 SourceRoute
+    route = url if isinstance(url, SourceRoute) else SourceRoute([url])
+    print(f"\n⬇️ [Path Fixer] 启动下载: {filename_for_msg}")
+    session = get_session()
+    attempt = 0
+    while True:
+        try:
+            ok, downloaded_size, total_size = await _attempt_download(session, route.url, save_path, filename_for_msg, cancel_event, throttle_delay, hasher, stats, route.watch())
+            if not ok:
+                print(f"\n🚫 [Path Fixer] 已停止: {filename_for_msg}")
+                return False, "用户中断"
+            if hasher: await asyncio.get_running_loop().run_in_executor(_writer, hasher.finish, part_paths(save_path)[0], downloaded_size)
+            await asyncio.get_running_loop().run_in_executor(_writer, finalize_part, save_path, total_size)
+            sys.stdout.write(f"\r✅ 下载完成 [{filename_for_msg}]: 100%                 \n")
+            sys.stdout.flush()
+            report_progress(filename_for_msg, downloaded_size, total_size)
+            return True, ""
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            sys.stdout.write("\n")
+            if not is_disk_full(e) and route.failover(e, is_transient_aio_error(e)):
+                print(f"🔀 [Path Fixer] 切换下载源 → {route.endpoint}: {e}")
+                continue
+            attempt += 1
+            if not is_transient_aio_error(e) or attempt > DOWNLOAD_RETRIES:
+                return False, str(e)
+            delay = retry_delay(attempt)
+            print(f"⚠️ [Path Fixer] 下载出错，{delay:.0f} 秒后重试 ({attempt}/{DOWNLOAD_RETRIES}): {e}")
+            if stats: stats.retry()
+            # threading.Event 无法 await，按小步轮询中断标志
+            waited = 0
+            while waited < delay:
+                if cancel_event.is_set():
+                    print(f"\n🚫 [Path Fixer] 用户中断: {filename_for_msg}")
+                    return False, "用户中断"
+                await asyncio.sleep(0.2)
+                waited += 0.2
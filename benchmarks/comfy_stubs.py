@@ -0,0 +1,71 @@
+import os
+import sys
+import types
+import importlib
+
+# 基准测试用的最小 ComfyUI 替身：只实现插件实际用到的 folder_paths / server 接口
+MODEL_TYPES = [
+    "checkpoints", "loras", "vae", "clip", "unet", "diffusion_models", "text_encoders",
+    "controlnet", "clip_vision", "upscale_models", "embeddings", "latent_upscale_models"
+]
+SUPPORTED_PT_EXTENSIONS = {".ckpt", ".pt", ".pt2", ".bin", ".pth", ".safetensors", ".pkl", ".sft", ".gguf"}
+
+class _Routes:
+    def _decorator(self, path):
+        return lambda handler: handler
+    get = post = _decorator
+
+class _PromptServer:
+    instance = None
+
+    def __init__(self):
+        self.routes = _Routes()
+        self.loop = None
+        self.messages = 0
+
+    def send_sync(self, event, data, sid=None):
+        self.messages += 1
+
+def set_models_dir(models_dir):
+    fp = sys.modules["folder_paths"]
+    fp.models_dir = models_dir
+    fp.folder_names_and_paths.clear()
+    for m_type in MODEL_TYPES:
+        fp.folder_names_and_paths[m_type] = ([os.path.join(models_dir, m_type)], set(SUPPORTED_PT_EXTENSIONS))
+
+def install(models_dir):
+    fp = types.ModuleType("folder_paths")
+    fp.supported_pt_extensions = set(SUPPORTED_PT_EXTENSIONS)
+    fp.folder_names_and_paths = {}
+
+    def get_folder_paths(name):
+        return list(fp.folder_names_and_paths[name][0])
+
+    def add_model_folder_path(name, path, is_default=False):
+        paths = fp.folder_names_and_paths.setdefault(name, ([], set()))[0]
+        if path not in paths: paths.append(path)
+
+    fp.get_folder_paths = get_folder_paths
+    fp.add_model_folder_path = add_model_folder_path
+    sys.modules["folder_paths"] = fp
+    set_models_dir(models_dir)
+
+    srv = types.ModuleType("server")
+    srv.PromptServer = _PromptServer
+    _PromptServer.instance = _PromptServer()
+    sys.modules["server"] = srv
+    return fp, srv
+
+def load_package(repo_dir, name="path_fixer", **config_overrides):
+    # 不执行插件 __init__（注册路由、后台预热），直接以包名加载各模块；
+    # 配置项需在其他模块 import 之前覆盖，因为它们以 from .config import 方式取值
+    package = types.ModuleType(name)
+    package.__path__ = [repo_dir]
+    package.__package__ = name
+    sys.modules[name] = package
+    config = importlib.import_module(f"{name}.config")
+    for key, value in config_overrides.items(): setattr(config, key, value)
+    return package
+
+def import_module(name, module):
+    return importlib.import_module(f"{name}.{module}")
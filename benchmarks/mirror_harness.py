@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import comfy_stubs
+from run_benchmarks import serve_payload
+
+# 多端点下载的本地验证：用带延迟 / 限速 / 错误码的 Range 替身模拟镜像，检查探测排序与中途切换。
+#   python benchmarks/mirror_harness.py [--aio] [--size-mb 4]
+# 全部场景通过返回 0，否则返回 1
+
+PACKAGE = "path_fixer"
+MIN_SPEED = 1024 * 1024
+# discard 端口：连接被拒绝，探测失败但仍作为出错时的后备
+DEAD = None
+
+# (名称, [(端点, serve_payload 参数 | DEAD)], 并发数, 期望完成下载的端点 | None 表示期望失败)
+SCENARIOS = [
+    # 404 剔除，连接被拒绝排最后，探测选出首字节最快的端点
+    ("probe_ranks", [("missing", {"status": 404}), ("dead", DEAD), ("slow", {"latency": 0.3}), ("fast", {})], 1, "fast"),
+    # 探测选中的端点传输过慢：切换到另一个探测可用的端点（与 shared_link 相同的限速，单独下载时应切换）
+    ("slow_failover", [("slow", {"ranges": False, "rate": MIN_SPEED // 2}), ("fast", {"latency": 0.05})], 1, "fast"),
+    # 后面只有探测失败的端点：慢也不切过去
+    ("slow_keeps_unprobed", [("slow", {"ranges": False, "rate": MIN_SPEED // 2}), ("dead", DEAD)], 1, "slow"),
+    # 分段请求持续 500：累计出错后切换
+    ("error_failover", [("flaky", {"fail_ranges": True}), ("fast", {"latency": 0.05})], 1, "fast"),
+    # 三个任务共享带宽，每个分得的速度低于阈值但高于阈值的三分之一：不切换
+    ("shared_link", [("slow", {"ranges": False, "rate": MIN_SPEED // 2}), ("fast", {"latency": 0.05})], 3, "slow"),
+    ("only_missing", [("missing", {"status": 404})], 1, None),
+]
+
+def start_endpoints(payload, endpoints):
+    servers, urls, labels = [], [], {}
+    for label, options in endpoints:
+        if options is DEAD:
+            url = "http://127.0.0.1:9/bench.bin"
+        else:
+            options = dict(options)
+            server, url = serve_payload(payload, options.pop("ranges", True), **options)
+            servers.append((label, server))
+        urls.append(url)
+        labels[url] = label
+    return servers, urls, labels
+
+def fetch_urllib(downloader, urls, save_path):
+    route = downloader.plan_route(urls)
+    ok, msg = downloader.download_with_progress(route, save_path, os.path.basename(save_path), threading.Event())
+    return ok, msg, route.url
+
+async def fetch_aio(aio, urls, save_path):
+    route = await aio.plan_route_async(urls)
+    ok, msg = await aio.download_async(route, save_path, os.path.basename(save_path), threading.Event())
+    return ok, msg, route.url
+
+def run_scenario(mods, workdir, payload, digest, scenario, use_aio):
+    name, endpoints, concurrency, expected = scenario
+    servers, urls, labels = start_endpoints(payload, endpoints)
+    paths = [os.path.join(workdir, f"{name}_{i}.bin") for i in range(concurrency)]
+    start = time.perf_counter()
+    try:
+        if use_aio:
+            aio = mods["aio_downloader"]
+            async def fetch_all():
+                try: return await asyncio.gather(*(fetch_aio(aio, urls, path) for path in paths))
+                finally: await aio.get_session().close()
+            results = asyncio.run(fetch_all())
+        else:
+            results = [None] * concurrency
+            def worker(i):
+                results[i] = fetch_urllib(mods["downloader"], urls, paths[i])
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+            for t in threads: t.start()
+            for t in threads: t.join()
+    finally:
+        for _, server in servers: server.shutdown()
+    elapsed = time.perf_counter() - start
+
+    problems = []
+    for path, (ok, msg, final_url) in zip(paths, results):
+        if expected is None:
+            if ok: problems.append("应当失败却完成了下载")
+            continue
+        if not ok:
+            problems.append(f"下载失败: {msg}")
+            continue
+        if labels[final_url] != expected: problems.append(f"在 {labels[final_url]} 上完成，期望 {expected}")
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != digest: problems.append("文件内容不一致")
+        os.remove(path)
+    served = {label: server.served for label, server in servers}
+    mark = "✅" if not problems else "❌"
+    return not problems, f"{mark} {name:<22} {elapsed:6.2f}s  served={served}" + "".join(f"\n     {p}" for p in problems)
+
+def main():
+    parser = argparse.ArgumentParser(description="多镜像下载切换的本地验证（无需 ComfyUI 与外网）")
+    parser.add_argument("--size-mb", type=int, default=4, help="测试文件大小")
+    parser.add_argument("--aio", action="store_true", help="使用 aiohttp 下载引擎")
+    parser.add_argument("--only", help="只运行指定场景，逗号分隔")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="path_fixer_mirrors_")
+    comfy_stubs.install(os.path.join(workdir, "models"))
+    comfy_stubs.load_package(
+        REPO_DIR, PACKAGE,
+        FINGERPRINT_AUTO_SCAN=False, FINGERPRINT_STORE=os.path.join(workdir, "fingerprints.json"),
+        # 缩短判定窗口和重试间隔，整套场景在半分钟左右跑完
+        DOWNLOAD_FAILOVER_MIN_SPEED=MIN_SPEED, DOWNLOAD_FAILOVER_GRACE=1, DOWNLOAD_FAILOVER_WINDOW=2,
+        DOWNLOAD_PROBE_TIMEOUT=1.0, DOWNLOAD_RETRY_BACKOFF=0.1, DOWNLOAD_SEGMENT_MIN_SIZE=1024 * 1024,
+        DOWNLOAD_SOURCE_COOLDOWN=0, DOWNLOAD_DISK_RESERVE=0
+    )
+    mods = {m: comfy_stubs.import_module(PACKAGE, m) for m in ("downloader", "aio_downloader" if args.aio else "sources")}
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    digest = hashlib.sha256(payload).hexdigest()
+    only = set(args.only.split(",")) if args.only else None
+    passed = True
+    try:
+        for scenario in SCENARIOS:
+            if only and scenario[0] not in only: continue
+            # 插件的下载日志转到 stderr，stdout 只留场景结果
+            with contextlib.redirect_stdout(sys.stderr):
+                ok, line = run_scenario(mods, workdir, payload, digest, scenario, args.aio)
+            print(line)
+            passed = passed and ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
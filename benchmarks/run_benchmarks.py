@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import http.server
+import socketserver
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import comfy_stubs
+import synthetic
+
+PACKAGE = "path_fixer"
+
+# ---------- 统计 ----------
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples: return {}
+    def pct(p): return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+    return {
+        "n": len(samples), "mean": sum(samples) / len(samples), "p50": pct(50), "p90": pct(90),
+        "p99": pct(99), "min": samples[0], "max": samples[-1]
+    }
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+class FakeRequest:
+    def __init__(self, payload):
+        self._payload = payload
+        self.query = {}
+        self.headers = {}
+
+    async def json(self):
+        return self._payload
+
+def response_json(response):
+    body = getattr(response, "text", None) or response.body
+    return json.loads(body.decode() if isinstance(body, bytes) else body)
+
+# ---------- 本地 HTTP 下载替身（支持 Range） ----------
+class _RangeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args): pass
+
+    def do_GET(self):
+        # 镜像替身的行为：latency 首字节延迟，status 固定返回的错误码，
+        # rate 每个连接的限速（字节/秒，传满 slow_after 字节后生效），fail_ranges 分段请求返回 500
+        server = self.server
+        if server.latency: time.sleep(server.latency)
+        data = server.payload
+        start, end = 0, len(data) - 1
+        ranged = False
+        spec = self.headers.get("Range", "")
+        if server.ranges and spec.startswith("bytes="):
+            first, _, last = spec[6:].partition("-")
+            start, end = int(first), int(last) if last else len(data) - 1
+            ranged = True
+        status = server.status or (500 if server.fail_ranges and ranged and end > start else None)
+        if status:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if ranged else 200)
+        if ranged: self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("ETag", '"bench"')
+        self.end_headers()
+        view = memoryview(data)[start:end + 1]
+        step = 64 * 1024 if server.rate else 1024 * 1024
+        try:
+            for i in range(0, len(view), step):
+                chunk = view[i:i + step]
+                self.wfile.write(chunk)
+                with server.lock: server.served += len(chunk)
+                if server.rate and server.served > server.slow_after: time.sleep(len(chunk) / server.rate)
+        except (BrokenPipeError, ConnectionResetError): pass
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端切换端点或取消分段时会断开连接，不打印堆栈
+        pass
+
+def serve_payload(payload, ranges, latency=0, status=None, rate=None, slow_after=0, fail_ranges=False):
+    server = _Server(("127.0.0.1", 0), _RangeHandler)
+    server.payload = payload
+    server.ranges = ranges
+    server.latency, server.status, server.rate, server.slow_after, server.fail_ranges = latency, status, rate, slow_after, fail_ranges
+    server.lock = threading.Lock()
+    server.served = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/bench.bin"
+
+# ---------- 各项基准 ----------
+def reset_metrics(metrics):
+    with metrics._lock:
+        metrics._counters.clear()
+        metrics._histograms.clear()
+
+def bench_size(mods, workdir, n_files, args):
+    search, file_index, catalog, metrics_mod = mods["search"], mods["file_index"], mods["catalog"], mods["metrics"]
+    model_index = file_index.model_index
+    reset_metrics(metrics_mod.metrics)
+
+    models_dir = os.path.join(workdir, f"models_{n_files}")
+    start = time.perf_counter()
+    files = synthetic.make_tree(models_dir, n_files, seed=args.seed)
+    tree_seconds = time.perf_counter() - start
+    comfy_stubs.set_models_dir(models_dir)
+    types = list(synthetic.WIDGETS)
+
+    result = {"files": len(files), "tree_seconds": tree_seconds}
+
+    # 冷启动：注册表变化触发整体扫描与重建
+    start = time.perf_counter()
+    search.build_file_index(types)
+    index = {"cold": time.perf_counter() - start}
+    index["warm"] = timed(lambda: search.build_file_index(types), args.repeat)
+
+    # 增量：每轮新增一个文件，刷新只重扫变动目录
+    rng = random.Random(args.seed)
+    counter = [0]
+    def touch_and_refresh():
+        m_type, rel_path = rng.choice(files)
+        counter[0] += 1
+        open(os.path.join(models_dir, m_type, os.path.dirname(rel_path), f"bench_new_{counter[0]}.safetensors"), 'wb').close()
+        search.build_file_index(types)
+    index["incremental"] = timed(touch_and_refresh, args.repeat)
+    index.update(model_index.stats())
+    result["build_file_index"] = index
+
+    # /fix 请求
+    queries, dynamic_links = synthetic.make_workflow(files, args.queries, args.links, seed=args.seed)
+    payload = {"queries": queries, "dynamic_links": dynamic_links}
+    fix_cache = mods["result_cache"].fix_cache
+    loop = asyncio.new_event_loop()
+    def fix_uncached():
+        fix_cache.clear()
+        return loop.run_until_complete(search.handle_fix_request(FakeRequest(payload)))
+    try:
+        response = fix_uncached()
+        fixed = response_json(response).get("fixed", [])
+        fix = timed(fix_uncached, args.repeat)
+        # 同一工作流重复提交：结果缓存命中；带 If-None-Match 时直接 304
+        cached = timed(lambda: loop.run_until_complete(search.handle_fix_request(FakeRequest(payload))), args.repeat)
+        conditional = FakeRequest(payload)
+        conditional.headers = {"If-None-Match": response.headers["ETag"]}
+        cached["not_modified"] = loop.run_until_complete(search.handle_fix_request(conditional)).status == 304
+        result["fix_request_cached"] = cached
+    finally:
+        loop.close()
+    fix["queries"] = len(queries)
+    fix["dynamic_links"] = sum(len(v) for v in dynamic_links.values())
+    fix["per_query_us"] = fix["p50"] / max(1, len(queries)) * 1e6
+    fix["outcomes"] = {
+        "local": sum(1 for r in fixed if r["candidates"]),
+        "download": sum(1 for r in fixed if not r["candidates"] and r["download_url"]),
+        "suggested": sum(1 for r in fixed if not r["candidates"] and r.get("suggestions")),
+    }
+    # 分阶段耗时取自插件自身的 metrics
+    phases = metrics_mod.metrics.as_dict()["timings"].get("fix_phase_seconds", [])
+    fix["phases_mean"] = {p["phase"]: p["avg"] for p in phases}
+    result["fix_request"] = fix
+
+    # 链接查询：内置链接库 + 工作流动态链接倒排索引
+    link_catalog = catalog.link_catalog
+    link_catalog.refresh()
+    known = list(link_catalog._index) or ["none"]
+    probes = [rng.choice(known) if i % 2 else f"missing_{i}.safetensors" for i in range(args.lookups)]
+    def lookup_batch():
+        for name in probes: link_catalog.find(name, "checkpoints")
+    lookups = timed(lookup_batch, args.repeat)
+    lookups["per_lookup_ns"] = lookups["p50"] / len(probes) * 1e9
+    result["catalog_lookup"] = lookups
+    result["build_link_index"] = timed(lambda: catalog.build_link_index(dynamic_links), args.repeat)
+    return result
+
+def bench_downloads(mods, workdir, args):
+    downloader = mods["downloader"]
+    payload = os.urandom(args.download_mb * 1024 * 1024)
+    results = {"size_mb": args.download_mb}
+    target_dir = os.path.join(workdir, "downloads")
+    os.makedirs(target_dir, exist_ok=True)
+
+    def run(name, fn):
+        rates = []
+        for i in range(args.download_repeat):
+            save_path = os.path.join(target_dir, f"{name}_{i}.bin")
+            start = time.perf_counter()
+            ok, msg = fn(save_path)
+            elapsed = time.perf_counter() - start
+            if not ok: raise RuntimeError(f"{name}: {msg}")
+            rates.append(len(payload) / elapsed / 1024 / 1024)
+            os.remove(save_path)
+        results[name] = dict(summarize(rates), unit="MB/s")
+
+    for ranges, label in ((True, "segmented"), (False, "single")):
+        server, url = serve_payload(payload, ranges)
+        try:
+            run(f"urllib_{label}", lambda path: downloader.download_with_progress(url, path, os.path.basename(path), threading.Event()))
+            if args.aio:
+                aio = comfy_stubs.import_module(PACKAGE, "aio_downloader")
+                async def fetch(path):
+                    try: return await aio.download_async(url, path, os.path.basename(path), threading.Event())
+                    finally: await aio.get_session().close()
+                run(f"aiohttp_{label}", lambda path: asyncio.run(fetch(path)))
+        finally:
+            server.shutdown()
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(current, baseline_path):
+    # 与历史结果按 p50 对比，输出到 stderr
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old_sizes = {r["files"]: r for r in baseline.get("sizes", [])}
+    for r in current["sizes"]:
+        old = old_sizes.get(r["files"])
+        if not old: continue
+        for key, sub in (("build_file_index", "warm"), ("build_file_index", "incremental"), ("fix_request", None), ("fix_request_cached", None), ("catalog_lookup", None)):
+            new_v = r[key][sub]["p50"] if sub else r[key]["p50"]
+            old_v = old.get(key, {})
+            old_v = (old_v.get(sub) or {}).get("p50") if sub else old_v.get("p50")
+            if not old_v: continue
+            label = f"{key}.{sub}" if sub else key
+            print(f"{r['files']:>7} {label:<32} {old_v * 1000:9.3f}ms -> {new_v * 1000:9.3f}ms  ({new_v / old_v:5.2f}x)", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="ComfyUI-Any-Path-Repair 基准测试（无需 ComfyUI）")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="模型文件数量，逗号分隔")
+    parser.add_argument("--queries", type=int, default=2000, help="每个工作流的模型查询数")
+    parser.add_argument("--links", type=int, default=5000, help="工作流 dynamic_links 条目数")
+    parser.add_argument("--lookups", type=int, default=10000, help="每轮链接库查询次数")
+    parser.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    parser.add_argument("--download-mb", type=int, default=128, help="下载测试文件大小，0 跳过")
+    parser.add_argument("--download-repeat", type=int, default=3)
+    parser.add_argument("--aio", action="store_true", help="同时测试 aiohttp 下载引擎")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="合成数据目录（默认临时目录，结束后删除）")
+    parser.add_argument("--output", help="结果 JSON 写入文件（默认输出到 stdout）")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比 p50")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="path_fixer_bench_")
+    comfy_stubs.install(os.path.join(workdir, "models_init"))
+    comfy_stubs.load_package(
+        REPO_DIR, PACKAGE,
+        # 后台指纹扫描和慢请求日志会干扰计时；指纹库写到临时目录，避免覆盖真实数据
+        FINGERPRINT_AUTO_SCAN=False, FINGERPRINT_STORE=os.path.join(workdir, "fingerprints.json"),
+        METRICS_SLOW_REQUEST_SECONDS=0
+    )
+    mods = {m: comfy_stubs.import_module(PACKAGE, m) for m in ("search", "file_index", "catalog", "metrics", "downloader", "result_cache")}
+
+    report = {
+        "meta": {
+            "revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "timestamp": time.time(), "args": vars(args)
+        },
+        "sizes": []
+    }
+    try:
+        # 插件的控制台输出（下载进度等）转到 stderr，stdout 只留 JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            for n_files in [int(s) for s in args.sizes.split(",") if s.strip()]:
+                print(f"[bench] {n_files} files ...")
+                report["sizes"].append(bench_size(mods, workdir, n_files, args))
+            if args.download_mb > 0:
+                print(f"[bench] download {args.download_mb} MB ...")
+                report["download"] = bench_downloads(mods, workdir, args)
+    finally:
+        if not args.workdir: shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare: compare(report, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import random
+
+# 合成数据：贴近真实命名习惯（模型族 + 变体 + 精度标记），包含跨类型同名文件与多层子目录
+FAMILIES = ["flux1", "sdxl", "sd15", "wan2.1", "hunyuan_video", "ltxv", "qwen_image", "cosmos", "pixart", "kolors", "sd3.5", "aura_flow"]
+VARIANTS = ["dev", "schnell", "base", "refiner", "turbo", "lightning", "i2v", "t2v", "inpaint", "canny", "depth", "tile"]
+PRECISIONS = ["fp16", "bf16", "fp8_e4m3fn", "fp8_e5m2", "fp32", "q4_k_m", "q8_0", ""]
+EXTENSIONS = [".safetensors"] * 8 + [".ckpt", ".pt", ".gguf", ".bin"]
+WIDGETS = {
+    "checkpoints": "ckpt_name", "loras": "lora_name", "vae": "vae_name", "clip": "clip_name", "unet": "unet_name",
+    "diffusion_models": "diffusion_model_name", "text_encoders": "text_encoder_name", "controlnet": "control_net_name",
+    "clip_vision": "clip_vision_name", "upscale_models": "upscale_model_name", "embeddings": "embedding_name",
+    "latent_upscale_models": "latent_upscale_model_name"
+}
+FILES_PER_DIR = 200
+
+def model_name(rng, i):
+    parts = [rng.choice(FAMILIES), rng.choice(VARIANTS), rng.choice(PRECISIONS), f"{i:06d}"]
+    sep = rng.choice(["-", "_"])
+    return sep.join(p for p in parts if p) + rng.choice(EXTENSIONS)
+
+def make_tree(models_dir, n_files, seed=0, dup_ratio=0.05, max_depth=3):
+    # 返回 [(model_type, rel_path)]；文件为空文件，只考察目录遍历与索引
+    rng = random.Random(seed)
+    types = list(WIDGETS)
+    files, names = [], []
+    dir_fill = {}
+    for i in range(n_files):
+        m_type = rng.choice(types)
+        if names and rng.random() < dup_ratio: base = rng.choice(names)
+        else: base = model_name(rng, i)
+        names.append(base)
+
+        # 子目录多为 0-1 层，按模型族归类
+        depth = min(max_depth, rng.choice([0, 0, 1, 1, 1, 2, 3]))
+        rel_dir = os.path.join(*[rng.choice(FAMILIES[:6]) if d == 0 else f"v{rng.randint(1, 3)}" for d in range(depth)]) if depth else ""
+        key = (m_type, rel_dir)
+        # 单目录文件数封顶，超出后分到编号子目录
+        bucket = dir_fill.get(key, 0)
+        dir_fill[key] = bucket + 1
+        if bucket >= FILES_PER_DIR: rel_dir = os.path.join(rel_dir, f"part{bucket // FILES_PER_DIR}")
+
+        rel_path = os.path.join(rel_dir, base)
+        abs_path = os.path.join(models_dir, m_type, rel_path)
+        if os.path.exists(abs_path): continue
+        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+        open(abs_path, 'wb').close()
+        files.append((m_type, rel_path))
+    return files
+
+def _variant_of(rng, base):
+    # 近似名：换精度标记，模拟 fp16 / fp8 版本不一致
+    for p in PRECISIONS:
+        if p and p in base: return base.replace(p, rng.choice([q for q in PRECISIONS if q and q != p]), 1)
+    stem, ext = os.path.splitext(base)
+    return f"{stem}_fp8{ext}"
+
+def make_workflow(files, n_queries, n_links, seed=0):
+    # 查询构成：50% 本地已有但路径前缀不对、20% 精度变体、20% 工作流笔记中有下载链接、10% 完全未知
+    rng = random.Random(seed + 1)
+    queries, missing = [], []
+    for i in range(n_queries):
+        roll = rng.random()
+        m_type, rel_path = rng.choice(files)
+        base = os.path.basename(rel_path)
+        if roll < 0.5:
+            value = os.path.join("shared", rng.choice(FAMILIES), base)
+        elif roll < 0.7:
+            value = _variant_of(rng, base)
+        elif roll < 0.9:
+            value = model_name(rng, 900000 + i)
+            missing.append((m_type, value))
+        else:
+            value = f"unknown_model_{i}.safetensors"
+        queries.append({
+            "id": i, "widget_name": WIDGETS[m_type], "current_val": value, "type": WIDGETS[m_type], "node_type": "BenchLoader"
+        })
+
+    dynamic_links = {}
+    for m_type, name in missing:
+        dynamic_links.setdefault(m_type, {})[name] = f"https://huggingface.co/bench/{m_type}/resolve/main/{name}"
+    for i in range(max(0, n_links - len(missing))):
+        m_type = rng.choice(list(WIDGETS))
+        name = model_name(rng, 500000 + i)
+        dynamic_links.setdefault(m_type, {})[name] = f"https://huggingface.co/bench/{m_type}/resolve/main/{name}"
+    return queries, dynamic_links
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import threading
+from aiohttp import web
+from .config import CATALOG_OVERLAY_FILES, CATALOG_OVERLAY_DIR, CATALOG_DB_FILES
+from .catalog_db import CatalogDB, apply_pending, entry_url, entry_hashes, normalize_hash
+from .metrics import metrics
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+def entry_sha256(value):
+    return normalize_hash(value.get("sha256")) if isinstance(value, dict) else None
+
+def build_link_index(nested):
+    # {category: {filename: entry}} -> {basename(lower): [(category, url, sha256), ...]}，保持原有遍历顺序
+    # 哈希随条目存放：同名文件在不同分类下可能是不同的文件，不能按文件名合并
+    index = {}
+    for cat, files in nested.items():
+        if not isinstance(files, dict): continue
+        for name, value in files.items():
+            url = entry_url(name, value)
+            if not url: continue
+            index.setdefault(os.path.basename(name).lower(), []).append((cat, url, entry_sha256(value)))
+    return index
+
+def build_hash_index(nested):
+    # {category: {filename: entry}} -> {basename(lower): [hash, ...]}，只收录带有效链接的条目
+    hashes = {}
+    for cat, files in nested.items():
+        if not isinstance(files, dict): continue
+        for name, value in files.items():
+            found = entry_hashes(value) if entry_url(name, value) else []
+            if found: hashes.setdefault(os.path.basename(name).lower(), []).extend(found)
+    return hashes
+
+def build_hash_lookup(nested):
+    # {category: {filename: entry}} -> {hash: [(category, filename, url), ...]}
+    lookup = {}
+    for cat, files in nested.items():
+        if not isinstance(files, dict): continue
+        for name, value in files.items():
+            url = entry_url(name, value)
+            if not url: continue
+            for h in entry_hashes(value): lookup.setdefault(normalize_hash(h), []).append((cat, name, url))
+    return lookup
+
+def find_link(index, base_name, preferred_type=None):
+    return pick_link(index.get(base_name), preferred_type)
+
+def pick_link(hits, preferred_type=None):
+    # 返回 (url, category, sha256)，哈希只取自选中的条目
+    if not hits: return None, None, None
+    if preferred_type:
+        for cat, url, sha256 in hits:
+            if cat == preferred_type: return url, cat, sha256
+    cat, url, sha256 = hits[0]
+    return url, cat, sha256
+
+# model_links.json 及用户叠加目录的倒排索引，文件 mtime 变化时才重新加载；
+# 大型链接库以 SQLite 存放（见 catalog_db.py），按需查询不载入内存，JSON 作为可读叠加层优先
+class LinkCatalog:
+    def __init__(self, base_path=None):
+        self._lock = threading.Lock()
+        self.base_path = base_path or os.path.join(CURRENT_DIR, "model_links.json")
+        self._signature = None
+        self._index = {}
+        self._merged = {}
+        self._hashes = {}
+        self._by_hash = {}
+        self._by_url = {}
+        self._dbs = ()
+        self.generation = 0
+
+    def source_paths(self):
+        paths = [self.base_path]
+        paths += [os.path.join(CURRENT_DIR, p) for p in CATALOG_OVERLAY_FILES]
+        overlay_dir = os.path.join(CURRENT_DIR, CATALOG_OVERLAY_DIR)
+        overlay_files = sorted(os.listdir(overlay_dir)) if os.path.isdir(overlay_dir) else []
+        paths += [os.path.join(overlay_dir, f) for f in overlay_files if f.lower().endswith(".json")]
+        paths += [os.path.join(CURRENT_DIR, p) for p in CATALOG_DB_FILES]
+        paths += [os.path.join(overlay_dir, f) for f in overlay_files if f.lower().endswith((".db", ".sqlite"))]
+        return paths
+
+    def _stat_sources(self):
+        signature = []
+        for path in self.source_paths():
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError: continue
+        return tuple(signature)
+
+    def _load(self, signature):
+        merged = {}
+        layers = []
+        dbs = []
+        for path, _, _ in signature:
+            if path.lower().endswith((".db", ".sqlite")):
+                # 旧连接不显式关闭：其他线程可能仍在查询，随引用释放
+                apply_pending(path)
+                try: dbs.append(CatalogDB(path))
+                except Exception as e: print(f"⚠️ [Path Fixer] 模型链接库打开失败 {os.path.basename(path)}: {e}")
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"⚠️ [Path Fixer] 模型链接库读取失败 {os.path.basename(path)}: {e}")
+                continue
+            if not isinstance(data, dict): continue
+            layers.append(data)
+            # 后加载的叠加目录覆盖同分类同名条目
+            for cat, files in data.items():
+                if isinstance(files, dict): merged.setdefault(cat, {}).update(files)
+
+        # 倒排索引中叠加目录的条目排在前面，跨分类查找时优先命中
+        index = {}
+        for data in reversed(layers):
+            for base_name, hits in build_link_index(data).items():
+                bucket = index.setdefault(base_name, [])
+                seen = {cat for cat, _, _ in bucket}
+                bucket.extend(hit for hit in hits if hit[0] not in seen)
+
+        # 下载请求只带 URL：按 URL 找回对应条目的哈希
+        by_url = {}
+        for hits in index.values():
+            for _, url, sha256 in hits:
+                if sha256: by_url.setdefault(url, sha256)
+
+        return merged, index, build_hash_index(merged), build_hash_lookup(merged), by_url, tuple(dbs)
+
+    def refresh(self):
+        signature = self._stat_sources()
+        if signature == self._signature:
+            metrics.inc("catalog_refresh_total", result="hit")
+            return self.generation
+        with self._lock:
+            if signature != self._signature:
+                start = time.perf_counter()
+                self._merged, self._index, self._hashes, self._by_hash, self._by_url, self._dbs = self._load(signature)
+                self._signature = signature
+                self.generation += 1
+                metrics.observe("catalog_load_seconds", time.perf_counter() - start)
+                metrics.inc("catalog_refresh_total", result="reload")
+        return self.generation
+
+    def stats(self):
+        return {
+            "catalog_basenames": len(self._index), "catalog_sources": len(self._signature or ()),
+            "catalog_db_entries": sum(db.entries for db in self._dbs)
+        }
+
+    def hits(self, base_name):
+        # JSON 层在前；SQLite 库只补充 JSON 中没有的分类
+        hits = self._index.get(base_name, [])
+        if not self._dbs: return hits
+        hits = list(hits)
+        seen = {cat for cat, _, _ in hits}
+        for db in self._dbs:
+            for cat, url, sha256 in db.find(base_name):
+                if cat not in seen:
+                    seen.add(cat)
+                    hits.append((cat, url, normalize_hash(sha256)))
+        return hits
+
+    def find(self, base_name, preferred_type=None):
+        hits = self._index.get(base_name)
+        # JSON 已命中目标分类时无需查库
+        if hits and any(cat == preferred_type for cat, _, _ in hits): return pick_link(hits, preferred_type)
+        return pick_link(self.hits(base_name), preferred_type)
+
+    def hash_for_url(self, url):
+        # 某个下载链接对应条目的 SHA-256；JSON 层优先
+        if not url: return None
+        sha256 = self._by_url.get(url)
+        for db in self._dbs:
+            if sha256: break
+            sha256 = normalize_hash(db.hash_for_url(url))
+        return sha256
+
+    def hashes_for(self, base_name):
+        hashes = list(self._hashes.get(base_name, ()))
+        for db in self._dbs: hashes += db.hashes_for(base_name)
+        return list(dict.fromkeys(hashes))
+
+    def find_by_hash(self, value, preferred_type=None):
+        # 工作流中的文件名与链接库不同（被改名）时按哈希找下载链接，返回 (url, category, 链接库中的文件名)
+        value = normalize_hash(value)
+        if not value: return None, None, None
+        hits = list(self._by_hash.get(value, ()))
+        for db in self._dbs: hits += db.find_by_hash(value)
+        if not hits: return None, None, None
+        for cat, name, url in hits:
+            if cat == preferred_type: return url, cat, name
+        cat, name, url = hits[0]
+        return url, cat, name
+
+    def category_entries(self, category, limit=None):
+        # [(filename, url, sha256)]，JSON 条目在前，同名以 JSON 为准
+        files = self._merged.get(category) or {}
+        entries = []
+        for name, value in files.items():
+            url = entry_url(name, value)
+            if url: entries.append((name, url, value.get("sha256") if isinstance(value, dict) else None))
+        seen = {os.path.basename(name).lower() for name, _, _ in entries}
+        for db in self._dbs:
+            if limit is not None and len(entries) >= limit: break
+            for name, url, sha256 in db.category(category, None if limit is None else limit + len(seen)):
+                if os.path.basename(name).lower() in seen: continue
+                seen.add(os.path.basename(name).lower())
+                entries.append((name, url, sha256))
+        return entries if limit is None else entries[:limit]
+
+    def as_dict(self):
+        return self._merged
+
+async def handle_catalog_request(request):
+    # GET ?name= / ?hash= / ?category=[&limit=]：查询合并后的链接库（含 SQLite 库）
+    try:
+        link_catalog.refresh()
+        query = request.query
+        if query.get("name"):
+            base_name = os.path.basename(query["name"].replace("\\", "/")).lower()
+            hits = [{"category": cat, "url": url, "sha256": sha256} for cat, url, sha256 in link_catalog.hits(base_name)]
+            return web.json_response({"success": True, "entries": hits, "hashes": link_catalog.hashes_for(base_name)})
+        if query.get("hash"):
+            url, cat, name = link_catalog.find_by_hash(query["hash"], query.get("category"))
+            entries = [{"category": cat, "name": name, "url": url}] if url else []
+            return web.json_response({"success": True, "entries": entries})
+        if query.get("category"):
+            limit = min(int(query.get("limit", 200)), 5000)
+            entries = [{"name": n, "url": u, "sha256": h} for n, u, h in link_catalog.category_entries(query["category"], limit)]
+            return web.json_response({"success": True, "entries": entries})
+        return web.json_response({"success": False, "message": "需要 name、hash 或 category 参数"})
+    except Exception as e:
+        return web.json_response({"success": False, "message": str(e)})
+
+link_catalog = LinkCatalog()
+metrics.add_collector(link_catalog.stats)
@@ -0,0 +1,274 @@
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import contextlib
+
+# 大型模型链接库（数十万条）的 SQLite 格式：按文件名 / 哈希 / 分类走索引查询，无需整体载入内存。
+# 本模块只依赖标准库，可直接作为命令行导入工具运行：
+#   python catalog_db.py import catalogs/hf_dump.db model_links.json org_dump.jsonl --category checkpoints
+#   python catalog_db.py lookup catalogs/hf_dump.db flux1-dev.safetensors
+
+SCHEMA_VERSION = 1
+HASH_FIELDS = ("sha256", "fingerprint")
+BATCH_SIZE = 5000
+# 目标库被占用、无法替换时新库的暂存后缀，插件下次打开该库前换入
+PENDING_SUFFIX = ".new"
+SWAP_RETRIES = 5
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft", ".onnx", ".pkl")
+# HF 仓库内按目录区分类型的常见布局（如 split_files/vae/xxx.safetensors）
+FOLDER_CATEGORIES = (
+    "checkpoints", "diffusion_models", "unet", "text_encoders", "clip", "clip_vision", "vae", "loras",
+    "controlnet", "upscale_models", "embeddings", "style_models", "model_patches", "latent_upscale_models"
+)
+
+def entry_url(name, value):
+    # 条目可以是 URL 字符串，也可以是 {"url": ..., "sha256": ..., "fingerprint": ...}
+    # 跳过 "__comment"、"folder_name" 之类的说明字段
+    if name.startswith("__") or name == "folder_name": return None
+    if isinstance(value, dict): value = value.get("url")
+    return value if isinstance(value, str) and "://" in value else None
+
+def entry_hashes(value):
+    if not isinstance(value, dict): return []
+    return [value[k] for k in HASH_FIELDS if isinstance(value.get(k), str) and value[k]]
+
+def normalize_hash(value):
+    # 与 fingerprint.normalize_hash 一致，库内统一存小写
+    if not value or not isinstance(value, str): return None
+    value = value.strip().strip('"').lower()
+    if value.startswith("sha256:"): value = value[7:]
+    return value or None
+
+# ---------- 导入源 ----------
+def _iter_nested(data):
+    # 现有 model_links.json 布局：{category: {filename: url | {url, sha256, fingerprint}}}
+    for cat, files in data.items():
+        if not isinstance(files, dict): continue
+        for name, value in files.items():
+            yield cat, name, value
+
+def _guess_category(path, default):
+    for part in path.replace("\\", "/").split("/")[:-1]:
+        if part.lower() in FOLDER_CATEGORIES: return part.lower()
+    return default
+
+def _iter_record(rec, category):
+    # 扁平记录：{"name"/"filename"/"path", "url", "category"/"type", "sha256", "fingerprint"}
+    # HF 仓库导出：{"id": "org/repo", "sha": 提交, "siblings": [{"rfilename", "lfs": {"sha256"}}]}
+    if not isinstance(rec, dict): return
+    if isinstance(rec.get("siblings"), list) and rec.get("id"):
+        revision = rec.get("sha") or "main"
+        for sib in rec["siblings"]:
+            path = sib.get("rfilename") if isinstance(sib, dict) else None
+            if not path or not path.lower().endswith(MODEL_EXTENSIONS): continue
+            lfs = sib.get("lfs") or {}
+            value = {"url": f"https://huggingface.co/{rec['id']}/resolve/{revision}/{path}", "sha256": lfs.get("sha256") or lfs.get("oid")}
+            yield _guess_category(path, category), os.path.basename(path), value
+        return
+    name = rec.get("name") or rec.get("filename") or rec.get("path")
+    url = rec.get("url")
+    if not name or not url: return
+    cat = rec.get("category") or rec.get("type") or _guess_category(name, category)
+    yield cat, os.path.basename(name), {"url": url, "sha256": rec.get("sha256"), "fingerprint": rec.get("fingerprint")}
+
+def iter_source(path, category="uncategorized"):
+    # 按扩展名识别：.json（嵌套布局或记录数组）、.jsonl/.ndjson（每行一条记录）、.csv（带表头）
+    lower = path.lower()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if lower.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                line = line.strip()
+                if line: yield from _iter_record(json.loads(line), category)
+        elif lower.endswith(".csv"):
+            for rec in csv.DictReader(f):
+                yield from _iter_record(rec, category)
+        else:
+            data = json.load(f)
+            if isinstance(data, list):
+                for rec in data: yield from _iter_record(rec, category)
+            elif isinstance(data, dict):
+                yield from _iter_nested(data)
+
+# ---------- 导入 ----------
+def _create_schema(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS links (
+            category TEXT NOT NULL, base TEXT NOT NULL, name TEXT NOT NULL, url TEXT NOT NULL,
+            sha256 TEXT, fingerprint TEXT, PRIMARY KEY (category, base)
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+
+def _create_indexes(conn):
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS links_base ON links (base);
+        CREATE INDEX IF NOT EXISTS links_url ON links (url);
+        CREATE INDEX IF NOT EXISTS links_sha256 ON links (sha256) WHERE sha256 IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS links_fingerprint ON links (fingerprint) WHERE fingerprint IS NOT NULL;
+    """)
+
+def import_catalog(db_path, sources, category="uncategorized", append=False):
+    # 写入临时文件后替换：运行中的插件按 mtime 发现变化并重新打开，不会读到半成品。
+    # 返回 (各源条数, 总条数, 暂存路径)；暂存路径非 None 表示目标库被占用，新库需重启 ComfyUI 后生效
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path): os.remove(tmp_path)
+    try:
+        if append:
+            # 上次未能换入的新库比目标库更新，在它的基础上追加
+            base = db_path + PENDING_SUFFIX if os.path.exists(db_path + PENDING_SUFFIX) else db_path
+            if os.path.exists(base):
+                # sqlite3 连接的 with 只提交不关闭，Windows 上未关闭的连接会让后面的替换失败
+                with contextlib.closing(sqlite3.connect(base)) as src, contextlib.closing(sqlite3.connect(tmp_path)) as dst:
+                    src.backup(dst)
+        counts, total = _import_into(tmp_path, sources, category)
+    except BaseException:
+        # 导入中断不留下写了一半的临时库
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    return counts, total, _swap_in(tmp_path, db_path)
+
+def _import_into(path, sources, category):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        _create_schema(conn)
+        # 后导入的源覆盖同分类同名条目，与 JSON 叠加目录的规则一致
+        sql = "INSERT OR REPLACE INTO links (category, base, name, url, sha256, fingerprint) VALUES (?, ?, ?, ?, ?, ?)"
+        counts = {}
+        for source in sources:
+            batch, count = [], 0
+            for cat, name, value in iter_source(source, category):
+                url = entry_url(name, value)
+                if not url: continue
+                sha256 = normalize_hash(value.get("sha256")) if isinstance(value, dict) else None
+                fingerprint = normalize_hash(value.get("fingerprint")) if isinstance(value, dict) else None
+                batch.append((cat, os.path.basename(name).lower(), name, url, sha256, fingerprint))
+                if len(batch) >= BATCH_SIZE:
+                    conn.executemany(sql, batch)
+                    count += len(batch)
+                    batch = []
+            conn.executemany(sql, batch)
+            counts[source] = count + len(batch)
+        _create_indexes(conn)
+        total = conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("schema_version", str(SCHEMA_VERSION)), ("entries", str(total)), ("updated", str(int(time.time())))
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    return counts, total
+
+def _swap_in(tmp_path, db_path):
+    # Windows 上目标库仍被打开（运行中的 ComfyUI 持有只读连接）时替换会失败：短暂重试，
+    # 仍失败则改存为 .new，由插件下次打开该库前换入（apply_pending），返回暂存路径
+    pending = db_path + PENDING_SUFFIX
+    for attempt in range(SWAP_RETRIES):
+        try:
+            os.replace(tmp_path, db_path)
+            # 较早暂存的新库已被本次结果取代（追加时已并入），不能在重启时把它换回来
+            if os.path.exists(pending): os.remove(pending)
+            return None
+        except PermissionError:
+            time.sleep(0.2 * (attempt + 1))
+    os.replace(tmp_path, pending)
+    return pending
+
+def apply_pending(db_path):
+    # 在打开 db_path 之前调用：换入上次因目标被占用而暂存的新库
+    pending = db_path + PENDING_SUFFIX
+    if not os.path.exists(pending): return
+    try: os.replace(pending, db_path)
+    except OSError as e: print(f"⚠️ [Path Fixer] 链接库更新暂未生效 {os.path.basename(db_path)}: {e}")
+
+# ---------- 查询 ----------
+class CatalogDB:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # 只读打开；查询可能来自事件循环与下载线程，连接共享并加锁
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if int(meta.get("schema_version", 0)) != SCHEMA_VERSION:
+            self._conn.close()
+            raise ValueError(f"不支持的链接库版本: {meta.get('schema_version')}")
+        self.entries = int(meta.get("entries", 0))
+
+    def _query(self, sql, args):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def find(self, base_name):
+        # 与 build_link_index 一致：[(category, url, sha256), ...]，按导入顺序
+        return self._query("SELECT category, url, sha256 FROM links WHERE base = ? ORDER BY rowid", (base_name,))
+
+    def hash_for_url(self, url):
+        rows = self._query("SELECT sha256 FROM links WHERE url = ? AND sha256 IS NOT NULL ORDER BY rowid LIMIT 1", (url,))
+        return rows[0][0] if rows else None
+
+    def hashes_for(self, base_name):
+        rows = self._query("SELECT sha256, fingerprint FROM links WHERE base = ? ORDER BY rowid", (base_name,))
+        return [h for row in rows for h in row if h]
+
+    def find_by_hash(self, value):
+        value = normalize_hash(value)
+        if not value: return []
+        return self._query("SELECT category, name, url FROM links WHERE sha256 = ? OR fingerprint = ? ORDER BY rowid", (value, value))
+
+    def category(self, category, limit=None, offset=0):
+        return self._query("SELECT name, url, sha256 FROM links WHERE category = ? ORDER BY base LIMIT ? OFFSET ?",
+                           (category, -1 if limit is None else limit, offset))
+
+    def categories(self):
+        return [row[0] for row in self._query("SELECT DISTINCT category FROM links", ())]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# ---------- 命令行 ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模型链接库 SQLite 导入/查询工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="从 JSON / JSONL / CSV / HF 仓库导出批量导入")
+    p_import.add_argument("db")
+    p_import.add_argument("sources", nargs="+")
+    p_import.add_argument("--category", default="uncategorized", help="记录未指明分类时使用的分类")
+    p_import.add_argument("--append", action="store_true", help="在现有库上追加（默认重建）")
+    p_lookup = sub.add_parser("lookup", help="按文件名、哈希或分类查询")
+    p_lookup.add_argument("db")
+    p_lookup.add_argument("name", nargs="?")
+    p_lookup.add_argument("--hash")
+    p_lookup.add_argument("--category")
+    p_lookup.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        start = time.perf_counter()
+        counts, total, pending = import_catalog(args.db, args.sources, args.category, args.append)
+        for source, count in counts.items(): print(f"{source}: {count}")
+        if pending:
+            print(f"⚠️ {args.db} 正被占用（ComfyUI 运行中？），新库已保存为 {pending}：{total} 条，重启 ComfyUI 后生效")
+            return 0
+        print(f"✅ {args.db}: {total} 条，用时 {time.perf_counter() - start:.1f}s")
+        return 0
+
+    db = CatalogDB(args.db)
+    try:
+        if args.hash: rows = db.find_by_hash(args.hash)
+        elif args.category: rows = db.category(args.category, args.limit)
+        elif args.name: rows = db.find(os.path.basename(args.name).lower())
+        else: rows = [(c,) for c in db.categories()]
+        for row in rows: print("\t".join(str(v) for v in row if v is not None))
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import threading
+import folder_paths
+from .config import (
+    get_type_mapping, NODE_SPECIFIC_MAPPING, WIDGET_HEURISTICS, CLASSIFIER_RULES_FILE, CLASSIFIER_CACHE_SIZE
+)
+from .metrics import metrics
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+_SUFFIX_RE = re.compile(r'_\d+$')
+
+def _compile_heuristic(rule):
+    kind, pattern, model_type = rule
+    if kind == "contains":
+        pattern = pattern.lower()
+        return lambda w, w_lower: pattern in w_lower, model_type
+    if kind == "equals":
+        return lambda w, w_lower: w == pattern, model_type
+    if kind == "regex":
+        regex = re.compile(pattern)
+        return lambda w, w_lower: regex.fullmatch(w) is not None, model_type
+    raise ValueError(f"未知的规则类型: {kind}")
+
+# 部件 → 模型类型识别：config 中的规则编译为查找表，结果按 (节点类型, 部件名, 路径首段) 缓存；
+# 注册目录或用户规则文件变化时重新编译并清空缓存
+class TypeClassifier:
+    def __init__(self, rules_path=None):
+        self._lock = threading.Lock()
+        self.rules_path = rules_path or os.path.join(CURRENT_DIR, CLASSIFIER_RULES_FILE)
+        self._signature = None
+        self._node_map = {}
+        self._widget_map = {}
+        self._folders = {}
+        self._heuristics = []
+        self._cache = {}
+        self.generation = 0
+
+    def _load_user_rules(self):
+        try:
+            with open(self.rules_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"⚠️ [Path Fixer] 识别规则读取失败 {os.path.basename(self.rules_path)}: {e}")
+            return {}
+
+    def _rules_stamp(self):
+        try:
+            st = os.stat(self.rules_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _compile(self, folder_types, user):
+        node_map = dict(NODE_SPECIFIC_MAPPING)
+        node_map.update(user.get("node_types") or {})
+
+        widget_map = get_type_mapping(folder_types)
+        widget_map.update(user.get("widgets") or {})
+
+        heuristics = []
+        for rule in list(user.get("heuristics") or []) + WIDGET_HEURISTICS:
+            try: heuristics.append(_compile_heuristic(rule))
+            except Exception as e: print(f"⚠️ [Path Fixer] 忽略无效识别规则 {rule}: {e}")
+
+        self._node_map = node_map
+        self._widget_map = widget_map
+        self._folders = {}
+        for t in folder_types: self._folders.setdefault(t.lower(), t)
+        self._heuristics = heuristics
+        self._cache = {}
+
+    def refresh(self):
+        # 每个请求调用一次：注册表键与规则文件未变时只做一次比较
+        signature = (tuple(folder_paths.folder_names_and_paths), self._rules_stamp())
+        if signature == self._signature: return
+        with self._lock:
+            if signature == self._signature: return
+            self._compile(signature[0], self._load_user_rules())
+            self._signature = signature
+            self.generation += 1
+            metrics.inc("classifier_compiles_total")
+
+    def _resolve(self, node_type, widget_type, prefix):
+        # 优先检查节点级映射
+        standard_type = self._node_map.get(node_type)
+        if standard_type: return standard_type
+        standard_type = self._widget_map.get(widget_type)
+        if standard_type: return standard_type
+
+        # 子图后缀处理：unet_name_1 → unet_name
+        base_widget = _SUFFIX_RE.sub('', widget_type)
+        if base_widget != widget_type:
+            standard_type = self._widget_map.get(base_widget)
+            if standard_type: return standard_type
+
+        # 路径前缀分析
+        if prefix:
+            standard_type = self._folders.get(prefix)
+            if standard_type: return standard_type
+
+        w_lower = widget_type.lower()
+        for match, model_type in self._heuristics:
+            if match(widget_type, w_lower): return model_type
+        return None
+
+    def classify(self, node_type, widget_type, value_path=""):
+        # value_path 为 normalize_path 后的部件值，只取首段文件夹参与判断
+        widget_type = widget_type or ""
+        prefix = value_path.split("/", 1)[0].lower() if "/" in value_path else None
+        key = (node_type, widget_type, prefix)
+        cache = self._cache
+        if key in cache: return cache[key]
+        result = self._resolve(node_type, widget_type, prefix)
+        if len(cache) >= CLASSIFIER_CACHE_SIZE: cache.clear()
+        cache[key] = result
+        return result
+
+    def stats(self):
+        return {"classifier_cache_entries": len(self._cache), "classifier_heuristics": len(self._heuristics)}
+
+type_classifier = TypeClassifier()
+metrics.add_collector(type_classifier.stats)
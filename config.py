@@ -57,14 +57,39 @@ NODE_SPECIFIC_MAPPING = {
     "Qwen_TTS_VoiceClone_Node": "TTS"
 }
 
-def get_type_mapping():
+def get_type_mapping(folder_types=None):
+    # 部件名 → 模型类型：手动映射 + 每个注册类型的 "<type>_name"；folder_types 默认取当前注册表
     mapping = MANUAL_MAPPING.copy()
-    for type_name in folder_paths.folder_names_and_paths:
+    for type_name in (folder_paths.folder_names_and_paths if folder_types is None else folder_types):
         widget_key = f"{type_name}_name"
         if widget_key not in mapping:
             mapping[widget_key] = type_name
     return mapping
 
+# 部件名启发式规则（前面的映射都未命中时按顺序匹配）：
+# contains 对小写部件名做子串匹配，equals 精确匹配，regex 对原始部件名做整串匹配
+WIDGET_HEURISTICS = [
+    ("contains", "clip", "clip"),
+    ("contains", "text_encoder", "clip"),
+    ("contains", "unet", "unet"),
+    ("contains", "diffusion", "unet"),
+    ("contains", "lora", "loras"),
+    ("contains", "checkpoint", "checkpoints"),
+    # 子图中文名称启发式匹配
+    ("contains", "文本编码器", "clip"),
+    ("equals", "模型", "latent_upscale_models"),
+    ("regex", r"model_name(_\d+)?", "latent_upscale_models"),
+    ("contains", "unet名称", "unet"),
+    ("contains", "lora名称", "loras"),
+    ("contains", "checkpoint名称", "checkpoints"),
+]
+
+# 用户自定义识别规则（插件目录下的 JSON，修改后自动生效）：
+# {"node_types": {节点类型: 模型类型}, "widgets": {部件名: 模型类型}, "heuristics": [[方式, 模式, 模型类型], ...]}
+CLASSIFIER_RULES_FILE = "classifier_rules_user.json"
+# 分类结果缓存上限，超出后整体清空
+CLASSIFIER_CACHE_SIZE = 8192
+
 # 额外路径注册
 EXTRA_PATH_REGISTRATIONS = {
     "text_encoders": "clip",
@@ -80,4 +105,122 @@ def register_custom_paths():
         folder_paths.add_model_folder_path(folder_name, target_path)
         try:
             folder_paths.add_model_folder_path(comfy_type, target_path)
-        except: pass
\ No newline at end of file
+        except: pass
+
+# ---------- 模型文件索引 ----------
+# 以子文件夹为模型单位的类型（不走 ComfyUI 注册表）
+DIR_MODEL_TYPES = ["LLM", "TTS"]
+
+# 不参与索引的注册类型（非模型目录，文件量大）
+INDEX_EXCLUDED_TYPES = {"custom_nodes"}
+
+# 启用文件监听时，兜底全量 mtime 校验的间隔（秒）
+INDEX_FULL_CHECK_INTERVAL = 300
+
+# 各根目录（含 extra_model_paths 中的 NFS/SMB 挂载）并行扫描的线程数
+INDEX_SCAN_WORKERS = 8
+# 单个根目录每次刷新的扫描截止时间（秒）：超时的根目录先沿用已有/部分结果并标记为过期，剩余部分后续继续扫描
+INDEX_ROOT_TIMEOUT = 3.0
+# 启动时后台预热的截止时间（秒）
+INDEX_WARMUP_TIMEOUT = 60.0
+
+# ---------- 模型链接库 ----------
+# 叠加在 model_links.json 之上的用户链接库（相对插件目录），同分类同名条目以用户库为准
+CATALOG_OVERLAY_FILES = ["model_links_user.json"]
+CATALOG_OVERLAY_DIR = "catalogs"
+# 大型链接库（SQLite，由 catalog_db.py 导入生成，按需查询不整体载入）；叠加目录中的 *.db / *.sqlite 同样生效
+# JSON 链接库优先，SQLite 库只补充 JSON 中没有的分类
+CATALOG_DB_FILES = ["model_links.db"]
+
+# ---------- 近似文件名匹配 ----------
+# 归一化时忽略的精度/裁剪标记，如 flux1-dev-fp8-e4m3fn 与 flux1-dev 视为同一模型
+FUZZY_PRECISION_TOKENS = {
+    "fp16", "bf16", "fp32", "fp8", "e4m3fn", "e4m3", "e5m2", "scaled", "fp8e4m3fn", "fp8e5m2",
+    "pruned", "ema", "emaonly", "noema", "full", "half", "int8", "nf4"
+}
+FUZZY_MIN_SCORE = 0.6
+FUZZY_MAX_SUGGESTIONS = 5
+
+# ---------- 内容指纹 ----------
+# 指纹 = sha256(文件大小 + 头部(含 safetensors JSON 头) + 尾部采样)，用于识别被改名的模型
+FINGERPRINT_STORE = "fingerprints.json"
+FINGERPRINT_SAMPLE_BYTES = 256 * 1024
+FINGERPRINT_WORKERS = 2
+# 后台扫描只读取新增 / 变动模型的头尾采样（见 FINGERPRINT_SAMPLE_BYTES），结果缓存在 FINGERPRINT_STORE；
+# 关闭后仅记录下载时计算的哈希，不在后台扫描本地模型
+FINGERPRINT_AUTO_SCAN = True
+
+# ---------- 下载 ----------
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+# 服务器支持 Range 时的并发分段数，小于 2 * 最小分段的文件仍走单连接
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_SEGMENT_MIN_SIZE = 32 * 1024 * 1024
+
+# 断点续传：网络类错误的重试次数与退避（秒），.part.json 进度落盘间隔
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_RETRY_BACKOFF = 2
+DOWNLOAD_RETRY_MAX_DELAY = 30
+PART_STATE_SAVE_INTERVAL = 2
+
+# 下载队列：同时进行的任务数，全局 / 单域名带宽上限（字节/秒，0 为不限）
+DOWNLOAD_MAX_CONCURRENT = 3
+DOWNLOAD_BANDWIDTH_LIMIT = 0
+DOWNLOAD_HOST_BANDWIDTH_LIMIT = 0
+
+# 下载引擎："aiohttp" 在 ComfyUI 事件循环上异步下载并复用连接；"urllib" 为线程阻塞下载
+DOWNLOAD_ENGINE = "aiohttp"
+AIO_LIMIT_PER_HOST = 16
+AIO_WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+AIO_WRITER_THREADS = 2
+
+# 磁盘空间：目标文件系统至少保留的空闲字节（避免模型下载占满 ComfyUI 输出所在的磁盘）
+# 提交时读取 Content-Length 预检，排队任务按剩余空间调度，放不下的任务直接拒绝
+DOWNLOAD_DISK_RESERVE = 5 * 1024 ** 3
+# 支持时用 fallocate 一次分配 .part 的全部空间：减少碎片、后续加载更快，空间不足时在写入前就失败
+DOWNLOAD_PREALLOCATE = True
+
+# 下载进度：所有进行中的下载合并为一条批量事件，每隔该秒数推送一次，只包含有变化的条目（速度 / 剩余时间由后端计算）
+DOWNLOAD_PROGRESS_INTERVAL = 1.0
+# 控制台进度："summary" 每次推送时刷新一行汇总，"file" 每个文件单独刷新，"off" 不输出
+DOWNLOAD_CONSOLE_PROGRESS = "summary"
+
+# 下载完整性：边下边算 SHA-256，与链接库 / ETag / 工作流注释中的哈希比对，不一致时改名隔离
+DOWNLOAD_VERIFY_SHA256 = True
+QUARANTINE_SUFFIX = ".quarantine"
+
+# 跨目录复用：同名模型已在其他类型目录时，按顺序尝试的链接方式（hardlink / reflink / symlink）
+MATERIALIZE_METHODS = ["hardlink", "reflink", "symlink"]
+
+# 运行指标：GET /model_path_fixer/metrics（JSON，?format=prometheus 输出 Prometheus 文本）
+METRICS_ENABLED = True
+# /fix 请求超过该秒数时打印分阶段耗时，0 为关闭
+METRICS_SLOW_REQUEST_SECONDS = 2.0
+# 指标中保留的最近慢请求条数
+METRICS_SLOW_REQUESTS = 50
+METRICS_RECENT_DOWNLOADS = 20
+
+# /fix 结果缓存：按单条查询缓存，依赖的文件名/近似名/指纹变化时仅该条失效；响应带 ETag，未变化返回 304
+FIX_CACHE_SIZE = 20000
+
+# ---------- 下载源 ----------
+# 各源站域名的候选端点（公共镜像 / 内网缓存），以 scheme://host[/前缀] 替换原链接的 scheme://host，路径保持不变
+DOWNLOAD_MIRRORS = {
+    "huggingface.co": ["https://hf-mirror.com"],
+}
+# 路径布局不同的下载源按模板从 HF 链接改写：{repo} 为仓库名，{file} 为仓库内路径
+DOWNLOAD_SOURCE_TEMPLATES = {
+    "ModelScope": "https://modelscope.cn/models/{repo}/resolve/master/{file}",
+}
+# 多个端点时并行发送 Range: bytes=0-0 探测，按首字节延迟择优；0 为不探测，按来源偏好顺序使用
+DOWNLOAD_PROBE_TIMEOUT = 3.0
+# 偏好顺序每靠后一位，延迟按多出该秒数计，避免几毫秒的抖动就放弃用户选择的来源
+DOWNLOAD_PROBE_BIAS = 0.1
+# 下载中途切换端点：窗口（秒）内平均速度低于阈值（字节/秒，0 为关闭），或同一端点连续出错达到次数
+# 阈值按整条带宽计，同时在传输的下载数均分（默认 3 个并发时每个约 170 KB/s）；设置了带宽上限时应低于该上限
+# 只会切换到探测可用的端点，未探测或探测出错的端点只在出错时作为后备
+DOWNLOAD_FAILOVER_MIN_SPEED = 512 * 1024
+DOWNLOAD_FAILOVER_WINDOW = 15
+DOWNLOAD_FAILOVER_GRACE = 10
+DOWNLOAD_FAILOVER_ERRORS = 2
+# 被切换掉的端点在该秒数内排在其他端点之后
+DOWNLOAD_SOURCE_COOLDOWN = 300
@@ -1,5 +1,4 @@
 import os
-import json
 
 def normalize_path(path):
     if not path: return ""
@@ -7,16 +6,6 @@ def normalize_path(path):
     if norm.startswith("./"): norm = norm[2:]
     return norm.strip()
 
-def load_local_links():
-    try:
-        current_dir = os.path.dirname(os.path.realpath(__file__))
-        json_path = os.path.join(current_dir, "model_links.json")
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except: pass
-    return {}
-
 def parse_hf_url(url):
     if "huggingface.co" not in url and "hf-mirror.com" not in url: return None, None
     clean_url = url.replace("https://", "").replace("http://", "")
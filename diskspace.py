@@ -0,0 +1,65 @@
+import os
+import errno
+import shutil
+from .config import DOWNLOAD_DISK_RESERVE, DOWNLOAD_PREALLOCATE
+
+class DiskSpaceError(Exception):
+    # 目标磁盘空间不足：换镜像或重试都无济于事
+    pass
+
+def is_disk_full(e):
+    return isinstance(e, DiskSpaceError) or (isinstance(e, OSError) and e.errno == errno.ENOSPC)
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024: return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def _existing(path):
+    # 目标目录可能尚未创建，向上取最近的已存在目录
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path: break
+        path = parent
+    return path
+
+def device_of(path):
+    return os.stat(_existing(path)).st_dev
+
+def usable_bytes(path):
+    return shutil.disk_usage(_existing(path)).free - DOWNLOAD_DISK_RESERVE
+
+def allocated_bytes(path):
+    # 实际占用的磁盘块：稀疏的 .part 只计已写入部分，预分配的 .part 计全部
+    try: st = os.stat(path)
+    except OSError: return 0
+    blocks = getattr(st, "st_blocks", None)
+    return min(st.st_size, blocks * 512) if blocks is not None else st.st_size
+
+def outstanding_bytes(commitments, device):
+    # 同一文件系统上各任务还需新占用的空间；commitments 为 [(总大小, .part 路径)]
+    total = 0
+    for size, part_path in commitments:
+        if size and device_of(part_path) == device:
+            total += max(0, size - allocated_bytes(part_path))
+    return total
+
+def check_space(target_dir, size, part_path, commitments=()):
+    # 放得下返回 None，否则返回说明
+    if not size: return None
+    needed = max(0, size - allocated_bytes(part_path))
+    usable = usable_bytes(target_dir) - outstanding_bytes(commitments, device_of(target_dir))
+    if needed <= usable: return None
+    return f"磁盘空间不足: 需要 {format_size(needed)}，可用 {format_size(max(0, usable))}（另保留 {format_size(DOWNLOAD_DISK_RESERVE)}）"
+
+def preallocate(path, size):
+    # ext4 / XFS / btrfs 等支持 fallocate 时一次分配连续区段；不支持时退回稀疏文件（Windows 上 truncate 即分配）
+    with open(path, 'wb') as f:
+        if DOWNLOAD_PREALLOCATE and size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOSPC: raise DiskSpaceError(f"磁盘空间不足: 无法预分配 {format_size(size)}")
+        f.truncate(size)
@@ -1,133 +1,519 @@
 import os
+import json
+import asyncio
 import threading
 import time
 import sys
 import server
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import folder_paths
 from aiohttp import web
 from urllib.parse import unquote
 from .core_utils import normalize_path, parse_hf_url
+from .config import (
+    DOWNLOAD_BLOCK_SIZE, DOWNLOAD_SEGMENTS, DOWNLOAD_SEGMENT_MIN_SIZE,
+    DOWNLOAD_RETRIES, DOWNLOAD_RETRY_BACKOFF, DOWNLOAD_RETRY_MAX_DELAY, PART_STATE_SAVE_INTERVAL,
+    DOWNLOAD_MAX_CONCURRENT, DOWNLOAD_BANDWIDTH_LIMIT, DOWNLOAD_HOST_BANDWIDTH_LIMIT, DOWNLOAD_ENGINE,
+    DOWNLOAD_VERIFY_SHA256, QUARANTINE_SUFFIX, DOWNLOAD_PROBE_TIMEOUT, DOWNLOAD_PROGRESS_INTERVAL, DOWNLOAD_CONSOLE_PROGRESS
+)
+from .file_index import model_index
+from .catalog import link_catalog
+from .fingerprint import fingerprint_store, compute_fingerprint, as_sha256, StreamHasher
+from .scheduler import DownloadScheduler, BandwidthLimiter
+from .metrics import metrics, DownloadStats
+from .sources import source_router, candidate_urls, SourceRoute, SlowSourceError
+from .diskspace import DiskSpaceError, is_disk_full, check_space, preallocate
+from .progress import download_progress
 
 active_downloads = set()
 cancel_flags = {}
 download_lock = threading.Lock()
 
-def download_with_progress(url, save_path, filename_for_msg, cancel_event):
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+def open_url(url, extra_headers=None, timeout=30):
     import urllib.request
-    
+    headers = {'User-Agent': USER_AGENT}
+    if extra_headers: headers.update(extra_headers)
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+
+def parse_content_range(value):
+    # "bytes 0-0/12345" -> (0, 0, 12345)
+    try:
+        unit, _, spec = value.partition(" ")
+        span, _, total = spec.partition("/")
+        start, _, end = span.partition("-")
+        return int(start), int(end), int(total) if total != "*" else 0
+    except Exception:
+        return None
+
+class PermanentDownloadError(Exception):
+    # 不值得重试的错误（404、HTML 页面、校验失败等）
+    pass
+
+def is_transient_error(e):
+    import urllib.error
+    if isinstance(e, SlowSourceError): return True
+    if isinstance(e, PermanentDownloadError) or is_disk_full(e): return False
+    if isinstance(e, urllib.error.HTTPError): return e.code in (408, 425, 429) or e.code >= 500
+    return True
+
+def check_html_response(content_type, total_size):
+    if 'text/html' in (content_type or '') and total_size < 100 * 1024:
+        raise PermanentDownloadError("链接返回了HTML页面，可能是无效链接。")
+
+def remote_sha256(headers):
+    # HF 的 LFS 文件在 X-Linked-Etag / ETag 中给出 sha256；普通 MD5 ETag 会被忽略
+    return as_sha256(headers.get('X-Linked-Etag', '')) or as_sha256(headers.get('ETag', ''))
+
+def contiguous_done(segments):
+    # 从文件开头起连续已写完的字节数
+    done = 0
+    for start, end, pos in sorted(segments):
+        if start != done: break
+        done = pos
+        if pos <= end: break
+    return done
+
+# ---------- .part 断点续传 ----------
+def part_paths(save_path):
+    return save_path + ".part", save_path + ".part.json"
+
+def load_part_state(save_path):
+    part_path, meta_path = part_paths(save_path)
+    if not os.path.exists(part_path): return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def save_part_state(save_path, state):
+    _, meta_path = part_paths(save_path)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, meta_path)
+
+def clear_part(save_path):
+    for path in part_paths(save_path):
+        if os.path.exists(path):
+            try: os.remove(path)
+            except: pass
+
+def same_resource(state, remote):
+    # 大小一致且内容哈希 / ETag / Last-Modified 校验通过才允许续传
+    # 内容哈希优先：切换到镜像后 ETag 可能不同，但同一 sha256 的 .part 仍可接着下载
+    if not state or state.get("size") != remote["size"] or not remote["size"]: return False
+    if state.get("sha256") and remote.get("sha256"): return state["sha256"] == remote["sha256"]
+    if state.get("etag") and remote["etag"]: return state["etag"] == remote["etag"]
+    if state.get("last_modified") and remote["last_modified"]: return state["last_modified"] == remote["last_modified"]
+    return False
+
+def task_save_path(task):
+    return os.path.join(task.args[3], os.path.basename(task.args[2]))
+
+def ensure_disk_space(save_path, size):
+    # 写入前按真实大小再检查一次：其他运行中任务尚未落盘的部分视为已占用
+    part_path, _ = part_paths(save_path)
+    others = [(t.size, part_paths(task_save_path(t))[0]) for t in download_scheduler.tasks(("running",))
+              if task_save_path(t) != save_path]
+    reason = check_space(os.path.dirname(save_path), size, part_path, others)
+    if reason:
+        metrics.inc("download_disk_rejections_total", stage="transfer")
+        raise DiskSpaceError(reason)
+
+def prepare_range_state(save_path, remote, filename_for_msg):
+    # 校验通过则沿用 .part.json 中各分段进度续传，否则重新规划分段
+    state = load_part_state(save_path)
+    if same_resource(state, remote):
+        print(f"↩️ [Path Fixer] 续传: {filename_for_msg} ({sum(s[2] - s[0] for s in state['segments']) / 1024 / 1024:.1f} MB 已完成)")
+        state["url"] = remote["url"]
+    else:
+        clear_part(save_path)
+        segments = DOWNLOAD_SEGMENTS if remote["size"] >= 2 * DOWNLOAD_SEGMENT_MIN_SIZE else 1
+        state = dict(remote, segments=plan_segments(remote["size"], segments))
+    ensure_disk_space(save_path, remote["size"])
+    save_part_state(save_path, state)
+    return state
+
+def retry_delay(attempt):
+    return min(DOWNLOAD_RETRY_BACKOFF * (2 ** (attempt - 1)), DOWNLOAD_RETRY_MAX_DELAY)
+
+def finalize_part(save_path, expected_size):
+    # 大小校验通过后才改名为正式文件名，避免半截文件以真实模型名出现
+    part_path, meta_path = part_paths(save_path)
+    actual = os.path.getsize(part_path)
+    if expected_size and actual != expected_size:
+        raise Exception(f"文件大小校验失败: {actual}/{expected_size}")
+    os.replace(part_path, save_path)
+    if os.path.exists(meta_path):
+        try: os.remove(meta_path)
+        except: pass
+
+class ProgressPrinter:
+    def __init__(self, filename, total_size, initial=0):
+        self.filename = filename
+        self.total_size = total_size
+        self.initial = initial
+        self.start_time = time.time()
+        self.last_report_time = 0
+
+    def update(self, downloaded_size, force=False):
+        current_time = time.time()
+        if not force and current_time - self.last_report_time <= min(0.5, DOWNLOAD_PROGRESS_INTERVAL): return
+        # 默认由进度汇总统一输出一行；"file" 模式下每个文件各自刷新
+        if DOWNLOAD_CONSOLE_PROGRESS == "file":
+            progress = (downloaded_size / self.total_size) * 100 if self.total_size > 0 else 0
+            speed = (downloaded_size - self.initial) / (current_time - self.start_time + 0.001) / 1024 / 1024
+            sys.stdout.write(f"\r⏳ 下载中 [{self.filename}]: {progress:.1f}% | {speed:.2f} MB/s")
+            sys.stdout.flush()
+        report_progress(self.filename, downloaded_size, self.total_size)
+        self.last_report_time = current_time
+
+def _stream_single(response, part_path, filename_for_msg, cancel_event, total_size, throttle=None, hasher=None, watch=None):
+    # 服务器不支持 Range：只能从头下载，无法续传
+    printer = ProgressPrinter(filename_for_msg, total_size)
+    downloaded_size = 0
+    with open(part_path, 'wb') as out_file:
+        while True:
+            if cancel_event.is_set(): return False, downloaded_size
+
+            buffer = response.read(DOWNLOAD_BLOCK_SIZE)
+            if not buffer: break
+            out_file.write(buffer)
+            if hasher: hasher.update_at(downloaded_size, buffer)
+            downloaded_size += len(buffer)
+            printer.update(downloaded_size)
+            if watch: watch.check(downloaded_size)
+            if throttle: throttle(len(buffer))
+    if total_size and downloaded_size != total_size:
+        raise Exception(f"网络中断: 数据不完整 {downloaded_size}/{total_size}")
+    return True, downloaded_size
+
+def plan_segments(total_size, segments=None):
+    segments = segments or DOWNLOAD_SEGMENTS
+    count = max(1, min(segments, total_size // DOWNLOAD_SEGMENT_MIN_SIZE))
+    step = total_size // count
+    # [start, end, pos]：pos 为该分段下一个待写入的字节
+    return [[i * step, total_size - 1 if i == count - 1 else (i + 1) * step - 1, i * step] for i in range(count)]
+
+def _stream_ranges(url, save_path, filename_for_msg, cancel_event, state, throttle=None, hasher=None, watch=None):
+    # 各分段以独立连接写入 .part 的各自偏移区间，进度定期落盘到 .part.json
+    part_path, _ = part_paths(save_path)
+    total_size = state["size"]
+    if not os.path.exists(part_path) or os.path.getsize(part_path) != total_size:
+        preallocate(part_path, total_size)
+
+    segments = state["segments"]
+    errors = []
+    state_lock = threading.Lock()
+    abort_event = threading.Event()
+    extra = {"If-Range": state["etag"]} if state.get("etag") and not state["etag"].startswith("W/") else {}
+
+    def downloaded():
+        return sum(seg[2] - seg[0] for seg in segments)
+
+    def worker(seg):
+        try:
+            headers = dict(extra, Range=f"bytes={seg[2]}-{seg[1]}")
+            with open_url(url, headers) as response:
+                content_range = parse_content_range(response.info().get('Content-Range', ''))
+                if response.status != 206 or not content_range or content_range[0] != seg[2]:
+                    raise Exception("服务器文件已变化或未按分段返回数据")
+                with open(part_path, 'r+b') as out_file:
+                    out_file.seek(seg[2])
+                    while seg[2] <= seg[1]:
+                        if cancel_event.is_set() or abort_event.is_set(): return
+                        buffer = response.read(min(DOWNLOAD_BLOCK_SIZE, seg[1] - seg[2] + 1))
+                        if not buffer: raise Exception("分段数据提前结束")
+                        out_file.write(buffer)
+                        if hasher:
+                            # 刷新后回读方可见；首段数据按顺序到达时直接计入哈希
+                            out_file.flush()
+                            hasher.update_at(seg[2], buffer)
+                        with state_lock: seg[2] += len(buffer)
+                        if throttle: throttle(len(buffer))
+        except Exception as e:
+            with state_lock: errors.append(e)
+            abort_event.set()
+
+    threads = [threading.Thread(target=worker, args=(seg,), daemon=True) for seg in segments if seg[2] <= seg[1]]
+    for t in threads: t.start()
+
+    printer = ProgressPrinter(filename_for_msg, total_size, downloaded())
+    last_save = time.time()
+    while any(t.is_alive() for t in threads):
+        time.sleep(0.2)
+        with state_lock: done, frontier = downloaded(), contiguous_done(segments)
+        printer.update(done)
+        if watch and not abort_event.is_set():
+            try: watch.check(done)
+            except SlowSourceError as e:
+                # 停止各分段后保存进度，换端点后从断点继续
+                with state_lock: errors.append(e)
+                abort_event.set()
+        if hasher: hasher.catch_up(part_path, frontier)
+        if time.time() - last_save > PART_STATE_SAVE_INTERVAL:
+            with state_lock: save_part_state(save_path, state)
+            last_save = time.time()
+    for t in threads: t.join()
+    save_part_state(save_path, state)
+
+    if cancel_event.is_set(): return False, downloaded()
+    if errors: raise errors[0]
+    if downloaded() != total_size: raise Exception("分段下载大小不一致")
+    return True, total_size
+
+def _attempt_download(url, save_path, filename_for_msg, cancel_event, throttle=None, hasher=None, stats=None, watch=None):
+    part_path, _ = part_paths(save_path)
+    # 每次尝试从头计算哈希，续传时已完成部分从 .part 回读
+    if hasher: hasher.reset()
+    # 以 Range: bytes=0-0 探测分段支持；服务器忽略 Range 时直接沿用该响应单线程下载
+    with open_url(url, {"Range": "bytes=0-0"}) as response:
+        if stats: stats.first_byte()
+        info = response.info()
+        if hasher: hasher.remote_hash = remote_sha256(info)
+        content_range = parse_content_range(info.get('Content-Range', ''))
+        if response.status != 206 or not content_range or not content_range[2]:
+            total_size = int(info.get('Content-Length', 0)) if response.status != 206 else 0
+            check_html_response(info.get('Content-Type', ''), total_size)
+            clear_part(save_path)
+            ensure_disk_space(save_path, total_size)
+            if response.status == 206:
+                with open_url(url) as full_response:
+                    ok, size = _stream_single(full_response, part_path, filename_for_msg, cancel_event, total_size, throttle, hasher, watch)
+            else:
+                ok, size = _stream_single(response, part_path, filename_for_msg, cancel_event, total_size, throttle, hasher, watch)
+            return ok, size, total_size
+
+        remote = {"url": url, "size": content_range[2], "etag": info.get('ETag', ''), "last_modified": info.get('Last-Modified', ''),
+                  "sha256": remote_sha256(info)}
+        check_html_response(info.get('Content-Type', ''), remote["size"])
+
+    state = prepare_range_state(save_path, remote, filename_for_msg)
+    ok, size = _stream_ranges(url, save_path, filename_for_msg, cancel_event, state, throttle, hasher, watch)
+    return ok, size, remote["size"]
+
+def download_with_progress(url, save_path, filename_for_msg, cancel_event, throttle=None, hasher=None, stats=None):
+    # url 可以是单个链接，也可以是探测排序后的 SourceRoute（出错或过慢时切换端点）
+    route = url if isinstance(url, SourceRoute) else SourceRoute([url])
     # 控制台简洁提示
     print(f"\n⬇️ [Path Fixer] 启动下载: {filename_for_msg}")
-    
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'}
-        req = urllib.request.Request(url, headers=headers)
-        
-        with urllib.request.urlopen(req, timeout=30) as response:
-            total_size = int(response.info().get('Content-Length', 0))
-            content_type = response.info().get('Content-Type', '')
-            
-            if 'text/html' in content_type and total_size < 100 * 1024:
-                raise Exception("链接返回了HTML页面，可能是无效链接。")
-
-            with open(save_path, 'wb') as out_file:
-                downloaded_size = 0
-                block_size = 32768
-                last_report_time = 0
-                start_time = time.time()
-                
-                while True:
-                    if cancel_event.is_set():
-                        print(f"\n🚫 [Path Fixer] 用户中断: {filename_for_msg}")
-                        return False, "用户中断"
-
-                    try:
-                        buffer = response.read(block_size)
-                    except Exception as e:
-                        raise Exception(f"网络中断: {str(e)}")
-
-                    if not buffer: break
-                    
-                    out_file.write(buffer)
-                    downloaded_size += len(buffer)
-                    
-                    current_time = time.time()
-                    if current_time - last_report_time > 0.5:
-                        progress = (downloaded_size / total_size) * 100 if total_size > 0 else 0
-                        speed = downloaded_size / (current_time - start_time + 0.001) / 1024 / 1024 
-                        sys.stdout.write(f"\r⏳ 下载中 [{filename_for_msg}]: {progress:.1f}% | {speed:.2f} MB/s")
-                        sys.stdout.flush()
-                        report_progress(filename_for_msg, downloaded_size, total_size)
-                        last_report_time = current_time
-            
+
+    attempt = 0
+    while True:
+        try:
+            ok, downloaded_size, total_size = _attempt_download(route.url, save_path, filename_for_msg, cancel_event, throttle, hasher, stats, route.watch())
+            if not ok:
+                print(f"\n🚫 [Path Fixer] 已停止: {filename_for_msg}")
+                return False, "用户中断"
+            if hasher: hasher.finish(part_paths(save_path)[0], downloaded_size)
+            finalize_part(save_path, total_size)
             sys.stdout.write(f"\r✅ 下载完成 [{filename_for_msg}]: 100%                 \n")
             sys.stdout.flush()
             report_progress(filename_for_msg, downloaded_size, total_size)
-            
-        return True, ""
-    except Exception as e:
-        sys.stdout.write("\n")
-        return False, str(e)
+            return True, ""
+        except Exception as e:
+            sys.stdout.write("\n")
+            if not is_disk_full(e) and route.failover(e, is_transient_error(e)):
+                print(f"🔀 [Path Fixer] 切换下载源 → {route.endpoint}: {e}")
+                continue
+            attempt += 1
+            if not is_transient_error(e) or attempt > DOWNLOAD_RETRIES:
+                return False, str(e)
+            delay = retry_delay(attempt)
+            print(f"⚠️ [Path Fixer] 下载出错，{delay:.0f} 秒后重试 ({attempt}/{DOWNLOAD_RETRIES}): {e}")
+            if stats: stats.retry()
+            if cancel_event.wait(delay):
+                print(f"\n🚫 [Path Fixer] 用户中断: {filename_for_msg}")
+                return False, "用户中断"
 
 def report_progress(filename, current, total):
-    server.PromptServer.instance.send_sync("model_fixer_download_progress", {
-        "filename": filename, "current": current, "total": total
+    # 只更新内存中的进度，由 download_progress 按间隔合并推送
+    download_scheduler.update_progress(filename, current, total)
+    download_progress.update(filename, current, total)
+
+def resolve_download_url(url, source):
+    # 按来源偏好排在首位的端点，用于排队时的大小探测与带宽分组；实际下载前再探测全部候选端点
+    return candidate_urls(url, source)[0]
+
+_probe_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="path_fixer_probe")
+
+def probe_endpoint(url):
+    start = time.perf_counter()
+    try:
+        with open_url(url, {"Range": "bytes=0-0"}, timeout=DOWNLOAD_PROBE_TIMEOUT) as response:
+            latency = time.perf_counter() - start
+            info = response.info()
+            content_range = parse_content_range(info.get('Content-Range', ''))
+            size = content_range[2] if response.status == 206 and content_range else int(info.get('Content-Length', 0))
+            check_html_response(info.get('Content-Type', ''), size)
+            return {"ok": True, "latency": latency, "size": size, "sha256": remote_sha256(info)}
+    except Exception as e:
+        # 404 / 403 / HTML 页面等说明该端点没有此文件，超时与 5xx 则仍作为后备端点
+        return {"ok": False, "permanent": not is_transient_error(e), "error": str(e)}
+
+def plan_route(urls):
+    # 并行探测全部候选端点，最优结果确定后不再等待其余端点
+    if len(urls) < 2 or not DOWNLOAD_PROBE_TIMEOUT: return SourceRoute(urls, source_router)
+    futures = {_probe_pool.submit(probe_endpoint, url): i for i, url in enumerate(urls)}
+    results = [None] * len(urls)
+    start = time.perf_counter()
+    pending = set(futures)
+    while pending:
+        remaining = DOWNLOAD_PROBE_TIMEOUT - (time.perf_counter() - start)
+        if remaining <= 0: break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done: results[futures[future]] = future.result()
+        if source_router.decided(results, time.perf_counter() - start): break
+    # 未返回的探测继续进行，下载中途据其结果判断能否因过慢切换过去
+    return source_router.route(urls, results, {futures[f]: f for f in pending})
+
+def probe_remote_size(url, timeout=15):
+    with open_url(url, {"Range": "bytes=0-0"}, timeout=timeout) as response:
+        content_range = parse_content_range(response.info().get('Content-Range', ''))
+        if response.status == 206: return content_range[2] if content_range else None
+        return int(response.info().get('Content-Length', 0)) or None
+
+def send_status(filename, success, error_msg, path=None):
+    download_progress.remove(filename)
+    server.PromptServer.instance.send_sync("model_fixer_download_status", {
+        "filename": filename, "success": success, "error": error_msg, "path": path if success else None
     })
 
-def run_download_task(url, repo_id, filename, save_dir, source="HF Mirror"):
-    safe_filename = os.path.basename(filename) 
-    full_path = os.path.join(save_dir, safe_filename)
-    
-    # 强制转换直链和镜像
-    final_url = url.replace("huggingface.co", "hf-mirror.com") if source == "HF Mirror" else url
-    final_url = final_url.replace("/blob/", "/resolve/")
+def quarantine_file(full_path):
+    target = full_path + QUARANTINE_SUFFIX
+    os.replace(full_path, target)
+    return target
 
-    cancel_event = threading.Event()
-    with download_lock:
-        cancel_flags[safe_filename] = cancel_event
+def verify_download(full_path, hasher, expected):
+    # 校验通过（或无可比对哈希）时把流式算出的 sha256 与指纹写入指纹库，免去后台再读一遍文件
+    digest = hasher.digest if hasher else None
+    if not digest: return
+    expected = expected or hasher.remote_hash
+    if expected and digest != expected:
+        target = quarantine_file(full_path)
+        print(f"\n❌ [Path Fixer] SHA256 校验失败，已隔离: {target}")
+        raise PermanentDownloadError(f"SHA256 校验失败 (期望 {expected[:12]}…，实际 {digest[:12]}…)，文件已隔离为 {os.path.basename(target)}")
+    st = os.stat(full_path)
+    fingerprint_store.record(full_path, st.st_size, st.st_mtime_ns, fp=compute_fingerprint(full_path, st.st_size), sha256=digest)
+    fingerprint_store.save()
 
-    success = False
-    error_msg = ""
-    
+def finish_download(task, full_path, success, error_msg, hasher=None, stats=None):
+    # 两种下载引擎共用的收尾：暂停 / 中断清理 / 空文件检查 / 哈希校验 / 状态推送
+    result = "failed"
     try:
-        if source == "ModelScope":
-            try:
-                from modelscope.hub.file_download import model_file_download
-                # ModelScope logic placeholder
-                pass 
-            except ImportError: raise ImportError("未安装 modelscope")
-        else:
-            if not os.path.exists(save_dir): os.makedirs(save_dir)
-            success, error_msg = download_with_progress(final_url, full_path, safe_filename, cancel_event)
-            
-            if not success and error_msg == "用户中断":
-                if os.path.exists(full_path):
-                    try: os.remove(full_path)
-                    except: pass
-                raise Exception("下载已中断")
-            
-            if not success: raise Exception(error_msg)
-            
-            # 空文件检查
-            if os.path.exists(full_path) and os.path.getsize(full_path) < 1024:
-                try: os.remove(full_path)
-                except: pass
-                raise Exception("文件过小，可能是无效链接")
+        if not success and error_msg == "用户中断":
+            # 暂停时保留 .part 等待恢复，不发送结束状态
+            if task.stop_reason != "cancel":
+                download_progress.remove(os.path.basename(full_path))
+                if stats: stats.finish("paused")
+                return "paused"
+            # 用户主动中断时清理残留；网络失败则保留 .part 供下次续传
+            clear_part(full_path)
+            result = "cancelled"
+            raise Exception("下载已中断")
+        
+        if not success: raise Exception(error_msg)
+        
+        # 空文件检查
+        if os.path.exists(full_path) and os.path.getsize(full_path) < 1024:
+            try: os.remove(full_path)
+            except: pass
+            raise Exception("文件过小，可能是无效链接")
 
+        verify_download(full_path, hasher, task.args[5])
         success = True
+        result = "ok"
+        model_index.invalidate(full_path)
     except Exception as e:
         error_msg = str(e)
         success = False
         if os.path.exists(full_path):
             try: os.remove(full_path)
             except: pass
-    finally:
-        with download_lock:
-            active_downloads.discard(safe_filename)
-            if safe_filename in cancel_flags: del cancel_flags[safe_filename]
-    
-    server.PromptServer.instance.send_sync("model_fixer_download_status", {
-        "filename": safe_filename, "success": success, "error": error_msg, "path": full_path if success else None
-    })
+    if stats: stats.finish(result)
+    send_status(os.path.basename(full_path), success, error_msg, full_path)
+
+def run_download_task(task):
+    url, repo_id, filename, save_dir, source, expected_sha256 = task.args
+    safe_filename = os.path.basename(filename) 
+    full_path = os.path.join(save_dir, safe_filename)
+    hasher = StreamHasher() if DOWNLOAD_VERIFY_SHA256 else None
+    stats = DownloadStats(safe_filename)
+    route = None
+    def throttle(n):
+        stats.add(n)
+        download_scheduler.limiter.throttle(route.url, n)
+
+    try:
+        if not os.path.exists(save_dir): os.makedirs(save_dir)
+        route = plan_route(candidate_urls(url, source))
+        success, error_msg = download_with_progress(route, full_path, safe_filename, task.cancel_event, throttle, hasher, stats)
+    except Exception as e:
+        success, error_msg = False, str(e)
+    return finish_download(task, full_path, success, error_msg, hasher, stats)
+
+async def run_download_task_async(task):
+    from .aio_downloader import download_async, plan_route_async
+    url, repo_id, filename, save_dir, source, expected_sha256 = task.args
+    loop = asyncio.get_running_loop()
+    safe_filename = os.path.basename(filename)
+    full_path = os.path.join(save_dir, safe_filename)
+    hasher = StreamHasher() if DOWNLOAD_VERIFY_SHA256 else None
+    stats = DownloadStats(safe_filename)
+    route = None
+    def throttle_delay(n):
+        stats.add(n)
+        return download_scheduler.limiter.delay(route.url, n)
+
+    try:
+        await loop.run_in_executor(None, lambda: os.makedirs(save_dir, exist_ok=True))
+        route = await plan_route_async(candidate_urls(url, source))
+        success, error_msg = await download_async(route, full_path, safe_filename, task.cancel_event, throttle_delay, hasher, stats)
+    except Exception as e:
+        success, error_msg = False, str(e)
+    return await loop.run_in_executor(None, finish_download, task, full_path, success, error_msg, hasher, stats)
+
+def _on_task_dropped(task):
+    clear_part(task_save_path(task))
+    if task.stop_reason == "blocked":
+        metrics.inc("download_disk_rejections_total", stage="queue")
+        print(f"⚠️ [Path Fixer] {task.filename}: {task.blocked}，已移出队列")
+    send_status(task.filename, False, task.blocked if task.stop_reason == "blocked" else "下载已中断")
+
+def _disk_admit(task, running):
+    # 排队任务开始前按剩余空间检查，放不下的先让位给后面的小任务
+    save_path = task_save_path(task)
+    return check_space(task.args[3], task.size, part_paths(save_path)[0],
+                       [(t.size, part_paths(task_save_path(t))[0]) for t in running])
+
+def catalog_hash_for_url(url):
+    link_catalog.refresh()
+    return link_catalog.hash_for_url(url)
+
+def disk_preflight(target_dir, save_path, size):
+    # 提交时预检：连同运行中任务都放不下则拒绝；再加上排队任务放不下时仍接受，但返回提示（调度时会让位给放得下的任务）
+    part_path = part_paths(save_path)[0]
+    commitments = lambda states: [(t.size, part_paths(task_save_path(t))[0]) for t in download_scheduler.tasks(states)]
+    reason = check_space(target_dir, size, part_path, commitments(("running",)))
+    if reason: return reason, None
+    return None, check_space(target_dir, size, part_path, commitments(("running", "queued")))
+
+download_scheduler = DownloadScheduler(
+    run_download_task, download_lock, active_downloads, cancel_flags,
+    max_workers=DOWNLOAD_MAX_CONCURRENT, prober=probe_remote_size, on_dropped=_on_task_dropped,
+    limiter=BandwidthLimiter(DOWNLOAD_BANDWIDTH_LIMIT, DOWNLOAD_HOST_BANDWIDTH_LIMIT),
+    async_runner=run_download_task_async if DOWNLOAD_ENGINE == "aiohttp" else None, admit=_disk_admit
+)
+
+def _scheduler_stats():
+    snap = download_scheduler.snapshot()
+    return {"downloads_running": snap["running"], "downloads_queued": snap["queued"],
+            "downloads_paused": snap["paused"], "download_throughput_bytes": round(snap["throughput"], 1)}
+
+metrics.add_collector(_scheduler_stats)
 
 async def handle_download_request(request):
     try:
@@ -175,6 +561,10 @@ async def handle_download_request(request):
         if not raw_filename: raw_filename = os.path.basename(normalize_path(url))
         safe_filename = os.path.basename(raw_filename)
 
+        # 已暂停的同名任务直接恢复
+        if download_scheduler.resume(safe_filename):
+            return web.json_response({"success": True, "status": "queued", "message": "已恢复排队"})
+
         with download_lock:
             if safe_filename in active_downloads:
                 return web.json_response({"success": False, "status": "downloading", "message": "任务进行中"})
@@ -182,31 +572,76 @@ async def handle_download_request(request):
             save_path = os.path.join(target_dir, safe_filename)
             if os.path.exists(save_path):
                 return web.json_response({"success": True, "status": "exists", "message": "文件已存在"})
-            
+            # 先占住文件名：下面的探测会让出事件循环，期间同名的重复请求直接返回"任务进行中"
             active_downloads.add(safe_filename)
 
-        thread = threading.Thread(target=run_download_task, args=(url, repo_id, raw_filename, target_dir, source))
-        thread.daemon = True
-        thread.start()
-        
-        return web.json_response({"success": True, "status": "started", "message": "已启动"})
+        task = None
+        try:
+            # aiohttp 引擎直接在 ComfyUI 的事件循环上运行下载协程
+            if download_scheduler.loop is None: download_scheduler.loop = asyncio.get_running_loop()
+
+            priority = int(json_data.get("priority", 0) or 0)
+            # 前端传来的大小可能是字符串或无效值：无法解析时按未给出处理，改为探测
+            try: size = int(json_data.get("size") or 0) or None
+            except (TypeError, ValueError): size = None
+            if size is not None and size < 0: size = None
+            final_url = resolve_download_url(url, source)
+            # 磁盘空间预检：前端未给出大小时先读取 Content-Length（探测失败则交给下载前的检查）
+            if not size:
+                try: size = await asyncio.get_running_loop().run_in_executor(None, probe_remote_size, final_url, DOWNLOAD_PROBE_TIMEOUT or 15)
+                except Exception: size = None
+            rejected, warning = await asyncio.get_running_loop().run_in_executor(None, disk_preflight, target_dir, save_path, size)
+            if rejected:
+                metrics.inc("download_disk_rejections_total", stage="submit")
+                return web.json_response({"success": False, "status": "no_space", "message": rejected})
+            # 期望哈希：前端随下载请求带上（取自选中的链接条目），否则按下载链接查链接库
+            expected_sha256 = as_sha256(json_data.get("sha256"))
+            if not expected_sha256:
+                # 刷新要 stat 各链接库文件、变化时重新加载，查库也是阻塞调用：放到线程池
+                expected_sha256 = as_sha256(await asyncio.get_running_loop().run_in_executor(None, catalog_hash_for_url, url))
+            task = download_scheduler.submit(safe_filename, final_url,
+                                             (url, repo_id, raw_filename, target_dir, source, expected_sha256), priority, size)
+            if task is None:
+                return web.json_response({"success": False, "status": "downloading", "message": "任务进行中"})
+        finally:
+            # 被拒绝或出错时归还占用的文件名（已有同名任务时保留）
+            if task is None: download_scheduler.release(safe_filename)
+
+        response = {"success": True, "status": "started", "message": "已加入下载队列", "state": task.state}
+        if warning: response["warning"] = f"{warning}。排队中的任务总量超出剩余空间，该任务可能被延后或移出队列"
+        return web.json_response(response)
     except Exception as e:
-        if 'safe_filename' in locals():
-            with download_lock: active_downloads.discard(safe_filename)
         return web.json_response({"success": False, "message": str(e)})
 
 async def handle_cancel_request(request):
     try:
         json_data = await request.json()
         filename = json_data.get("filename")
-        with download_lock:
-            if filename in cancel_flags:
-                cancel_flags[filename].set()
-                return web.json_response({"success": True, "message": "中断信号已发送"})
-            else:
-                return web.json_response({"success": False, "message": "任务不存在"})
+        if download_scheduler.cancel(filename):
+            return web.json_response({"success": True, "message": "中断信号已发送"})
+        return web.json_response({"success": False, "message": "任务不存在"})
+    except Exception as e:
+        return web.json_response({"success": False, "message": str(e)})
+
+async def handle_pause_request(request):
+    try:
+        json_data = await request.json()
+        if download_scheduler.pause(json_data.get("filename")):
+            return web.json_response({"success": True, "message": "已暂停"})
+        return web.json_response({"success": False, "message": "任务不存在或已暂停"})
+    except Exception as e:
+        return web.json_response({"success": False, "message": str(e)})
+
+async def handle_resume_request(request):
+    try:
+        json_data = await request.json()
+        if download_scheduler.resume(json_data.get("filename")):
+            return web.json_response({"success": True, "message": "已恢复排队"})
+        return web.json_response({"success": False, "message": "任务不存在或未暂停"})
     except Exception as e:
         return web.json_response({"success": False, "message": str(e)})
 
 async def handle_get_active_tasks(request):
-    return web.json_response({"active": list(active_downloads)})
\ No newline at end of file
+    with download_lock:
+        active = list(active_downloads)
+    return web.json_response(dict(download_scheduler.snapshot(), active=active))
\ No newline at end of file
@@ -0,0 +1,419 @@
+import os
+import time
+import threading
+import folder_paths
+from concurrent.futures import ThreadPoolExecutor, wait
+from .core_utils import normalize_path
+from .config import (
+    DIR_MODEL_TYPES, INDEX_EXCLUDED_TYPES, INDEX_FULL_CHECK_INTERVAL, INDEX_SCAN_WORKERS, INDEX_ROOT_TIMEOUT,
+    INDEX_WARMUP_TIMEOUT
+)
+from .metrics import metrics
+
+EXCLUDED_DIR_NAMES = {".git"}
+# 截止时间前未扫描到的目录占位：mtime 为 None，下次刷新时强制重扫
+PENDING_STATE = (None, [], [])
+
+def _scan_dir(path):
+    # 先取 mtime 再列目录：列目录期间发生的变动会在下一次检查时被捕获
+    mtime = os.stat(path).st_mtime_ns
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=True):
+                    if entry.name not in EXCLUDED_DIR_NAMES: subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+            except OSError: continue
+    return mtime, files, subdirs
+
+def _join_rel(rel_dir, name):
+    return os.path.join(rel_dir, name) if rel_dir else name
+
+# 常驻内存的模型文件索引：按目录 mtime 增量刷新，/fix 请求只做字典查询
+class ModelFileIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (root, dirs_only) -> {rel_dir: (mtime_ns, files, subdirs)}
+        self._roots = {}
+        # model_type -> [((root, dirs_only), extensions)]
+        self._bindings = {}
+        self._signature = None
+        # basename(lower) -> [{"full_path", "model_type", "abs_path"}]
+        self._index = {}
+        self._dirty = set()
+        self._observer = None
+        self._watches = {}
+        self._last_full_check = 0
+        self._listeners = []
+        self.generation = 0
+        # 按文件名计的变更版本；整体重建时清空并递增 _epoch
+        self._versions = {}
+        self._epoch = 0
+        # 并行扫描：进行中的 future、过期根目录（timeout / partial）、最近一次扫描耗时
+        self._scans = {}
+        self._stale = {}
+        self._scan_seconds = {}
+
+    # ---------- 注册表 ----------
+    def _collect_bindings(self):
+        bindings = {}
+        for m_type, value in list(folder_paths.folder_names_and_paths.items()):
+            if m_type in INDEX_EXCLUDED_TYPES or m_type in DIR_MODEL_TYPES: continue
+            paths, exts = value[0], value[1]
+            exts = frozenset(e.lower() for e in exts)
+            bindings[m_type] = [((os.path.abspath(p), False), exts) for p in dict.fromkeys(paths)]
+        # LLM/TTS 以子文件夹为单位，只看顶层目录
+        for m_type in DIR_MODEL_TYPES:
+            bindings[m_type] = [((os.path.abspath(os.path.join(folder_paths.models_dir, m_type)), True), frozenset())]
+        return bindings
+
+    @staticmethod
+    def _signature_of(bindings):
+        return tuple(sorted((t, tuple((k, tuple(sorted(e))) for k, e in b)) for t, b in bindings.items()))
+
+    # ---------- 目录扫描（线程池中执行，只读写传入的 states 副本） ----------
+    def _scan_tree(self, root, dirs_only, rel_dir, states, added, deadline):
+        stack = [rel_dir]
+        while stack:
+            if time.monotonic() > deadline:
+                # 超时：剩余目录留待下次刷新，已扫描部分照常生效
+                for rel in stack: states[rel] = PENDING_STATE
+                return
+            rel = stack.pop()
+            try:
+                mtime, files, subdirs = _scan_dir(os.path.join(root, rel))
+            except OSError:
+                states.pop(rel, None)
+                continue
+            states[rel] = (mtime, files, subdirs)
+            if dirs_only:
+                added.extend(subdirs)
+                continue
+            added.extend(_join_rel(rel, f) for f in files)
+            stack.extend(_join_rel(rel, d) for d in subdirs)
+
+    def _drop_tree(self, dirs_only, rel_dir, states, removed):
+        prefix = rel_dir + os.sep
+        for rel in [r for r in states if r == rel_dir or r.startswith(prefix)]:
+            _, files, subdirs = states.pop(rel)
+            if dirs_only: removed.extend(subdirs)
+            else: removed.extend(_join_rel(rel, f) for f in files)
+
+    def _rescan_dir(self, root, dirs_only, rel, states, added, removed, deadline):
+        old = states.get(rel)
+        if old is None: return
+        try:
+            mtime, files, subdirs = _scan_dir(os.path.join(root, rel))
+        except OSError:
+            self._drop_tree(dirs_only, rel, states, removed)
+            return
+        states[rel] = (mtime, files, subdirs)
+        _, old_files, old_subdirs = old
+        if dirs_only:
+            old_set, new_set = set(old_subdirs), set(subdirs)
+            added.extend(d for d in subdirs if d not in old_set)
+            removed.extend(d for d in old_subdirs if d not in new_set)
+            return
+        old_set, new_set = set(old_files), set(files)
+        added.extend(_join_rel(rel, f) for f in files if f not in old_set)
+        removed.extend(_join_rel(rel, f) for f in old_files if f not in new_set)
+        old_dirs, new_dirs = set(old_subdirs), set(subdirs)
+        for d in old_subdirs:
+            if d not in new_dirs: self._drop_tree(dirs_only, _join_rel(rel, d), states, removed)
+        for d in subdirs:
+            if d not in old_dirs: self._scan_tree(root, dirs_only, _join_rel(rel, d), states, added, deadline)
+
+    def _scan_root(self, key, states, full_check, forced, deadline):
+        # 返回 (states, added, removed, 待重扫目录, 耗时)；states 为 None 表示首次扫描
+        start = time.perf_counter()
+        root, dirs_only = key
+        added, removed, retry = [], [], []
+        if not states:
+            # 首次扫描，或根目录此前不存在
+            states = {}
+            if os.path.isdir(root): self._scan_tree(root, dirs_only, "", states, added, deadline)
+        else:
+            targets = list(states) if full_check else [rel for rel in forced if rel in states]
+            for i, rel in enumerate(targets):
+                if time.monotonic() > deadline:
+                    retry.extend(targets[i:])
+                    break
+                st = states.get(rel)
+                if st is None: continue
+                try:
+                    mtime = os.stat(os.path.join(root, rel)).st_mtime_ns
+                except OSError:
+                    self._drop_tree(dirs_only, rel, states, removed)
+                    continue
+                if mtime != st[0] or rel in forced:
+                    self._rescan_dir(root, dirs_only, rel, states, added, removed, deadline)
+        retry.extend(rel for rel, st in states.items() if st[0] is None)
+        return states, added, removed, retry, time.perf_counter() - start
+
+    def _submit_scans(self, keys, full_check, dirty, timeout):
+        # 调用方持锁：各根目录并行扫描，返回本轮提交的 future；网络盘卡住时其线程继续运行，结果在之后的刷新中合并
+        deadline = time.monotonic() + timeout
+        submitted = []
+        for key in keys:
+            root = key[0]
+            forced = {os.path.relpath(d, root) for d in dirty if d == root or d.startswith(root + os.sep)}
+            forced = {"" if t == "." else t for t in forced}
+            if key in self._scans:
+                # 上一轮扫描仍未返回：不重复提交，变动标记留到下次
+                self._dirty |= {os.path.join(root, rel) if rel else root for rel in forced}
+                continue
+            states = self._roots.get(key)
+            if states and not full_check and not forced: continue
+            future = _scan_pool.submit(self._scan_root, key, dict(states) if states else None, full_check, forced, deadline)
+            self._scans[key] = (future, time.perf_counter(), deadline)
+            submitted.append(future)
+        return submitted
+
+    def _collect_scans(self, keys):
+        # 返回已完成扫描的 {key: (added, removed)}，未完成的根目录标记为过期
+        results = {}
+        for key, (future, started, deadline) in list(self._scans.items()):
+            root = key[0]
+            if not future.done():
+                # 释放锁等待期间其他刷新也会来收集：仍在截止时间内的扫描不算超时
+                if time.monotonic() < deadline: continue
+                if key not in self._stale:
+                    print(f"⚠️ [Path Fixer] 模型目录扫描超时，暂用已有结果: {root}")
+                self._stale[key] = "timeout"
+                self._scan_seconds[key] = time.perf_counter() - started
+                metrics.set("index_root_stale", 1, root=root)
+                continue
+            del self._scans[key]
+            try:
+                states, added, removed, retry, seconds = future.result()
+            except Exception as e:
+                print(f"⚠️ [Path Fixer] 模型目录扫描出错 {root}: {e}")
+                continue
+            if key not in keys: continue
+            self._roots[key] = states
+            self._dirty |= {os.path.join(root, rel) if rel else root for rel in retry}
+            if retry: self._stale[key] = "partial"
+            else: self._stale.pop(key, None)
+            self._scan_seconds[key] = seconds
+            metrics.observe("index_root_scan_seconds", seconds, root=root)
+            metrics.set("index_root_last_scan_seconds", round(seconds, 6), root=root)
+            metrics.set("index_root_stale", 1 if retry else 0, root=root)
+            metrics.set("index_root_pending_dirs", len(retry), root=root)
+            results[key] = (added, removed)
+        return results
+
+    # ---------- 索引维护 ----------
+    def _entries_for(self, m_type, key, exts, rel_paths):
+        root = key[0]
+        for rel in rel_paths:
+            if exts and os.path.splitext(rel)[1].lower() not in exts: continue
+            yield os.path.basename(normalize_path(rel)).lower(), {
+                "full_path": rel, "model_type": m_type, "abs_path": os.path.join(root, rel)
+            }
+
+    def _apply_changes(self, key, added, removed):
+        changed = set()
+        for m_type, bindings in self._bindings.items():
+            for b_key, exts in bindings:
+                if b_key != key: continue
+                for base_name, entry in self._entries_for(m_type, key, exts, removed):
+                    bucket = self._index.get(base_name)
+                    if not bucket: continue
+                    bucket[:] = [e for e in bucket if not (e["abs_path"] == entry["abs_path"] and e["model_type"] == m_type)]
+                    if not bucket: del self._index[base_name]
+                    changed.add(base_name)
+                for base_name, entry in self._entries_for(m_type, key, exts, added):
+                    self._index.setdefault(base_name, []).append(entry)
+                    changed.add(base_name)
+        return changed
+
+    def _rebuild_index(self):
+        self._index = {}
+        for m_type, bindings in self._bindings.items():
+            for key, exts in bindings:
+                states = self._roots.get(key, {})
+                if key[1]:
+                    rel_paths = [d for st in states.values() for d in st[2]]
+                else:
+                    rel_paths = [_join_rel(rel, f) for rel, st in states.items() for f in st[1]]
+                for base_name, entry in self._entries_for(m_type, key, exts, rel_paths):
+                    self._index.setdefault(base_name, []).append(entry)
+
+    def refresh(self, force=False):
+        start = time.perf_counter()
+        # 持锁只做快照与提交扫描；等待扫描结果时释放锁，卡住的网络盘不会阻塞事件循环上的 lookup / stats
+        with self._lock:
+            bindings = self._collect_bindings()
+            signature = self._signature_of(bindings)
+            now = time.time()
+            full_check = force or self._observer is None or now - self._last_full_check > INDEX_FULL_CHECK_INTERVAL
+            dirty, self._dirty = self._dirty, set()
+            # 后台预热允许更长的截止时间，请求中的刷新不因个别慢目录阻塞
+            timeout = INDEX_WARMUP_TIMEOUT if force else INDEX_ROOT_TIMEOUT
+
+            rebuild = signature != self._signature
+            if rebuild:
+                # 注册表变化（新增 extra_model_paths 等）：补扫新根目录并整体重建索引
+                self._bindings = bindings
+                self._signature = signature
+                keys = {key for b in bindings.values() for key, _ in b}
+                for key in list(self._roots):
+                    if key not in keys: del self._roots[key]
+                for key in list(self._stale) + list(self._scan_seconds):
+                    if key not in keys:
+                        self._stale.pop(key, None)
+                        self._scan_seconds.pop(key, None)
+                submitted = self._submit_scans(keys, True, dirty, timeout)
+            else:
+                keys = set(self._roots) | set(self._scans)
+                submitted = self._submit_scans(keys, full_check, dirty, timeout)
+
+        # 线程池中工作线程检查同一截止时间，这里多等片刻以便收尾
+        if submitted: wait(submitted, timeout=timeout + 0.5)
+
+        with self._lock:
+            if rebuild:
+                self._collect_scans(keys)
+                self._rebuild_index()
+                self._sync_watches(keys)
+                self._last_full_check = now
+                self.generation += 1
+                self._versions = {}
+                self._epoch += 1
+                self._notify(set(self._index), True)
+                self._record_refresh(start, "rebuild")
+                return self.generation
+
+            changed = set()
+            for key, (added, removed) in self._collect_scans(keys).items():
+                if added or removed: changed |= self._apply_changes(key, added, removed)
+            if full_check: self._last_full_check = now
+            if changed:
+                self.generation += 1
+                for base_name in changed: self._versions[base_name] = self._versions.get(base_name, 0) + 1
+                self._notify(changed, False)
+            self._record_refresh(start, "changed" if changed else "unchanged")
+            return self.generation
+
+    def _record_refresh(self, start, result):
+        # unchanged 即命中缓存：只做了 stat，没有重新列目录
+        metrics.observe("index_refresh_seconds", time.perf_counter() - start, result=result)
+        metrics.inc("index_refresh_total", result=result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "index_basenames": len(self._index),
+                "index_entries": sum(len(b) for b in self._index.values()),
+                "index_dirs": sum(len(states) for states in self._roots.values()),
+                "index_roots": len(self._roots),
+                "index_generation": self.generation,
+                "index_stale_roots": len(self._stale),
+            }
+
+    def stale_roots(self):
+        # [{"root", "status", "seconds"}]：超时仍在扫描（timeout）或本轮只扫描了部分目录（partial）
+        with self._lock:
+            return [{"root": key[0], "status": status, "seconds": round(self._scan_seconds.get(key, 0.0), 3)}
+                    for key, status in self._stale.items()]
+
+    def scan_report(self):
+        # 各根目录最近一次扫描耗时，慢的在前，用于定位拖慢刷新的网络盘
+        with self._lock:
+            report = [{"root": key[0], "seconds": round(seconds, 4), "stale": self._stale.get(key)}
+                      for key, seconds in self._scan_seconds.items()]
+        return sorted(report, key=lambda r: -r["seconds"])
+
+    def add_listener(self, callback):
+        # callback(changed_basenames, full_rebuild)，在索引锁内调用，需保持轻量
+        with self._lock:
+            self._listeners.append(callback)
+            if self._signature is not None: callback(set(self._index), True)
+
+    def _notify(self, changed, full_rebuild):
+        for callback in self._listeners:
+            try: callback(changed, full_rebuild)
+            except Exception as e: print(f"⚠️ [Path Fixer] 索引监听回调出错: {e}")
+
+    def invalidate(self, path):
+        # 下载完成/删除文件后主动标记目录，避免 mtime 精度不足导致漏检
+        path = os.path.abspath(path)
+        with self._lock:
+            self._dirty.add(path if os.path.isdir(path) else os.path.dirname(path))
+
+    # ---------- 查询 ----------
+    def lookup(self, base_name):
+        with self._lock:
+            return list(self._index.get(base_name, ()))
+
+    def version_of(self, base_name):
+        # 该文件名最近一次增删对应的版本，用于细粒度判断缓存结果是否过期
+        with self._lock:
+            return self._epoch, self._versions.get(base_name, 0)
+
+    def entries_for_path(self, abs_path):
+        abs_path = os.path.abspath(abs_path)
+        return [e for e in self.lookup(os.path.basename(abs_path).lower()) if e["abs_path"] == abs_path]
+
+    def basenames(self):
+        with self._lock:
+            return list(self._index)
+
+    def snapshot(self, model_types=None):
+        wanted = set(model_types) if model_types is not None else None
+        with self._lock:
+            result = {}
+            for base_name, bucket in self._index.items():
+                entries = [e for e in bucket if wanted is None or e["model_type"] in wanted]
+                if entries: result[base_name] = entries
+            return result
+
+    # ---------- 文件系统监听 (可选依赖 watchdog) ----------
+    def _sync_watches(self, keys):
+        if self._observer is None: return
+        roots = {root for root, _ in keys if os.path.isdir(root)}
+        for root in list(self._watches):
+            if root not in roots:
+                try: self._observer.unschedule(self._watches.pop(root))
+                except Exception: pass
+        for root in roots:
+            if root in self._watches: continue
+            try: self._watches[root] = self._observer.schedule(self._handler, root, recursive=True)
+            except Exception: pass
+
+    def _mark_dirty(self, path):
+        with self._lock:
+            self._dirty.add(os.path.dirname(os.path.abspath(path)))
+
+    def start(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+
+            index = self
+            class _Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    index._mark_dirty(event.src_path)
+                    dest = getattr(event, "dest_path", None)
+                    if dest: index._mark_dirty(dest)
+
+            self._handler = _Handler()
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        except ImportError:
+            self._observer = None
+        except Exception as e:
+            print(f"⚠️ [Path Fixer] 文件监听启动失败，改用 mtime 轮询: {e}")
+            self._observer = None
+
+        # 后台预热，首次 /fix 请求无需等待全量扫描
+        thread = threading.Thread(target=self.refresh, kwargs={"force": True})
+        thread.daemon = True
+        thread.start()
+
+_scan_pool = ThreadPoolExecutor(max_workers=INDEX_SCAN_WORKERS, thread_name_prefix="path_fixer_scan")
+model_index = ModelFileIndex()
+metrics.add_collector(model_index.stats)
@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import struct
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import FINGERPRINT_STORE, FINGERPRINT_SAMPLE_BYTES, FINGERPRINT_WORKERS, FINGERPRINT_AUTO_SCAN, DIR_MODEL_TYPES
+from .file_index import model_index
+from .metrics import metrics
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+FINGERPRINT_PREFIX = "fp1:"
+# safetensors 头部上限，超出视为非法文件按普通文件处理
+MAX_SAFETENSORS_HEADER = 100 * 1024 * 1024
+HASH_READ_SIZE = 4 * 1024 * 1024
+_SHA256_RE = re.compile(r'[0-9a-f]{64}')
+
+def fingerprint_head_length(path, head):
+    # safetensors: 8 字节头长度 + JSON 头，头部之后再取一段张量数据，避免同结构不同权重撞指纹
+    if path.lower().endswith(".safetensors") and len(head) >= 8:
+        header_len = struct.unpack("<Q", head[:8])[0]
+        if header_len <= MAX_SAFETENSORS_HEADER: return 8 + header_len + FINGERPRINT_SAMPLE_BYTES
+    return FINGERPRINT_SAMPLE_BYTES
+
+def make_fingerprint(size, head, tail):
+    h = hashlib.sha256()
+    h.update(str(size).encode())
+    h.update(head)
+    h.update(tail)
+    return FINGERPRINT_PREFIX + h.hexdigest()
+
+def compute_fingerprint(path, size=None):
+    if size is None: size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        head += f.read(fingerprint_head_length(path, head) - len(head))
+        tail = b""
+        if size > len(head):
+            f.seek(max(len(head), size - FINGERPRINT_SAMPLE_BYTES))
+            tail = f.read()
+    return make_fingerprint(size, head, tail)
+
+def normalize_hash(value):
+    if not value or not isinstance(value, str): return None
+    value = value.strip().strip('"').lower()
+    if value.startswith("sha256:"): value = value[7:]
+    return value or None
+
+def as_sha256(value):
+    # 只接受 64 位十六进制（HF LFS oid 即文件 SHA-256），排除 MD5 ETag 和 fp1 指纹
+    value = normalize_hash(value)
+    if value and value.startswith("w/"): value = value[2:].strip('"')
+    return value if value and _SHA256_RE.fullmatch(value) else None
+
+# 下载过程中按偏移顺序增量计算 SHA-256：顺序到达的数据直接计入；
+# 分段并行或续传时，落后的已完成区间从 .part 回读补齐（刚写入的数据多在页缓存中）
+class StreamHasher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remote_hash = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._sha = hashlib.sha256()
+            self.pos = 0
+            self.digest = None
+
+    def update_at(self, offset, data):
+        with self._lock:
+            if offset != self.pos: return
+            self._sha.update(data)
+            self.pos += len(data)
+
+    def catch_up(self, path, limit):
+        # 调用方保证 [pos, limit) 已写入并刷新到文件
+        with self._lock:
+            if self.pos >= limit: return
+            with open(path, 'rb') as f:
+                f.seek(self.pos)
+                while self.pos < limit:
+                    block = f.read(min(HASH_READ_SIZE, limit - self.pos))
+                    if not block: break
+                    self._sha.update(block)
+                    self.pos += len(block)
+
+    def finish(self, path, size):
+        self.catch_up(path, size)
+        with self._lock:
+            self.digest = self._sha.hexdigest() if self.pos == size else None
+            return self.digest
+
+# 内容指纹库：按 (路径, 大小, mtime) 缓存，只对新增或变动的文件重新计算
+class FingerprintStore:
+    def __init__(self, store_path=None):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.store_path = store_path or os.path.join(CURRENT_DIR, FINGERPRINT_STORE)
+        self._records = {}   # abs_path -> {"size", "mtime", "fp", "sha256"}
+        self._by_hash = {}   # hash -> {abs_path}
+        self._executor = ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS, thread_name_prefix="path_fixer_fp")
+        self._pending = set()
+        self._dirty = False
+        # hash -> 版本，对应文件集合变化即递增，/fix 结果缓存据此判断按哈希查找的结果是否过期
+        self._hash_versions = {}
+        self._load()
+
+    # ---------- 持久化 ----------
+    def _load(self):
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for path, rec in data.get("files", {}).items():
+                # 旧版本收录过的空文件记录丢弃
+                if not rec.get("size"):
+                    self._dirty = True
+                    continue
+                self._put(path, rec)
+        except FileNotFoundError: pass
+        except Exception as e:
+            print(f"⚠️ [Path Fixer] 指纹库读取失败，将重新计算: {e}")
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty: return
+                payload = {"version": 1, "files": dict(self._records)}
+                self._dirty = False
+            tmp_path = self.store_path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self.store_path)
+            except Exception as e:
+                print(f"⚠️ [Path Fixer] 指纹库保存失败: {e}")
+
+    # ---------- 记录维护（调用方持锁） ----------
+    def _put(self, path, rec):
+        self._drop(path)
+        self._records[path] = rec
+        for key in ("fp", "sha256"):
+            if not rec.get(key): continue
+            self._by_hash.setdefault(rec[key], set()).add(path)
+            self._hash_versions[rec[key]] = self._hash_versions.get(rec[key], 0) + 1
+
+    def _drop(self, path):
+        old = self._records.pop(path, None)
+        if not old: return
+        for key in ("fp", "sha256"):
+            bucket = self._by_hash.get(old.get(key))
+            if bucket is None: continue
+            self._hash_versions[old[key]] = self._hash_versions.get(old[key], 0) + 1
+            bucket.discard(path)
+            if not bucket: del self._by_hash[old[key]]
+
+    def record(self, path, size, mtime, fp=None, sha256=None):
+        # 外部已知哈希（如下载时流式计算）直接入库，免去再次读盘
+        path = os.path.abspath(path)
+        with self._lock:
+            if not size:
+                # 空文件（占位 / 下载失败的残留）指纹全都相同，按哈希会匹配到任意空文件：不收录
+                if path in self._records:
+                    self._drop(path)
+                    self._dirty = True
+                return
+            old = self._records.get(path)
+            if old and old["size"] == size and old["mtime"] == mtime:
+                fp = fp or old.get("fp")
+                sha256 = sha256 or old.get("sha256")
+            self._put(path, {"size": size, "mtime": mtime, "fp": fp, "sha256": sha256})
+            self._dirty = True
+
+    # ---------- 后台计算 ----------
+    def _hash_one(self, path):
+        try:
+            st = os.stat(path)
+            if not st.st_size: return self.record(path, 0, st.st_mtime_ns)
+            with self._lock:
+                old = self._records.get(path)
+                if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns and old.get("fp"): return
+            fp = compute_fingerprint(path, st.st_size)
+            self.record(path, st.st_size, st.st_mtime_ns, fp=fp)
+        except OSError:
+            with self._lock:
+                if path in self._records:
+                    self._drop(path)
+                    self._dirty = True
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+                idle = not self._pending
+            if idle: self.save()
+
+    def submit(self, paths):
+        for path in paths:
+            with self._lock:
+                if path in self._pending: continue
+                self._pending.add(path)
+            self._executor.submit(self._hash_one, path)
+
+    def on_index_changed(self, changed, full_rebuild):
+        # 在索引锁内调用：只收集路径，实际 stat/哈希交给线程池
+        if not FINGERPRINT_AUTO_SCAN: return
+        paths = []
+        for base_name in changed:
+            paths += [e["abs_path"] for e in model_index.lookup(base_name) if e["model_type"] not in DIR_MODEL_TYPES]
+        if full_rebuild:
+            live = set(paths)
+            with self._lock:
+                stale = [p for p in self._records if p not in live]
+            paths += stale
+        self.submit(list(dict.fromkeys(paths)))
+
+    # ---------- 查询 ----------
+    def find(self, value):
+        value = normalize_hash(value)
+        if not value: return []
+        with self._lock:
+            return sorted(self._by_hash.get(value, ()))
+
+    def hash_version(self, value):
+        value = normalize_hash(value)
+        with self._lock:
+            return self._hash_versions.get(value, 0)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return {"fingerprint_records": len(self._records), "fingerprint_pending": len(self._pending)}
+
+fingerprint_store = FingerprintStore()
+model_index.add_listener(fingerprint_store.on_index_changed)
+metrics.add_collector(fingerprint_store.stats)
@@ -0,0 +1,144 @@
+import re
+import heapq
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+from .config import FUZZY_PRECISION_TOKENS, FUZZY_MIN_SCORE, FUZZY_MAX_SUGGESTIONS
+from .file_index import model_index
+from .metrics import metrics
+
+MODEL_EXTENSIONS = {"safetensors", "ckpt", "pt", "pth", "bin", "gguf", "onnx", "sft", "pkl", "engine"}
+# 超过该比例文件都包含的 trigram 区分度太低，查询时跳过
+COMMON_GRAM_RATIO = 0.2
+RERANK_POOL = 64
+
+_VERSION_ZERO_RE = re.compile(r'(\d)(?:\.0)+(?![\d.])')
+_SPLIT_RE = re.compile(r'[^a-z0-9]+')
+
+def normalize_model_name(name):
+    # flux1-dev-fp8-e4m3fn.safetensors / Flux1_Dev_FP8.safetensors -> "flux1 dev"
+    name = name.lower()
+    head, dot, ext = name.rpartition(".")
+    if dot and ext in MODEL_EXTENSIONS: name = head
+    # v1.0 / 1.0 / v2.0.0 统一为 v1 / 1 / v2
+    name = _VERSION_ZERO_RE.sub(r'\1', name)
+    tokens = [t for t in _SPLIT_RE.split(name) if t and t not in FUZZY_PRECISION_TOKENS]
+    return " ".join(tokens)
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# 基于 trigram 倒排索引的近似文件名匹配，跟随 model_index 增量更新
+class FuzzyIndex:
+    def __init__(self, file_index):
+        self._lock = threading.Lock()
+        self._file_index = file_index
+        self._keys = {}        # basename -> 归一化 key
+        self._members = {}     # 归一化 key -> {basename}
+        self._grams = {}       # 归一化 key -> trigram 数量
+        self._postings = {}    # trigram -> {归一化 key}
+        # 按 token 计的变更版本：得分阈值高于 0.5 时，建议结果只可能来自与查询共享 token 的文件
+        self._token_versions = {}
+        self._epoch = 0
+        self._generation = 0
+
+    def _add(self, base_name):
+        key = normalize_model_name(base_name)
+        if not key: return
+        self._keys[base_name] = key
+        members = self._members.get(key)
+        if members is not None:
+            members.add(base_name)
+            return
+        self._members[key] = {base_name}
+        grams = _trigrams(key)
+        self._grams[key] = len(grams)
+        for g in grams: self._postings.setdefault(g, set()).add(key)
+
+    def _remove(self, base_name):
+        key = self._keys.pop(base_name, None)
+        if key is None: return
+        members = self._members[key]
+        members.discard(base_name)
+        if members: return
+        del self._members[key]
+        del self._grams[key]
+        for g in _trigrams(key):
+            bucket = self._postings.get(g)
+            if bucket is None: continue
+            bucket.discard(key)
+            if not bucket: del self._postings[g]
+
+    def on_index_changed(self, changed, full_rebuild):
+        with self._lock:
+            self._generation += 1
+            if full_rebuild:
+                self._keys, self._members, self._grams, self._postings = {}, {}, {}, {}
+                self._token_versions = {}
+                self._epoch += 1
+                for base_name in changed: self._add(base_name)
+                return
+            versions = self._token_versions
+            for base_name in changed:
+                for t in set(normalize_model_name(base_name).split()): versions[t] = versions.get(t, 0) + 1
+                self._remove(base_name)
+                if self._file_index.lookup(base_name): self._add(base_name)
+
+    def token_stamp(self, base_name):
+        # suggest(base_name) 的结果只在这些版本变化时才可能改变
+        tokens = sorted(set(normalize_model_name(base_name).split()))
+        with self._lock:
+            if FUZZY_MIN_SCORE <= 0.5: return self._epoch, self._generation
+            return self._epoch, tuple(self._token_versions.get(t, 0) for t in tokens)
+
+    def _rank_keys(self, key):
+        grams = _trigrams(key)
+        limit = max(1, int(len(self._grams) * COMMON_GRAM_RATIO))
+        postings = [self._postings[g] for g in grams if g in self._postings]
+        selective = [p for p in postings if len(p) <= limit]
+        # 查询过短、全是高频 trigram 时退回全部倒排
+        counts = Counter()
+        for p in (selective or postings): counts.update(p)
+        q = len(grams)
+        return heapq.nlargest(RERANK_POOL, ((2.0 * hit / (q + self._grams[k]), k) for k, hit in counts.items()))
+
+    def suggest(self, base_name, preferred_type=None, limit=FUZZY_MAX_SUGGESTIONS):
+        key = normalize_model_name(base_name)
+        if not key: return []
+        with self._lock:
+            pool = self._rank_keys(key)
+            ranked = []
+            tokens = set(key.split())
+            for _, cand_key in pool:
+                # 精度/版本标记归一化后完全一致视为满分，否则综合 token 重合度与字符相似度
+                if cand_key == key:
+                    score = 1.0
+                else:
+                    cand_tokens = set(cand_key.split())
+                    jaccard = len(tokens & cand_tokens) / len(tokens | cand_tokens)
+                    score = round(0.5 * jaccard + 0.5 * SequenceMatcher(None, key, cand_key).ratio(), 3)
+                if score >= FUZZY_MIN_SCORE: ranked.append((score, cand_key))
+            members = [(score, b) for score, k in ranked for b in self._members.get(k, ())]
+
+        suggestions = []
+        exact = base_name.lower()
+        for score, cand in members:
+            if cand == exact: continue
+            for entry in self._file_index.lookup(cand):
+                suggestions.append({"path": entry["full_path"], "model_type": entry["model_type"], "score": score})
+        suggestions.sort(key=lambda s: (-s["score"], s["model_type"] != preferred_type, s["path"]))
+        seen, result = set(), []
+        for s in suggestions:
+            if (s["path"], s["model_type"]) in seen: continue
+            seen.add((s["path"], s["model_type"]))
+            result.append(s)
+        return result[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {"fuzzy_keys": len(self._members), "fuzzy_trigrams": len(self._postings)}
+
+fuzzy_index = FuzzyIndex(model_index)
+model_index.add_listener(fuzzy_index.on_index_changed)
+metrics.add_collector(fuzzy_index.stats)
@@ -0,0 +1,101 @@
+import os
+import threading
+import folder_paths
+from aiohttp import web
+from .core_utils import normalize_path
+from .config import MATERIALIZE_METHODS
+from .file_index import model_index
+
+# Linux FICLONE ioctl：btrfs / XFS / bcachefs 等支持写时复制的文件系统上零拷贝克隆
+FICLONE = 0x40049409
+
+# (源设备, 目标设备) -> 已确认不可用的方式，避免每次都重试失败的系统调用
+_unsupported = {}
+_unsupported_lock = threading.Lock()
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+def _symlink(src, dst):
+    os.symlink(src, dst, target_is_directory=os.path.isdir(src))
+
+LINKERS = {"hardlink": _hardlink, "reflink": _reflink, "symlink": _symlink}
+
+def materialize_file(src, dst):
+    # 按配置顺序尝试：硬链接（同分区、零额外空间）> reflink（写时复制）> 软链接（跨分区兜底）
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dst)).st_dev)
+    errors = []
+    for method in MATERIALIZE_METHODS:
+        linker = LINKERS.get(method)
+        if linker is None: continue
+        # 目录（LLM/TTS 模型文件夹）只能软链接
+        if os.path.isdir(src) and method != "symlink": continue
+        if method in ("hardlink", "reflink") and devices[0] != devices[1]: continue
+        with _unsupported_lock:
+            if method in _unsupported.get(devices, ()): continue
+        try:
+            linker(src, dst)
+            return method
+        except (OSError, ImportError, NotImplementedError) as e:
+            if os.path.lexists(dst): raise
+            errors.append(f"{method}: {e}")
+            with _unsupported_lock:
+                _unsupported.setdefault(devices, set()).add(method)
+    raise Exception("当前文件系统不支持链接 (" + "; ".join(errors) + ")" if errors else "没有可用的链接方式")
+
+def find_source(model_type, rel_path):
+    # 只允许链接索引中已登记的模型，不接受任意路径
+    base_name = os.path.basename(normalize_path(rel_path)).lower()
+    wanted = normalize_path(rel_path).lower()
+    for entry in model_index.lookup(base_name):
+        if entry["model_type"] == model_type and normalize_path(entry["full_path"]).lower() == wanted:
+            return entry["abs_path"]
+    return None
+
+def resolve_target(model_type, rel_path):
+    target_dirs = folder_paths.get_folder_paths(model_type) if model_type in folder_paths.folder_names_and_paths else []
+    if not target_dirs: raise Exception(f"未注册的模型类型: {model_type}")
+    target_dir = os.path.abspath(target_dirs[0])
+    rel_path = os.path.normpath(normalize_path(rel_path))
+    dst = os.path.abspath(os.path.join(target_dir, rel_path))
+    if os.path.isabs(rel_path) or os.path.commonpath([target_dir, dst]) != target_dir:
+        raise Exception("目标路径不合法")
+    return dst, os.path.relpath(dst, target_dir)
+
+def materialize(source_type, source_path, model_type, filename):
+    src = find_source(source_type, source_path)
+    if not src or not os.path.exists(src): raise Exception("源模型不存在或未被索引")
+    dst, rel = resolve_target(model_type, filename)
+    if os.path.lexists(dst):
+        if os.path.exists(dst) and os.path.samefile(src, dst): return "exists", rel
+        raise Exception(f"目标位置已存在同名文件: {rel}")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    method = materialize_file(src, dst)
+    model_index.invalidate(dst)
+    print(f"🔗 [Path Fixer] 已{method}: {src} -> {dst}")
+    return method, rel
+
+async def handle_materialize_request(request):
+    try:
+        json_data = await request.json()
+        source_type = json_data.get("source_type")
+        source_path = json_data.get("source_path")
+        model_type = json_data.get("model_type")
+        filename = json_data.get("filename") or source_path
+        if not source_type or not source_path or not model_type:
+            return web.json_response({"success": False, "message": "参数缺失"})
+
+        method, rel = materialize(source_type, source_path, model_type, filename)
+        return web.json_response({"success": True, "method": method, "path": rel, "message": "已链接到目标目录"})
+    except Exception as e:
+        return web.json_response({"success": False, "message": str(e)})
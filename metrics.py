@@ -0,0 +1,190 @@
+import time
+import threading
+from collections import deque
+from aiohttp import web
+from .config import METRICS_ENABLED, METRICS_SLOW_REQUEST_SECONDS, METRICS_SLOW_REQUESTS, METRICS_RECENT_DOWNLOADS
+
+PREFIX = "path_fixer_"
+# 秒级直方图分桶，覆盖字典查询（毫秒级）到冷启动全量扫描（数十秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _label_value(value):
+    # Prometheus 文本格式的标签值转义：反斜杠、双引号、换行
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class _Histogram:
+    __slots__ = ("count", "sum", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        if value > self.max: self.max = value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+# 进程内轻量指标：计数器 / 瞬时值 / 耗时直方图，导出为 JSON 或 Prometheus 文本
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {label_key: value}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []  # 导出时调用，返回 {name: value} 形式的瞬时值
+        self.recent_downloads = deque(maxlen=METRICS_RECENT_DOWNLOADS)
+        self.slow_requests = deque(maxlen=METRICS_SLOW_REQUESTS)
+        self.started_at = time.time()
+
+    def inc(self, name, value=1, **labels):
+        if not METRICS_ENABLED: return
+        with self._lock:
+            bucket = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            bucket[key] = bucket.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not METRICS_ENABLED: return
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        if not METRICS_ENABLED: return
+        with self._lock:
+            bucket = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            hist = bucket.get(key)
+            if hist is None: hist = bucket[key] = _Histogram()
+            hist.observe(seconds)
+
+    def add_collector(self, callback):
+        self._collectors.append(callback)
+
+    def _collect(self):
+        for callback in self._collectors:
+            try:
+                for name, value in callback().items(): self.set(name, value)
+            except Exception as e:
+                print(f"⚠️ [Path Fixer] 指标采集出错: {e}")
+
+    # ---------- 导出 ----------
+    def as_dict(self):
+        self._collect()
+        with self._lock:
+            def flat(store, render):
+                return {name: [dict(k, **render(v)) for k, v in series.items()] for name, series in store.items()}
+            return {
+                "uptime": round(time.time() - self.started_at, 1),
+                "counters": flat(self._counters, lambda v: {"value": v}),
+                "gauges": flat(self._gauges, lambda v: {"value": v}),
+                "timings": flat(self._histograms, lambda h: {
+                    "count": h.count, "sum": round(h.sum, 6), "max": round(h.max, 6),
+                    "avg": round(h.sum / h.count, 6) if h.count else 0
+                }),
+                "recent_downloads": list(self.recent_downloads),
+                "slow_requests": list(self.slow_requests),
+            }
+
+    def as_prometheus(self):
+        self._collect()
+        lines = []
+
+        def fmt(labels, extra=None):
+            items = list(labels) + (extra or [])
+            if not items: return ""
+            return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in items) + "}"
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                lines += [f"{PREFIX}{name}{fmt(k)} {v}" for k, v in series.items()]
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {PREFIX}{name} gauge")
+                lines += [f"{PREFIX}{name}{fmt(k)} {v}" for k, v in series.items()]
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for k, h in series.items():
+                    cumulative = 0
+                    for bound, n in zip(BUCKETS, h.buckets):
+                        cumulative += n
+                        lines.append(f"{PREFIX}{name}_bucket{fmt(k, [('le', bound)])} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_bucket{fmt(k, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{PREFIX}{name}_sum{fmt(k)} {h.sum}")
+                    lines.append(f"{PREFIX}{name}_count{fmt(k)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# 单次请求的分阶段计时：lap(phase) 把距上次打点的耗时计入该阶段，同名阶段累加
+class RequestTimer:
+    def __init__(self, name):
+        self.name = name
+        self.start = self._last = time.perf_counter()
+        self.phases = {}
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self._last)
+        self._last = now
+
+    def finish(self, **info):
+        total = time.perf_counter() - self.start
+        for phase, seconds in self.phases.items():
+            metrics.observe(f"{self.name}_phase_seconds", seconds, phase=phase)
+        metrics.observe(f"{self.name}_seconds", total)
+        metrics.inc(f"{self.name}_requests_total")
+        if METRICS_SLOW_REQUEST_SECONDS and total >= METRICS_SLOW_REQUEST_SECONDS:
+            detail = ", ".join(f"{p}={s * 1000:.0f}ms" for p, s in sorted(self.phases.items(), key=lambda x: -x[1]))
+            print(f"🐢 [Path Fixer] 慢请求 /{self.name} {total * 1000:.0f}ms ({detail}) {info}")
+            metrics.slow_requests.append(dict(info, request=self.name, seconds=round(total, 4), at=time.time(),
+                                              phases={p: round(s, 4) for p, s in self.phases.items()}))
+        return total
+
+# 单个下载任务的统计：传输字节、重试次数、首字节时间
+class DownloadStats:
+    def __init__(self, filename):
+        self.filename = filename
+        self.start = time.perf_counter()
+        self.bytes = 0
+        self.retries = 0
+        self.ttfb = None
+
+    def add(self, n):
+        self.bytes += n
+
+    def first_byte(self):
+        if self.ttfb is None:
+            self.ttfb = time.perf_counter() - self.start
+            metrics.observe("download_ttfb_seconds", self.ttfb)
+
+    def retry(self):
+        self.retries += 1
+        metrics.inc("download_retries_total")
+
+    def finish(self, result):
+        elapsed = time.perf_counter() - self.start
+        rate = self.bytes / elapsed if elapsed > 0 else 0.0
+        metrics.inc("downloads_total", result=result)
+        metrics.inc("download_bytes_total", self.bytes)
+        metrics.observe("download_seconds", elapsed, result=result)
+        metrics.recent_downloads.append({
+            "filename": self.filename, "result": result, "bytes": self.bytes, "seconds": round(elapsed, 3),
+            "bytes_per_sec": round(rate, 1), "retries": self.retries,
+            "ttfb": round(self.ttfb, 4) if self.ttfb is not None else None, "finished_at": time.time()
+        })
+
+async def handle_metrics_request(request):
+    # ?format=prometheus 或 Accept: text/plain 时输出 Prometheus 文本格式
+    fmt = request.query.get("format", "")
+    if fmt == "prometheus" or (not fmt and "text/plain" in request.headers.get("Accept", "")):
+        return web.Response(text=metrics.as_prometheus(), content_type="text/plain")
+    return web.json_response(metrics.as_dict())
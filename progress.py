@@ -0,0 +1,98 @@
+import sys
+import time
+import threading
+import server
+from .config import DOWNLOAD_PROGRESS_INTERVAL, DOWNLOAD_CONSOLE_PROGRESS
+from .metrics import metrics
+
+# 下载进度汇总：各下载只在内存中更新进度，由一个后台线程按固定间隔合并成一条事件推送，
+# 避免每个文件、每个浏览器标签页每 0.5 秒各收一条 websocket 消息
+EVENT = "model_fixer_download_batch"
+
+class _Transfer:
+    __slots__ = ("current", "total", "speed", "sample", "sent")
+
+    def __init__(self):
+        self.current = 0
+        self.total = 0
+        self.speed = None
+        self.sample = None
+        self.sent = None
+
+class ProgressAggregator:
+    def __init__(self, interval=DOWNLOAD_PROGRESS_INTERVAL, console=DOWNLOAD_CONSOLE_PROGRESS):
+        self.interval = interval
+        self.console = console
+        self._lock = threading.Lock()
+        self._transfers = {}
+        self._done = []
+        self._wake = threading.Event()
+        self._thread = None
+
+    def update(self, filename, current, total):
+        with self._lock:
+            transfer = self._transfers.get(filename)
+            if transfer is None:
+                transfer = self._transfers[filename] = _Transfer()
+                transfer.sample = (time.monotonic(), current)
+                # 暂停后在同一周期内恢复：不再通知结束
+                if filename in self._done: self._done.remove(filename)
+            transfer.current = current
+            if total: transfer.total = total
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="path_fixer_progress")
+                self._thread.start()
+            self._wake.set()
+
+    def remove(self, filename):
+        # 结束（完成 / 失败 / 暂停）的下载在下一条事件的 done 中通知一次
+        with self._lock:
+            if self._transfers.pop(filename, None) is not None: self._done.append(filename)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            try: self.flush()
+            except Exception as e: print(f"⚠️ [Path Fixer] 进度推送出错: {e}")
+            with self._lock:
+                # 没有进行中的下载时停在 wait 上，不再空转
+                if not self._transfers and not self._done: self._wake.clear()
+
+    def flush(self):
+        now = time.monotonic()
+        with self._lock:
+            items = {}
+            for filename, t in self._transfers.items():
+                if t.sample and now > t.sample[0]:
+                    instant = max(0, t.current - t.sample[1]) / (now - t.sample[0])
+                    t.speed = instant if t.speed is None else 0.7 * t.speed + 0.3 * instant
+                t.sample = (now, t.current)
+                speed = round(t.speed or 0)
+                # 只推送有变化的条目：进度或速度不变（含停滞后速度已衰减到 0）时省略
+                if (t.current, t.total, speed) == t.sent: continue
+                t.sent = (t.current, t.total, speed)
+                eta = (t.total - t.current) / t.speed if t.total and t.speed else None
+                items[filename] = {"current": t.current, "total": t.total, "speed": speed,
+                                   "eta": round(eta, 1) if eta is not None else None}
+            done, self._done = self._done, []
+            summary = self._summary() if self.console == "summary" and self._transfers else None
+        if not items and not done: return False
+        server.PromptServer.instance.send_sync(EVENT, {"items": items, "done": done})
+        metrics.inc("download_progress_events_total")
+        if summary:
+            sys.stdout.write(summary)
+            sys.stdout.flush()
+        return True
+
+    def _summary(self):
+        # 调用方持锁：一行汇总全部进行中的下载
+        total_speed = sum(t.speed or 0 for t in self._transfers.values())
+        parts = []
+        for filename, t in self._transfers.items():
+            name = filename if len(filename) <= 24 else filename[:21] + "..."
+            parts.append(f"{name} {t.current / t.total * 100:.0f}%" if t.total else f"{name} {t.current / 1024 / 1024:.0f}MB")
+        shown = " · ".join(parts[:4]) + (" ..." if len(parts) > 4 else "")
+        return f"\r⏳ 下载中 {len(parts)} 个 | {total_speed / 1024 / 1024:.2f} MB/s | {shown}   "
+
+download_progress = ProgressAggregator()
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from .config import FIX_CACHE_SIZE
+from .catalog import build_link_index
+from .file_index import model_index
+from .fuzzy import fuzzy_index
+from .fingerprint import fingerprint_store
+from .metrics import metrics
+
+DYNAMIC_CACHE_SIZE = 8
+
+# /fix 单条查询结果缓存：每条结果记录它依赖的版本戳，失效粒度到文件名
+#   name  - 同名文件的增删（model_index 按 basename 计版本）
+#   fuzzy - 近似名建议：与查询共享任一 token 的文件增删（得分阈值保证无共享 token 的文件进不了建议）
+#   hash  - 查询涉及的哈希在指纹库中对应的文件集合，以及这些文件名的增删（按哈希找被改名文件时）
+class FixResultCache:
+    def __init__(self, max_entries=FIX_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (result, uses, stamp)
+        self._dynamic = OrderedDict()   # digest -> dynamic_index
+        self.max_entries = max_entries
+
+    @staticmethod
+    def _hash_stamp(hashes):
+        stamp = []
+        for h in hashes:
+            paths = fingerprint_store.find(h)
+            stamp.append((fingerprint_store.hash_version(h), tuple(model_index.version_of(os.path.basename(p).lower()) for p in paths)))
+        return tuple(stamp)
+
+    @classmethod
+    def stamp_parts(cls, base_name, hashes):
+        return {
+            "name": model_index.version_of(base_name),
+            "fuzzy": fuzzy_index.token_stamp(base_name),
+            "hash": cls._hash_stamp(hashes),
+        }
+
+    @staticmethod
+    def stamp_of(parts, uses):
+        return (parts["name"],) + tuple(parts[k] for k in sorted(uses))
+
+    def dynamic_indexes(self, dynamic_links):
+        # 同一工作流重复提交时，dynamic_links 的倒排索引按内容摘要复用
+        digest = hashlib.sha1(json.dumps(dynamic_links, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._dynamic.get(digest)
+            if cached is not None:
+                self._dynamic.move_to_end(digest)
+                return digest, cached
+        cached = build_link_index(dynamic_links)
+        with self._lock:
+            self._dynamic[digest] = cached
+            while len(self._dynamic) > DYNAMIC_CACHE_SIZE: self._dynamic.popitem(last=False)
+        return digest, cached
+
+    def get(self, key, base_name, hashes):
+        # 返回 (result, stamp)；未命中或依赖已变化时返回 None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None: self._entries.move_to_end(key)
+        if entry is None:
+            metrics.inc("fix_cache_total", result="miss")
+            return None
+        result, uses, stamp = entry
+        if self.stamp_of(self.stamp_parts(base_name, hashes), uses) != stamp:
+            metrics.inc("fix_cache_total", result="stale")
+            return None
+        metrics.inc("fix_cache_total", result="hit")
+        return result, stamp
+
+    def put(self, key, parts, result, uses):
+        # parts 在计算前取得：计算期间索引若有变化，下次校验会判为过期
+        stamp = self.stamp_of(parts, uses)
+        with self._lock:
+            self._entries[key] = (result, frozenset(uses), stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return stamp
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dynamic.clear()
+
+    def stats(self):
+        return {"fix_cache_entries": len(self._entries)}
+
+def make_etag(request_key, stamps):
+    return '"' + hashlib.sha1(repr((request_key, stamps)).encode("utf-8")).hexdigest() + '"'
+
+fix_cache = FixResultCache()
+metrics.add_collector(fix_cache.stats)
@@ -0,0 +1,274 @@
+import time
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# 令牌桶：按欠额计算需要等待的秒数，rate <= 0 表示不限速
+class TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._allowance = rate
+        self._last = time.monotonic()
+
+    def reserve(self, n):
+        if self.rate <= 0: return 0
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= n
+            return 0 if self._allowance >= 0 else -self._allowance / self.rate
+
+class BandwidthLimiter:
+    def __init__(self, global_rate=0, host_rate=0):
+        self._lock = threading.Lock()
+        self.global_bucket = TokenBucket(global_rate)
+        self.host_rate = host_rate
+        self._hosts = {}
+
+    def delay(self, url, n):
+        host = urlparse(url).hostname or ""
+        with self._lock:
+            bucket = self._hosts.get(host)
+            if bucket is None: bucket = self._hosts[host] = TokenBucket(self.host_rate)
+        return max(self.global_bucket.reserve(n), bucket.reserve(n))
+
+    def throttle(self, url, n):
+        wait = self.delay(url, n)
+        if wait > 0: time.sleep(wait)
+
+class DownloadTask:
+    def __init__(self, filename, url, args, priority=0, size=None, seq=0):
+        self.filename = filename
+        self.url = url
+        self.args = args
+        self.priority = priority
+        self.size = size
+        self.seq = seq
+        self.state = "queued"
+        self.cancel_event = threading.Event()
+        self.stop_reason = None
+        self.downloaded = 0
+        self.speed = 0.0
+        self.started_at = None
+        # 因磁盘空间暂不能开始时的原因，空出名额时仍会重新检查
+        self.blocked = None
+        self._last_sample = None
+
+    def sort_key(self):
+        # 优先级高的先下；同优先级时小文件先下，未知大小排在后面；最后按提交顺序
+        return (-self.priority, self.size if self.size else float("inf"), self.seq)
+
+    def remaining(self):
+        return max(0, (self.size or 0) - self.downloaded)
+
+# 有界并发 + 优先级队列，维护 queued / running / paused 状态
+class DownloadScheduler:
+    def __init__(self, runner, lock, active, cancel_flags, max_workers=3, prober=None, on_dropped=None, limiter=None, async_runner=None, admit=None):
+        self._runner = runner
+        self._async_runner = async_runner
+        # 设置后任务以协程形式跑在该事件循环上，不再占用线程
+        self.loop = None
+        self._lock = lock
+        self._active = active
+        self._cancel_flags = cancel_flags
+        self._prober = prober
+        self._on_dropped = on_dropped
+        # admit(task, running) 返回 None 表示可以开始，否则返回不能开始的原因（如磁盘空间不足）
+        self._admit = admit
+        self.limiter = limiter or BandwidthLimiter()
+        self.max_workers = max_workers
+        self._queue = []
+        self._tasks = {}
+        self._seq = itertools.count()
+        self._probe_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="path_fixer_probe") if prober else None
+
+    # ---------- 提交与控制（调用方不持锁） ----------
+    def submit(self, filename, url, args, priority=0, size=None):
+        # 同名任务已存在（排队 / 运行 / 暂停）时返回 None，避免两个任务写同一个 .part
+        with self._lock:
+            if filename in self._tasks: return None
+            task = DownloadTask(filename, url, args, priority, size, next(self._seq))
+            self._tasks[filename] = task
+            self._active.add(filename)
+            self._cancel_flags[filename] = task.cancel_event
+            self._queue.append(task)
+            self._dispatch()
+        if size is None and self._probe_pool: self._probe_pool.submit(self._probe, task)
+        return task
+
+    def release(self, filename):
+        # 归还提交前预占的文件名；已有对应任务时不动
+        with self._lock:
+            if filename not in self._tasks: self._active.discard(filename)
+
+    def get(self, filename):
+        with self._lock:
+            return self._tasks.get(filename)
+
+    def tasks(self, states=("running", "queued")):
+        with self._lock:
+            return [t for t in self._tasks.values() if t.state in states]
+
+    def cancel(self, filename):
+        with self._lock:
+            task = self._tasks.get(filename)
+            if task is None: return False
+            task.stop_reason = "cancel"
+            task.cancel_event.set()
+            if task.state == "running": return True
+            # 排队中或已暂停的任务直接移除
+            if task in self._queue: self._queue.remove(task)
+            self._forget(task)
+        if self._on_dropped: self._on_dropped(task)
+        return True
+
+    def pause(self, filename):
+        with self._lock:
+            task = self._tasks.get(filename)
+            if task is None or task.state == "paused": return False
+            task.stop_reason = "pause"
+            if task.state == "running":
+                task.cancel_event.set()
+            else:
+                self._queue.remove(task)
+                task.state = "paused"
+            return True
+
+    def resume(self, filename):
+        with self._lock:
+            task = self._tasks.get(filename)
+            if task is None: return False
+            # 暂停尚未生效（传输仍在收尾），标记为恢复，待工作线程退出后重新排队
+            if task.state == "running" and task.stop_reason == "pause":
+                task.stop_reason = "resume"
+                return True
+            if task.state != "paused": return False
+            self._requeue(task)
+            return True
+
+    def _requeue(self, task):
+        task.state = "queued"
+        task.stop_reason = None
+        task.cancel_event = threading.Event()
+        self._cancel_flags[task.filename] = task.cancel_event
+        self._queue.append(task)
+        self._dispatch()
+
+    def update_progress(self, filename, current, total):
+        with self._lock:
+            task = self._tasks.get(filename)
+            if task is None: return
+            now = time.time()
+            if task._last_sample:
+                last_time, last_bytes = task._last_sample
+                if now > last_time:
+                    instant = max(0, current - last_bytes) / (now - last_time)
+                    task.speed = instant if task.speed == 0 else 0.7 * task.speed + 0.3 * instant
+            task._last_sample = (now, current)
+            task.downloaded = current
+            if total: task.size = total
+
+    # ---------- 派发 ----------
+    def _dispatch(self):
+        # 调用方持锁：空出名额时按优先级取出任务，线程或协程执行
+        # admit 拒绝的任务留在队列中，让位给后面放得下的任务
+        for task in sorted(self._queue, key=DownloadTask.sort_key):
+            if self._running_count() >= self.max_workers: break
+            task.blocked = self._admit(task, self._running()) if self._admit else None
+            if task.blocked: continue
+            self._queue.remove(task)
+            task.state = "running"
+            task.started_at = time.time()
+            task._last_sample = None
+            if self._async_runner and self.loop and not self.loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self._run_async(task), self.loop)
+            else:
+                threading.Thread(target=self._run_sync, args=(task,), daemon=True, name="path_fixer_download").start()
+        if self._running(): return
+        # 没有运行中的任务时空间不会再变多（除非用户手动清理），仍放不下的任务直接移除
+        for task in [t for t in self._queue if t.blocked]:
+            self._queue.remove(task)
+            task.stop_reason = "blocked"
+            self._forget(task)
+            if self._on_dropped: self._on_dropped(task)
+
+    def _running(self):
+        return [t for t in self._tasks.values() if t.state == "running"]
+
+    def _running_count(self):
+        return len(self._running())
+
+    def _run_sync(self, task):
+        result = None
+        try:
+            result = self._runner(task)
+        finally:
+            self._finish(task, result)
+
+    async def _run_async(self, task):
+        result = None
+        try:
+            result = await self._async_runner(task)
+        finally:
+            self._finish(task, result)
+
+    def _finish(self, task, result):
+        # runner 返回 "paused" 表示任务被暂停，.part 保留等待恢复
+        with self._lock:
+            if result == "paused" and task.stop_reason == "resume":
+                self._requeue(task)
+            elif result == "paused":
+                task.state = "paused"
+                task.speed = 0.0
+            else:
+                self._forget(task)
+            self._dispatch()
+
+    def _forget(self, task):
+        task.state = "done"
+        if self._tasks.get(task.filename) is task:
+            del self._tasks[task.filename]
+            self._active.discard(task.filename)
+            self._cancel_flags.pop(task.filename, None)
+
+    def _probe(self, task):
+        try: size = self._prober(task.url)
+        except Exception: size = None
+        if not size: return
+        with self._lock:
+            if task.size is None: task.size = size
+
+    # ---------- 状态快照 ----------
+    def snapshot(self):
+        with self._lock:
+            running = [t for t in self._tasks.values() if t.state == "running"]
+            queued = sorted(self._queue, key=DownloadTask.sort_key)
+            paused = [t for t in self._tasks.values() if t.state == "paused"]
+            throughput = sum(t.speed for t in running)
+
+            tasks = []
+            backlog = 0
+            for t in running:
+                backlog += t.remaining()
+                tasks.append(self._describe(t, None, t.remaining() / t.speed if t.speed > 0 and t.size else None))
+            # 排队任务的 ETA 按当前总吞吐粗略估算：前面所有剩余字节 + 自身大小
+            for pos, t in enumerate(queued, 1):
+                backlog += t.remaining()
+                eta = backlog / throughput if throughput > 0 and t.size else None
+                tasks.append(self._describe(t, pos, eta))
+            for t in paused:
+                tasks.append(self._describe(t, None, None))
+            return {"tasks": tasks, "throughput": throughput, "running": len(running), "queued": len(queued),
+                    "paused": len(paused), "max_workers": self.max_workers}
+
+    @staticmethod
+    def _describe(task, position, eta):
+        return {
+            "filename": task.filename, "state": task.state, "position": position, "priority": task.priority,
+            "size": task.size, "downloaded": task.downloaded, "speed": round(task.speed, 1), "blocked": task.blocked,
+            "eta": round(eta, 1) if eta is not None else None
+        }
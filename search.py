@@ -1,161 +1,262 @@
 import os
-import re
+import json
+import asyncio
 import folder_paths
 from aiohttp import web
 from urllib.parse import unquote
-from .core_utils import normalize_path, load_local_links
-from .config import get_type_mapping, NODE_SPECIFIC_MAPPING
+from .core_utils import normalize_path
+from .catalog import link_catalog, find_link
+from .classifier import type_classifier
+from .file_index import model_index
+from .fuzzy import fuzzy_index
+from .fingerprint import fingerprint_store, as_sha256
+from .metrics import metrics, RequestTimer
+from .result_cache import fix_cache, make_etag
 
 def build_file_index(model_types):
-    index = {}
-    # 【修复2】去重 model_types，防止注册表和手动追加重复扫描
-    for m_type in set(model_types):
-        try:
-            files = []
-            if m_type in ["LLM", "TTS"]:
-                target_dir = os.path.join(folder_paths.models_dir, m_type)
-                if os.path.exists(target_dir):
-                    # 【修复1】只取文件夹名 (d)，不要拼凑带盘符的绝对路径
-                    files = [d for d in os.listdir(target_dir) if os.path.isdir(os.path.join(target_dir, d))]
-            else:
-                files = folder_paths.get_filename_list(m_type)
-                
-            for f in files:
-                base_name = os.path.basename(normalize_path(f)).lower()
-                if base_name not in index: index[base_name] = []
-                index[base_name].append({"full_path": f, "model_type": m_type})
-        except: continue
-    return index
+    # 常驻索引按目录 mtime 增量刷新，这里只按类型过滤出快照
+    model_index.refresh()
+    return model_index.snapshot(model_types)
+
+def query_hashes(item, base_name):
+    # 按内容指纹查找时使用的哈希：工作流提供的优先，其次链接库
+    return [h for h in [item.get("hash")] + link_catalog.hashes_for(base_name) if h]
+
+def resolve_query(item, norm_val, standard_type, dynamic_index, use_fuzzy, timer):
+    # 返回 (结果, 依赖)；结果为 None 表示当前值已正确。依赖供结果缓存判断何时失效
+    current_val = item.get("current_val")
+    widget_type = item.get("type")
+    target_basename = os.path.basename(norm_val).lower()
+    uses = set()
+
+    # 本地搜索
+    candidates = []
+    materializable = []
+    hits = model_index.lookup(target_basename)
+    if hits:
+        same_type = [x["full_path"] for x in hits if x["model_type"] == standard_type]
+        diff_type = [x["full_path"] for x in hits if x["model_type"] == "diffusion_models"]
+        other_type = [x["full_path"] for x in hits if x["model_type"] != standard_type and x["model_type"] != "diffusion_models"]
+        
+        if same_type: candidates = same_type
+        elif diff_type: candidates = diff_type
+        else: candidates = other_type
+
+        # 只存在于其他类型目录：可链接到当前加载器读取的目录，免去重复下载
+        if not same_type and standard_type in folder_paths.folder_names_and_paths:
+            materializable = [{"path": x["full_path"], "model_type": x["model_type"]} for x in hits if x["full_path"] in candidates]
+
+    # 文件名未命中时按内容指纹查找被改名的文件（哈希来自工作流或链接库）
+    matched_by = "name" if candidates else None
+    hashes = query_hashes(item, target_basename) if not candidates else []
+    if hashes: uses.add("hash")
+    if not candidates:
+        for h in hashes:
+            entries = [e for p in fingerprint_store.find(h) for e in model_index.entries_for_path(p)]
+            if not entries: continue
+            same_type = [e["full_path"] for e in entries if e["model_type"] == standard_type]
+            candidates = same_type or [e["full_path"] for e in entries]
+            matched_by = "hash"
+            break
+        metrics.inc("hash_lookups_total", result="hit" if candidates else "miss")
+
+    # 【修复3】为了极致的稳妥，对最终的候选名单进行一次强制去重
+    candidates = list(dict.fromkeys(candidates))
+    timer.lap("lookup")
+
+    # 校验存在性
+    norm_current = norm_val.lower()
+    norm_candidates = [normalize_path(c).lower() for c in candidates]
+    if norm_current in norm_candidates: return None, uses
+
+    # 获取下载链接
+    download_link = None
+    link_sha256 = None
+    final_download_type = standard_type if standard_type else "uncategorized"
+    
+    if not candidates:
+        download_link, link_cat, link_sha256 = find_link(dynamic_index, target_basename, standard_type)
+        if download_link and link_cat != standard_type and link_cat != "uncategorized":
+            final_download_type = link_cat
+
+        if not download_link:
+            download_link, link_cat, link_sha256 = link_catalog.find(target_basename, standard_type)
+            if download_link and link_cat != "uncategorized": final_download_type = link_cat
+
+        # 文件名未收录时按工作流提供的哈希查链接库（文件被改名），下载后仍保存为工作流中的文件名
+        if not download_link and item.get("hash"):
+            download_link, link_cat, _ = link_catalog.find_by_hash(item.get("hash"), standard_type)
+            if download_link:
+                link_sha256 = item.get("hash")
+                if link_cat != "uncategorized": final_download_type = link_cat
+
+    timer.lap("links")
+
+    # 本地无同名文件时给出近似文件名建议（如 fp16/fp8 等精度变体）
+    suggestions = []
+    if use_fuzzy and not candidates:
+        uses.add("fuzzy")
+        suggestions = fuzzy_index.suggest(target_basename, standard_type)
+    timer.lap("fuzzy")
+
+    # 下载时用于流式校验的 SHA-256：只取自选中的链接条目，同名的其他分类条目可能是另一个文件
+    expected_sha256 = as_sha256(link_sha256) if download_link else None
+
+    # URL 类型嗅探
+    if download_link:
+        url_decoded = unquote(download_link).lower()
+        if "diffusion_models" in url_decoded: final_download_type = "diffusion_models"
+        elif "text_encoders" in url_decoded: final_download_type = "text_encoders"
+        elif "/vae/" in url_decoded or "/vae." in url_decoded: final_download_type = "vae"
+        elif "lora" in url_decoded: final_download_type = "loras"
+        elif "/unet/" in url_decoded: final_download_type = "unet"
+        elif "/clip/" in url_decoded: final_download_type = "clip"
+
+        if "/" in norm_val:
+            sub_folder = os.path.dirname(norm_val)
+            if sub_folder and sub_folder not in final_download_type:
+                final_download_type = f"{final_download_type}/{sub_folder}"
+
+    return {
+        "widget_name": widget_type, "old_value": current_val,
+        "candidates": candidates, "download_url": download_link, "model_type": final_download_type,
+        "suggestions": suggestions, "matched_by": matched_by, "sha256": expected_sha256,
+        "materializable": materializable, "target_type": standard_type
+    }, uses
+
+def is_auto_fix(result):
+    # 与前端一致：唯一候选且无需链接时直接替换，不进入对话框
+    return len(result["candidates"]) == 1 and not result["materializable"]
+
+async def prepare_fix(json_data, timer):
+    dynamic_links = json_data.get("dynamic_links", {})
+    use_fuzzy = bool(json_data.get("fuzzy", True))
+    # 工作流内链接按内容摘要缓存倒排索引；本地链接库常驻内存，按 mtime 热重载
+    links_digest, dynamic_index = fix_cache.dynamic_indexes(dynamic_links)
+    timer.lap("parse")
+    link_catalog.refresh()
+    timer.lap("catalog")
+    type_classifier.refresh()
+    
+    # 常驻索引增量刷新（仅 stat 变动目录），放到线程池避免阻塞事件循环
+    await asyncio.get_running_loop().run_in_executor(None, model_index.refresh)
+    timer.lap("index")
+
+    return {
+        "queries": json_data.get("queries", []), "dynamic_index": dynamic_index,
+        "use_fuzzy": use_fuzzy,
+        # 链接库/识别规则变化影响所有条目，作为请求级键；文件变化只让相关条目失效
+        "request_key": (links_digest, use_fuzzy, link_catalog.generation, type_classifier.generation),
+    }
+
+def classify_query(item, timer):
+    # 返回 (归一化路径, 模型类型)；空值返回 None
+    current_val = item.get("current_val")
+    if not current_val: return None
+    # 类型识别：规则预编译，同类节点/部件命中缓存
+    norm_val = normalize_path(current_val)
+    standard_type = type_classifier.classify(item.get("node_type"), item.get("type"), norm_val)
+    timer.lap("classify")
+    return norm_val, standard_type
+
+def fix_query(ctx, item, norm_val, standard_type, timer):
+    # 返回 (带 id 的结果或 None, ETag 用的版本戳, 是否命中缓存)
+    target_basename = os.path.basename(norm_val).lower()
+    key = (item.get("current_val"), item.get("type"), item.get("node_type"), item.get("hash")) + ctx["request_key"]
+    hashes = query_hashes(item, target_basename)
+    cached = fix_cache.get(key, target_basename, hashes)
+    if cached is not None:
+        result, stamp = cached
+        timer.lap("cache")
+    else:
+        parts = fix_cache.stamp_parts(target_basename, hashes)
+        result, uses = resolve_query(item, norm_val, standard_type, ctx["dynamic_index"], ctx["use_fuzzy"], timer)
+        stamp = fix_cache.put(key, parts, result, uses)
+    if result is not None: result = dict(result, id=item.get("id"))
+    return result, (item.get("id"), key[:4], stamp), cached is not None
+
+def wants_stream(request, json_data):
+    return bool(json_data.get("stream")) or "application/x-ndjson" in request.headers.get("Accept", "")
 
 async def handle_fix_request(request):
+    timer = RequestTimer("fix")
     try:
         json_data = await request.json()
-        query_list = json_data.get("queries", [])
-        dynamic_links = json_data.get("dynamic_links", {})
-        local_links_db = load_local_links()
-        
+        if wants_stream(request, json_data): return await handle_fix_stream(request, json_data, timer)
+        ctx = await prepare_fix(json_data, timer)
         results = []
-        type_mapping = get_type_mapping()
+        stamps = []
+        hits = 0
         
-        # 再次确保大类列表不会有重复项
-        all_types = list(set(list(folder_paths.folder_names_and_paths.keys()) + ["LLM", "TTS"]))
-        file_index = build_file_index(all_types)
-        
-        for item in query_list:
-            current_val = item.get("current_val")
-            if not current_val: continue
-            
-            widget_type = item.get("type")
-            node_type = item.get("node_type")
-            
-            # 优先检查节点级映射
-            standard_type = NODE_SPECIFIC_MAPPING.get(node_type)
-            if not standard_type:
-                standard_type = type_mapping.get(widget_type)
-            
-            # 子图后缀处理：unet_name_1 → unet_name
-            if not standard_type:
-                base_widget = re.sub(r'_\d+$', '', widget_type)
-                if base_widget != widget_type:
-                    standard_type = type_mapping.get(base_widget)
-            
-            # 路径前缀分析
-            norm_val = normalize_path(current_val)
-            if not standard_type and "/" in norm_val:
-                potential_folder = norm_val.split("/")[0].lower()
-                for known_type in folder_paths.folder_names_and_paths:
-                    if known_type.lower() == potential_folder:
-                        standard_type = known_type
-                        break
-
-            if not standard_type:
-                w_lower = widget_type.lower()
-                if "clip" in w_lower or "text_encoder" in w_lower: standard_type = "clip"
-                elif "unet" in w_lower or "diffusion" in w_lower: standard_type = "unet"
-                elif "lora" in w_lower: standard_type = "loras"
-                elif "checkpoint" in w_lower: standard_type = "checkpoints"
-                # 子图中文名称启发式匹配
-                elif "文本编码器" in widget_type: standard_type = "clip"
-                elif widget_type == "模型": standard_type = "latent_upscale_models"
-                elif widget_type == "model_name" or re.match(r'^model_name_\d+$', widget_type): standard_type = "latent_upscale_models"
-                elif "unet名称" in widget_type.lower(): standard_type = "unet"
-                elif "lora名称" in widget_type.lower(): standard_type = "loras"
-                elif "checkpoint名称" in widget_type.lower(): standard_type = "checkpoints"
-            
-            target_basename = os.path.basename(norm_val).lower()
-            
-            # 本地搜索
-            candidates = []
-            if target_basename in file_index:
-                same_type = [x["full_path"] for x in file_index[target_basename] if x["model_type"] == standard_type]
-                diff_type = [x["full_path"] for x in file_index[target_basename] if x["model_type"] == "diffusion_models"]
-                other_type = [x["full_path"] for x in file_index[target_basename] if x["model_type"] != standard_type and x["model_type"] != "diffusion_models"]
-                
-                if same_type: candidates = same_type
-                elif diff_type: candidates = diff_type
-                else: candidates = other_type
-
-            # 【修复3】为了极致的稳妥，对最终的候选名单进行一次强制去重
-            candidates = list(dict.fromkeys(candidates))
-
-            # 校验存在性
-            norm_current = norm_val.lower()
-            norm_candidates = [normalize_path(c).lower() for c in candidates]
-            if norm_current in norm_candidates: continue 
-
-            # 获取下载链接
-            download_link = None
-            final_download_type = standard_type if standard_type else "uncategorized"
-            
-            if not candidates:
-                if standard_type in dynamic_links and target_basename in dynamic_links[standard_type]:
-                    download_link = dynamic_links[standard_type][target_basename]
-                
-                if not download_link:
-                    for cat, files in dynamic_links.items():
-                        for note_file, note_url in files.items():
-                            if note_file.lower() == target_basename:
-                                download_link = note_url
-                                if cat != "uncategorized": final_download_type = cat
-                                break
-                        if download_link: break
-                
-                if not download_link and local_links_db:
-                    if standard_type in local_links_db:
-                        for db_file, db_url in local_links_db[standard_type].items():
-                            if isinstance(db_url, str) and db_file.lower() == target_basename:
-                                download_link = db_url
-                                break
-                    if not download_link:
-                        for cat, files in local_links_db.items():
-                            if isinstance(files, dict):
-                                for db_file, db_url in files.items():
-                                    if isinstance(db_url, str) and db_file.lower() == target_basename:
-                                        download_link = db_url
-                                        final_download_type = cat 
-                                        break
-                            if download_link: break
-
-            # URL 类型嗅探
-            if download_link:
-                url_decoded = unquote(download_link).lower()
-                if "diffusion_models" in url_decoded: final_download_type = "diffusion_models"
-                elif "text_encoders" in url_decoded: final_download_type = "text_encoders"
-                elif "/vae/" in url_decoded or "/vae." in url_decoded: final_download_type = "vae"
-                elif "lora" in url_decoded: final_download_type = "loras"
-                elif "/unet/" in url_decoded: final_download_type = "unet"
-                elif "/clip/" in url_decoded: final_download_type = "clip"
-
-                if "/" in norm_val:
-                    sub_folder = os.path.dirname(norm_val)
-                    if sub_folder and sub_folder not in final_download_type:
-                        final_download_type = f"{final_download_type}/{sub_folder}"
-
-            results.append({
-                "id": item.get("id"), "widget_name": widget_type, "old_value": current_val,
-                "candidates": candidates, "download_url": download_link, "model_type": final_download_type
-            })
-                
-        return web.json_response({"fixed": results})
+        for item in ctx["queries"]:
+            classified = classify_query(item, timer)
+            if classified is None: continue
+            result, stamp, hit = fix_query(ctx, item, *classified, timer)
+            stamps.append(stamp)
+            hits += hit
+            if result is not None: results.append(result)
+
+        # 工作流与相关文件均未变化时返回 304，前端沿用上次结果
+        stale_roots = model_index.stale_roots()
+        etag = make_etag((ctx["request_key"], [r["root"] for r in stale_roots]), stamps)
+        timer.finish(queries=len(ctx["queries"]), results=len(results), cache_hits=hits)
+        if etag in request.headers.get("If-None-Match", ""):
+            metrics.inc("fix_not_modified_total")
+            return web.Response(status=304, headers={"ETag": etag})
+        # 有根目录扫描超时时附带说明：这些目录下的结果可能不完整
+        payload = {"fixed": results, "stale_roots": stale_roots} if stale_roots else {"fixed": results}
+        return web.json_response(payload, headers={"ETag": etag})
+    except Exception as e:
+        metrics.inc("fix_errors_total")
+        return web.json_response({"fixed": [], "error": str(e)})
+
+async def handle_fix_stream(request, json_data, timer):
+    # NDJSON 流式响应：每行一个 {"fixed": 结果}，末行 {"done": true, ...}；出错时输出 {"error": ...} 行
+    # 本地同名命中的条目只需查字典，先处理并优先输出可自动替换的；需要指纹/链接/近似名的条目随后逐条输出
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    async def send(obj):
+        await response.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    sent = hits = 0
+    try:
+        ctx = await prepare_fix(json_data, timer)
+        deferred, conflicts = [], []
+        for item in ctx["queries"]:
+            classified = classify_query(item, timer)
+            if classified is None: continue
+            if not model_index.lookup(os.path.basename(classified[0]).lower()):
+                deferred.append((item, classified))
+                continue
+            result, _, hit = fix_query(ctx, item, *classified, timer)
+            hits += hit
+            if result is None: continue
+            if not is_auto_fix(result):
+                conflicts.append(result)
+                continue
+            await send({"fixed": result})
+            sent += 1
+
+        for result in conflicts:
+            await send({"fixed": result})
+            sent += 1
+
+        for item, classified in deferred:
+            result, _, hit = fix_query(ctx, item, *classified, timer)
+            hits += hit
+            if result is None: continue
+            await send({"fixed": result})
+            sent += 1
+
+        timer.finish(queries=len(ctx["queries"]), results=sent, cache_hits=hits, stream=True)
+        await send({"done": True, "queries": len(ctx["queries"]), "results": sent, "stale_roots": model_index.stale_roots()})
+    except ConnectionResetError:
+        # 前端已断开（如关闭页面），无需再输出
+        return response
     except Exception as e:
-        return web.json_response({"fixed": [], "error": str(e)})
\ No newline at end of file
+        metrics.inc("fix_errors_total")
+        try: await send({"error": str(e)})
+        except Exception: pass
+    await response.write_eof()
+    return response
@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+from .core_utils import parse_hf_url
+from .config import (
+    DOWNLOAD_MIRRORS, DOWNLOAD_SOURCE_TEMPLATES, DOWNLOAD_PROBE_BIAS, DOWNLOAD_FAILOVER_MIN_SPEED,
+    DOWNLOAD_FAILOVER_WINDOW, DOWNLOAD_FAILOVER_GRACE, DOWNLOAD_FAILOVER_ERRORS, DOWNLOAD_SOURCE_COOLDOWN
+)
+from .metrics import metrics
+
+# 下载源层：一个模型链接展开为多个候选端点（源站 / 镜像 / 内网缓存），
+# 探测后按延迟排序，下载中途在出错或过慢时依次切换到下一个端点
+
+class SlowSourceError(Exception):
+    # 当前端点速度持续低于阈值，换下一个端点（不计入重试次数）
+    pass
+
+def endpoint_of(url):
+    # 以 host:port 区分端点，同一主机上的多个缓存服务分别计分
+    return urlsplit(url).netloc
+
+def _rebase(url, base):
+    parts = urlsplit(url)
+    return base.rstrip("/") + parts.path + (f"?{parts.query}" if parts.query else "")
+
+def candidate_urls(url, source):
+    # 按来源偏好排序：选择镜像时镜像在前，选择 ModelScope 时模板地址在前，其余以源站在前
+    origin = url.replace("/blob/", "/resolve/")
+    host = urlsplit(origin).hostname
+    mirrors = [_rebase(origin, base) for base in DOWNLOAD_MIRRORS.get(host, [])]
+    if source == "HF Mirror":
+        urls = mirrors + [origin]
+    else:
+        urls = [origin] + mirrors
+    template = DOWNLOAD_SOURCE_TEMPLATES.get(source)
+    if template and host == "huggingface.co":
+        repo_id, file_path = parse_hf_url(origin)
+        if repo_id and file_path: urls.insert(0, template.format(repo=repo_id, file=file_path))
+    return list(dict.fromkeys(urls))
+
+class SourceRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cooldown = {}  # 端点 -> 冷却截止时间
+
+    def penalize(self, endpoint):
+        with self._lock:
+            self._cooldown[endpoint] = time.time() + DOWNLOAD_SOURCE_COOLDOWN
+
+    def _cooling(self, endpoint):
+        with self._lock:
+            until = self._cooldown.get(endpoint)
+            if until and until < time.time():
+                del self._cooldown[endpoint]
+                return False
+            return until is not None
+
+    def _score(self, index, result):
+        return result["latency"] + index * DOWNLOAD_PROBE_BIAS
+
+    def decided(self, results, elapsed):
+        # 已有可用端点，且尚未返回的端点即使此刻返回也赢不了它：无需再等
+        scores = [self._score(i, r) for i, r in enumerate(results) if r and r["ok"]]
+        if not scores: return all(results)
+        best = min(scores)
+        return all(r is not None or elapsed + i * DOWNLOAD_PROBE_BIAS >= best for i, r in enumerate(results))
+
+    def route(self, urls, results, probes=None):
+        # results 与 urls 一一对应：None 为未返回（超时），ok=False 且 permanent 的端点（404 / HTML 页面）直接剔除；
+        # probes 为未返回端点仍在进行的探测 {下标: future}
+        ranked = sorted((i for i, r in enumerate(results) if r and r["ok"]),
+                        key=lambda i: (self._cooling(endpoint_of(urls[i])), self._score(i, results[i])))
+        best = results[ranked[0]] if ranked else None
+        if ranked:
+            # 与最优端点大小或哈希不一致的镜像视为过期副本
+            ranked = [i for i in ranked if same_file(results[i], best)]
+        # 未及返回的端点排在探测出错（超时 / 5xx / 拒绝连接）的端点之前
+        pending = [i for i, r in enumerate(results) if r is None]
+        failed = [i for i, r in enumerate(results) if r and not r["ok"] and not r["permanent"]]
+        order = ranked + pending + failed
+        if not order: return SourceRoute(urls, self)
+        for i in ranked:
+            metrics.observe("download_source_probe_seconds", results[i]["latency"], endpoint=endpoint_of(urls[i]))
+        metrics.inc("download_source_selected_total", endpoint=endpoint_of(urls[order[0]]))
+        if ranked and len(urls) > 1:
+            print(f"🌐 [Path Fixer] 下载源: {endpoint_of(urls[order[0]])} ({best['latency'] * 1000:.0f}ms，候选 {len(order)} 个)")
+        probes = probes or {}
+        return SourceRoute([urls[i] for i in order], self, [results[i] if i in ranked else probes.get(i) for i in order], best)
+
+def same_file(result, best):
+    return result["size"] == best["size"] and not (result["sha256"] and best["sha256"] and result["sha256"] != best["sha256"])
+
+source_router = SourceRouter()
+
+class SourceRoute:
+    # 单个下载任务的端点序列，只向后切换，不回绕
+    def __init__(self, urls, router=None, probes=None, best=None):
+        self.urls = list(urls)
+        self.router = router
+        # 与 urls 对应的探测状态：结果、仍在进行的探测（future），或 None（未探测 / 探测出错）
+        self.probes = list(probes) if probes else [None] * len(self.urls)
+        self.best = best
+        self.index = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        return self.urls[self.index]
+
+    @property
+    def endpoint(self):
+        return endpoint_of(self.url)
+
+    def can_switch(self):
+        return self.index + 1 < len(self.urls)
+
+    def _verified(self, i):
+        # 探测可用且与选中端点是同一文件；选路后才返回的探测在此时取结果
+        probe = self.probes[i]
+        if probe is not None and not isinstance(probe, dict):
+            if not probe.done() or probe.cancelled(): return False
+            probe = self.probes[i] = probe.result()
+        return bool(probe and probe["ok"] and same_file(probe, self.best or probe))
+
+    def next_verified(self):
+        return next((i for i in range(self.index + 1, len(self.urls)) if self._verified(i)), None)
+
+    def watch(self):
+        # 过慢只切到探测可用的端点：未探测或探测出错的端点只作为出错时的后备
+        return ThroughputWatch(lambda: self.next_verified() is not None) if self.can_switch() else ThroughputWatch()
+
+    def failover(self, error, transient):
+        # 永久错误或过慢立即切换；临时错误在同一端点累计到阈值后切换。返回 False 时由调用方按原有重试逻辑处理
+        self.errors += 1
+        slow = isinstance(error, SlowSourceError)
+        target = self.next_verified() if slow else self.index + 1
+        if target is None or target >= len(self.urls): return False
+        if transient and not slow and self.errors < DOWNLOAD_FAILOVER_ERRORS: return False
+        if self.router: self.router.penalize(self.endpoint)
+        metrics.inc("download_failovers_total", reason="slow" if slow else "error")
+        self.index = target
+        self.errors = 0
+        return True
+
+class ThroughputWatch:
+    # 滑动窗口平均速度；建连与慢启动阶段（宽限期）不判定，判定时没有可切换的端点（can_switch）也不判定。
+    # 并发的下载共用同一条带宽：阈值按最近一个窗口内仍在传输的下载数均分
+    _live = {}
+    _live_lock = threading.Lock()
+
+    def __init__(self, can_switch=None):
+        self.can_switch = can_switch
+        self.start = time.monotonic()
+        self.samples = deque()
+
+    def _sharers(self, now):
+        with self._live_lock:
+            live = ThroughputWatch._live
+            live[self] = now
+            # 慢速下载两次读取之间可能接近一个窗口，放宽到两个窗口未再登记才视为结束
+            for watch in [w for w, seen in live.items() if now - seen > DOWNLOAD_FAILOVER_WINDOW * 2]: del live[watch]
+            return len(live)
+
+    def check(self, total_bytes):
+        if DOWNLOAD_FAILOVER_MIN_SPEED <= 0: return
+        now = time.monotonic()
+        # 不判定的下载同样占用带宽，也要登记
+        sharers = self._sharers(now)
+        if not self.can_switch: return
+        self.samples.append((now, total_bytes))
+        # 保留窗口起点之前的最后一个样本：读一块的间隔超过窗口时（慢速单线程下载）仍能算出速度
+        while len(self.samples) > 1 and now - self.samples[1][0] >= DOWNLOAD_FAILOVER_WINDOW: self.samples.popleft()
+        if now - self.start < DOWNLOAD_FAILOVER_GRACE: return
+        since, base = self.samples[0]
+        span = now - since
+        speed = (total_bytes - base) / span if span else 0
+        if span >= DOWNLOAD_FAILOVER_WINDOW / 2 and speed < DOWNLOAD_FAILOVER_MIN_SPEED / sharers and self.can_switch():
+            raise SlowSourceError(f"速度过低 {speed / 1024:.0f} KB/s")
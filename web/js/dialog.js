@@ -1,6 +1,151 @@
-import { fetchActiveDownloads, downloadModelFromServer, cancelDownloadFromServer } from "./utils.js";
+import { fetchActiveDownloads, downloadModelFromServer, cancelDownloadFromServer, materializeModelOnServer } from "./utils.js";
 
-export async function showResultDialog(uiInstance, conflicts, downloads, unknowns, onConfirm) {
+function renderUnknown(item) {
+    const div = document.createElement("div");
+    div.className = "fixer-download-box";
+
+    // 【核心增强】：针对 undefined 的友好拦截提示
+    let displayVal = item.old_value;
+    let subText = "请手动下载";
+    if (displayVal === "undefined") {
+        displayVal = "未选择模型 (undefined)";
+        subText = "节点中未选中任何模型，或者本地模型文件夹为空。";
+    }
+
+    div.innerHTML = `<span class="fixer-download-title" style="color:#aaa">❓ ${displayVal}</span><div style="font-size:12px; color:#666;">${subText}</div>`;
+    return div;
+}
+
+function renderDownload(item, activeSet) {
+    const div = document.createElement("div");
+    div.className = "fixer-download-box";
+    const justFileName = item.old_value.split(/[\\/]/).pop();
+    const safeName = justFileName.replace(/[^\w\-\.]/g, '_');
+    const isDownloading = activeSet.has(justFileName);
+
+    div.innerHTML = `
+        <span class="fixer-download-title">MISSING: ${justFileName}</span>
+        <div style="font-size:12px; color:#aaa;">目标: /models/${item.model_type}/</div>
+        <div class="fixer-btn-group" style="margin-top:5px;"></div>
+    `;
+
+    const btnGroup = div.querySelector(".fixer-btn-group");
+
+    // 下载/中断按钮
+    const dlBtn = document.createElement("button");
+    dlBtn.className = "fixer-download-btn";
+    dlBtn.id = `btn-dl-${safeName}`;
+
+    if (isDownloading) {
+        dlBtn.textContent = "❌ 中断下载";
+        dlBtn.style.background = "#d32f2f";
+        dlBtn.onclick = async (e) => {
+            e.preventDefault();
+            if(!confirm("确定要中断下载吗？")) return;
+            dlBtn.disabled = true;
+            dlBtn.textContent = "正在中断...";
+            const res = await cancelDownloadFromServer(justFileName);
+            if (!res.success) alert("中断失败: " + res.message);
+        };
+    } else {
+        dlBtn.textContent = "🚀 启动后台下载";
+        dlBtn.style.background = "#2a7a3b";
+        dlBtn.onclick = async (e) => {
+            e.preventDefault();
+            dlBtn.disabled = true;
+            dlBtn.textContent = "🚀 请求中...";
+            const res = await downloadModelFromServer(item.download_url, justFileName, item.model_type, item.sha256);
+            if (res.success) {
+                if (res.status === "exists") {
+                    dlBtn.textContent = "✅ 文件已存在";
+                    dlBtn.style.background = "#2a7a3b";
+                } else {
+                    if (res.warning) alert(res.warning);
+                    dlBtn.disabled = false;
+                    dlBtn.textContent = "❌ 中断下载";
+                    dlBtn.style.background = "#d32f2f";
+                    dlBtn.onclick = async () => {
+                        if(!confirm("确定要中断下载吗？")) return;
+                        await cancelDownloadFromServer(justFileName);
+                    };
+                }
+            } else {
+                dlBtn.disabled = false;
+                dlBtn.textContent = "❌ 启动失败";
+                alert(res.message);
+            }
+        };
+    }
+
+    // 复制链接按钮
+    const copyBtn = document.createElement("button");
+    copyBtn.className = "fixer-copy-btn";
+    copyBtn.textContent = "📋 复制链接";
+    copyBtn.title = item.download_url;
+
+    copyBtn.onclick = async (e) => {
+        e.preventDefault();
+        try {
+            await navigator.clipboard.writeText(item.download_url);
+            const originalText = "📋 复制链接";
+            copyBtn.textContent = "✅ 已复制";
+            copyBtn.style.background = "#2a7a3b";
+            copyBtn.style.borderColor = "#2a7a3b";
+            setTimeout(() => {
+                copyBtn.textContent = originalText;
+                copyBtn.style.background = "#444";
+                copyBtn.style.borderColor = "#666";
+            }, 1500);
+        } catch (err) {
+            prompt("复制失败，请手动复制:", item.download_url);
+        }
+    };
+
+    btnGroup.appendChild(dlBtn);
+    btnGroup.appendChild(copyBtn);
+    return div;
+}
+
+function renderConflict(item) {
+    const div = document.createElement("div");
+    div.className = "fixer-item";
+    let optionsHtml = item.candidates.map(path => `<option value="${path}">${path}</option>`).join("");
+    div.innerHTML = `<label>目标: <strong style="color:#aaa">${item.old_value}</strong></label><select id="sel-${item.id}-${item.widget_name}">${optionsHtml}</select>`;
+
+    // 模型位于其他类型目录：链接（硬链接/reflink/软链接）到加载器读取的目录，无需重新下载
+    if (item.materializable && item.materializable.length > 0) {
+        const select = div.querySelector("select");
+        const linkBtn = document.createElement("button");
+        linkBtn.className = "fixer-download-btn";
+        linkBtn.style.width = "auto";
+        linkBtn.textContent = `🔗 链接到 ${item.target_type}`;
+        linkBtn.title = "在目标目录创建链接，不占用额外空间";
+        linkBtn.onclick = async (e) => {
+            e.preventDefault();
+            const source = item.materializable.find(m => m.path === select.value) || item.materializable[0];
+            linkBtn.disabled = true;
+            linkBtn.textContent = "🔗 链接中...";
+            const res = await materializeModelOnServer(source.model_type, source.path, item.target_type, item.old_value);
+            if (res.success) {
+                const option = document.createElement("option");
+                option.value = res.path;
+                option.textContent = `${res.path} (${item.target_type})`;
+                select.appendChild(option);
+                select.value = res.path;
+                linkBtn.textContent = res.method === "exists" ? "✅ 已存在" : `✅ 已链接 (${res.method})`;
+            } else {
+                linkBtn.disabled = false;
+                linkBtn.textContent = "❌ 链接失败";
+                alert(res.message);
+            }
+        };
+        div.appendChild(linkBtn);
+    }
+    return div;
+}
+
+// 返回 { add(kind, item), finish() }：流式扫描时结果陆续到达，按分区追加并更新计数
+export async function showResultDialog(uiInstance, conflicts, downloads, unknowns, onConfirm, streaming = false) {
     const activeDownloads = await fetchActiveDownloads();
     const activeSet = new Set(activeDownloads);
 
@@ -11,153 +156,54 @@ export async function showResultDialog(uiInstance, conflicts, downloads, unknown
     const dialog = document.createElement("div");
     dialog.className = "fixer-dialog";
     
-    let title = "🔍 扫描结果";
-    if (activeSet.size > 0) title = "⏳ 正在后台下载...";
-    else if (downloads.length > 0) title = "⬇️ 发现缺失模型 (可下载)";
-    
     dialog.innerHTML = `
         <div class="fixer-notice-top">关闭页面，不影响后台模型下载！</div>
-        <h3>${title}</h3>
+        <h3></h3>
         <div class="fixer-dialog-content" id="fixer-list"></div>
         <div class="fixer-dialog-footer">
             <button class="fixer-btn-cancel" id="fixer-cancel" type="button">关闭页面</button>
-            ${conflicts.length > 0 ? '<button class="fixer-btn-confirm" id="fixer-confirm" type="button">确认修复</button>' : ''}
+            <button class="fixer-btn-confirm" id="fixer-confirm" type="button" style="display:none">确认修复</button>
         </div>
     `;
 
+    const titleElement = dialog.querySelector("h3");
     const listContainer = dialog.querySelector("#fixer-list");
+    const confirmBtn = dialog.querySelector("#fixer-confirm");
 
-    if (unknowns.length > 0) {
-        const unTitle = document.createElement("div");
-        unTitle.className = "fixer-section-title";
-        unTitle.textContent = `未收录模型 (${unknowns.length})`;
-        listContainer.appendChild(unTitle);
-        unknowns.forEach(item => {
-            const div = document.createElement("div");
-            div.className = "fixer-download-box";
-            
-            // 【核心增强】：针对 undefined 的友好拦截提示
-            let displayVal = item.old_value;
-            let subText = "请手动下载";
-            if (displayVal === "undefined") {
-                displayVal = "未选择模型 (undefined)";
-                subText = "节点中未选中任何模型，或者本地模型文件夹为空。";
-            }
-            
-            div.innerHTML = `<span class="fixer-download-title" style="color:#aaa">❓ ${displayVal}</span><div style="font-size:12px; color:#666;">${subText}</div>`;
-            listContainer.appendChild(div);
-        });
-    }
-
-    if (downloads.length > 0) {
-        const dlTitle = document.createElement("div");
-        dlTitle.className = "fixer-section-title";
-        dlTitle.textContent = `缺失模型 (${downloads.length})`;
-        listContainer.appendChild(dlTitle);
-
-        downloads.forEach(item => {
-            const div = document.createElement("div");
-            div.className = "fixer-download-box";
-            const justFileName = item.old_value.split(/[\\/]/).pop();
-            const safeName = justFileName.replace(/[^\w\-\.]/g, '_');
-            const isDownloading = activeSet.has(justFileName);
-
-            div.innerHTML = `
-                <span class="fixer-download-title">MISSING: ${justFileName}</span>
-                <div style="font-size:12px; color:#aaa;">目标: /models/${item.model_type}/</div>
-                <div class="fixer-btn-group" style="margin-top:5px;"></div>
-            `;
-            
-            const btnGroup = div.querySelector(".fixer-btn-group");
-            
-            // 下载/中断按钮
-            const dlBtn = document.createElement("button");
-            dlBtn.className = "fixer-download-btn";
-            dlBtn.id = `btn-dl-${safeName}`;
-
-            if (isDownloading) {
-                dlBtn.textContent = "❌ 中断下载";
-                dlBtn.style.background = "#d32f2f";
-                dlBtn.onclick = async (e) => {
-                    e.preventDefault();
-                    if(!confirm("确定要中断下载吗？")) return;
-                    dlBtn.disabled = true;
-                    dlBtn.textContent = "正在中断...";
-                    const res = await cancelDownloadFromServer(justFileName);
-                    if (!res.success) alert("中断失败: " + res.message);
-                };
-            } else {
-                dlBtn.textContent = "🚀 启动后台下载";
-                dlBtn.style.background = "#2a7a3b";
-                dlBtn.onclick = async (e) => {
-                    e.preventDefault();
-                    dlBtn.disabled = true;
-                    dlBtn.textContent = "🚀 请求中...";
-                    const res = await downloadModelFromServer(item.download_url, justFileName, item.model_type);
-                    if (res.success) {
-                        if (res.status === "exists") {
-                            dlBtn.textContent = "✅ 文件已存在";
-                            dlBtn.style.background = "#2a7a3b";
-                        } else {
-                            dlBtn.disabled = false;
-                            dlBtn.textContent = "❌ 中断下载";
-                            dlBtn.style.background = "#d32f2f";
-                            dlBtn.onclick = async () => {
-                                if(!confirm("确定要中断下载吗？")) return;
-                                await cancelDownloadFromServer(justFileName);
-                            };
-                        }
-                    } else {
-                        dlBtn.disabled = false;
-                        dlBtn.textContent = "❌ 启动失败";
-                        alert(res.message);
-                    }
-                };
-            }
-            
-            // 复制链接按钮
-            const copyBtn = document.createElement("button");
-            copyBtn.className = "fixer-copy-btn";
-            copyBtn.textContent = "📋 复制链接";
-            copyBtn.title = item.download_url;
-            
-            copyBtn.onclick = async (e) => {
-                e.preventDefault();
-                try {
-                    await navigator.clipboard.writeText(item.download_url);
-                    const originalText = "📋 复制链接";
-                    copyBtn.textContent = "✅ 已复制";
-                    copyBtn.style.background = "#2a7a3b";
-                    copyBtn.style.borderColor = "#2a7a3b";
-                    setTimeout(() => {
-                        copyBtn.textContent = originalText;
-                        copyBtn.style.background = "#444";
-                        copyBtn.style.borderColor = "#666";
-                    }, 1500);
-                } catch (err) {
-                    prompt("复制失败，请手动复制:", item.download_url);
-                }
-            };
+    const updateTitle = () => {
+        let title = "🔍 扫描结果";
+        if (activeSet.size > 0) title = "⏳ 正在后台下载...";
+        else if (downloads.length > 0) title = "⬇️ 发现缺失模型 (可下载)";
+        if (streaming) title += " · 扫描中...";
+        titleElement.textContent = title;
+        confirmBtn.style.display = conflicts.length > 0 ? "" : "none";
+    };
 
-            btnGroup.appendChild(dlBtn);
-            btnGroup.appendChild(copyBtn);
-            listContainer.appendChild(div);
-        });
-    }
+    const makeSection = (label, list, render) => {
+        const section = document.createElement("div");
+        const sectionTitle = document.createElement("div");
+        sectionTitle.className = "fixer-section-title";
+        section.appendChild(sectionTitle);
+        listContainer.appendChild(section);
+        const refresh = () => {
+            sectionTitle.textContent = `${label} (${list.length})`;
+            section.style.display = list.length > 0 ? "" : "none";
+        };
+        list.forEach(item => section.appendChild(render(item)));
+        refresh();
+        return (item) => {
+            list.push(item);
+            section.appendChild(render(item));
+            refresh();
+        };
+    };
 
-    if (conflicts.length > 0) {
-        const cfTitle = document.createElement("div");
-        cfTitle.className = "fixer-section-title";
-        cfTitle.textContent = `路径冲突 (${conflicts.length})`;
-        listContainer.appendChild(cfTitle);
-        conflicts.forEach(item => {
-            const div = document.createElement("div");
-            div.className = "fixer-item";
-            let optionsHtml = item.candidates.map(path => `<option value="${path}">${path}</option>`).join("");
-            div.innerHTML = `<label>目标: <strong style="color:#aaa">${item.old_value}</strong></label><select id="sel-${item.id}-${item.widget_name}">${optionsHtml}</select>`;
-            listContainer.appendChild(div);
-        });
-    }
+    const sections = {
+        unknowns: makeSection("未收录模型", unknowns, renderUnknown),
+        downloads: makeSection("缺失模型", downloads, item => renderDownload(item, activeSet)),
+        conflicts: makeSection("路径冲突", conflicts, renderConflict),
+    };
+    updateTitle();
 
     dialog.appendChild(listContainer);
     overlay.appendChild(dialog);
@@ -172,18 +218,26 @@ export async function showResultDialog(uiInstance, conflicts, downloads, unknown
     const cancelBtn = dialog.querySelector("#fixer-cancel");
     if(cancelBtn) cancelBtn.onclick = closeDialog;
 
-    const confirmBtn = dialog.querySelector("#fixer-confirm");
-    if (confirmBtn) {
-        confirmBtn.onclick = (e) => {
-            e.preventDefault();
-            const selectionMap = new Map();
-            conflicts.forEach(item => {
-                const selectId = `sel-${item.id}-${item.widget_name}`;
-                const select = document.getElementById(selectId);
-                if (select) selectionMap.set(`${item.id}-${item.widget_name}`, select.value);
-            });
-            closeDialog();
-            onConfirm(selectionMap);
-        };
-    }
-}
\ No newline at end of file
+    confirmBtn.onclick = (e) => {
+        e.preventDefault();
+        const selectionMap = new Map();
+        conflicts.forEach(item => {
+            const selectId = `sel-${item.id}-${item.widget_name}`;
+            const select = document.getElementById(selectId);
+            if (select) selectionMap.set(`${item.id}-${item.widget_name}`, select.value);
+        });
+        closeDialog();
+        onConfirm(selectionMap);
+    };
+
+    return {
+        add(kind, item) {
+            sections[kind](item);
+            updateTitle();
+        },
+        finish() {
+            streaming = false;
+            updateTitle();
+        }
+    };
+}
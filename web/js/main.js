@@ -1,8 +1,10 @@
 import { app } from "../../../scripts/app.js";
-import { error, isModelWidget, fetchFixPaths, fetchActiveDownloads } from "./utils.js";
+import { error, log, isModelWidget, fetchFixPaths, streamFixPaths, fetchActiveDownloads } from "./utils.js";
 import { FixerUI } from "./ui.js";
 
 let cachedScanResult = { conflicts: [], downloads: [], unknowns: [] };
+// 模型部件数达到该值时改用流式匹配：边接收边自动替换，对话框逐步填充
+const STREAM_MIN_QUERIES = 200;
 
 function extractLinksFromWorkflow(graph) {
     const dynamicLinks = {}; 
@@ -36,7 +38,9 @@ function extractLinksFromWorkflow(graph) {
                     const fileName = linkMatch[1].trim();
                     const url = linkMatch[2].trim();
                     if (!dynamicLinks[currentCategory]) dynamicLinks[currentCategory] = {};
-                    dynamicLinks[currentCategory][fileName] = url;
+                    // 链接后可附带校验值：[name](url) sha256:<64位hex>，下载时用于完整性校验
+                    const hashMatch = trimmed.match(/sha256[:=\s]\s*([0-9a-fA-F]{64})/);
+                    dynamicLinks[currentCategory][fileName] = hashMatch ? { url, sha256: hashMatch[1].toLowerCase() } : url;
                 }
             }
         }
@@ -44,6 +48,15 @@ function extractLinksFromWorkflow(graph) {
     return dynamicLinks;
 }
 
+// 工作流 node.properties.models 中可能带有模型哈希，用于匹配被改名的本地文件
+function findModelHash(node, value) {
+    const models = node.properties?.models;
+    if (!Array.isArray(models)) return undefined;
+    const baseName = value.split(/[\\/]/).pop();
+    const model = models.find(m => m && typeof m.name === "string" && m.name.split(/[\\/]/).pop() === baseName);
+    return model?.hash || undefined;
+}
+
 async function executePathFix(uiInstance) {
     const graph = app.graph;
     
@@ -82,7 +95,8 @@ async function executePathFix(uiInstance) {
                         widget_name: widget.name, 
                         current_val: val, 
                         type: widget.name,
-                        node_type: node.type
+                        node_type: node.type,
+                        hash: findModelHash(node, val)
                     });
                 }
             }
@@ -95,8 +109,13 @@ async function executePathFix(uiInstance) {
         }
 
         uiInstance.setButtonState(true, "匹配中...");
+        if (queries.length >= STREAM_MIN_QUERIES) {
+            await executeStreamingFix(uiInstance, graph, queries, dynamicLinks);
+            return;
+        }
         const data = await fetchFixPaths(queries, dynamicLinks);
         const results = data.fixed || [];
+        warnStaleRoots(data.stale_roots);
 
         if (results.length === 0) {
             alert("✅ 所有模型路径均正确。");
@@ -108,16 +127,12 @@ async function executePathFix(uiInstance) {
         const conflicts = [];
         const downloads = [];
         const unknowns = [];
+        const lists = { conflicts, downloads, unknowns };
 
         results.forEach(res => {
-            if (res.candidates.length === 0) {
-                if (res.download_url) downloads.push(res);
-                else unknowns.push(res);
-            } else if (res.candidates.length === 1) {
-                autoFixes.push({ id: res.id, widget_name: res.widget_name, new_value: res.candidates[0], old_value: res.old_value });
-            } else {
-                conflicts.push(res);
-            }
+            const kind = categorizeResult(res);
+            if (kind === "auto") autoFixes.push(toAutoFix(res));
+            else lists[kind].push(res);
         });
 
         cachedScanResult = { conflicts, downloads, unknowns };
@@ -131,16 +146,7 @@ async function executePathFix(uiInstance) {
         if (conflicts.length > 0 || downloads.length > 0 || unknowns.length > 0) {
             uiInstance.setButtonState(true, "等待操作...");
             uiInstance.showResultDialog(conflicts, downloads, unknowns, (userSelectionMap) => {
-                const manualFixes = [];
-                conflicts.forEach(conflict => {
-                    const key = `${conflict.id}-${conflict.widget_name}`;
-                    const selectedPath = userSelectionMap.get(key);
-                    if (selectedPath) {
-                        manualFixes.push({ id: conflict.id, widget_name: conflict.widget_name, new_value: selectedPath, old_value: conflict.old_value });
-                    }
-                });
-                applyFixes(graph, manualFixes);
-                fixedCount += manualFixes.length;
+                fixedCount += applySelections(graph, conflicts, userSelectionMap);
                 finishProcess(uiInstance, graph, fixedCount);
             });
         } else {
@@ -153,6 +159,78 @@ async function executePathFix(uiInstance) {
     }
 }
 
+// 网络盘等慢目录超时时后端先返回已有结果，这些目录下的模型可能暂未被识别
+function warnStaleRoots(staleRoots) {
+    if (!staleRoots || staleRoots.length === 0) return;
+    log("以下模型目录扫描超时，结果可能不完整:", staleRoots.map(r => `${r.root} (${r.status})`).join(", "));
+}
+
+function categorizeResult(res) {
+    if (res.candidates.length === 0) return res.download_url ? "downloads" : "unknowns";
+    // 模型只在其他类型目录：交给用户选择直接引用或链接到目标目录
+    if (res.materializable && res.materializable.length > 0) return "conflicts";
+    return res.candidates.length === 1 ? "auto" : "conflicts";
+}
+
+function toAutoFix(res) {
+    return { id: res.id, widget_name: res.widget_name, new_value: res.candidates[0], old_value: res.old_value };
+}
+
+function applySelections(graph, conflicts, userSelectionMap) {
+    const manualFixes = [];
+    conflicts.forEach(conflict => {
+        const key = `${conflict.id}-${conflict.widget_name}`;
+        const selectedPath = userSelectionMap.get(key);
+        if (selectedPath) {
+            manualFixes.push({ id: conflict.id, widget_name: conflict.widget_name, new_value: selectedPath, old_value: conflict.old_value });
+        }
+    });
+    applyFixes(graph, manualFixes);
+    return manualFixes.length;
+}
+
+// 流式匹配：后端先推送可自动替换的条目，随到随改；需要用户处理的条目出现时打开对话框并逐条追加
+async function executeStreamingFix(uiInstance, graph, queries, dynamicLinks) {
+    const conflicts = [];
+    const downloads = [];
+    const unknowns = [];
+    cachedScanResult = { conflicts, downloads, unknowns };
+
+    let fixedCount = 0;
+    let dialog = null;
+    const onConfirm = (userSelectionMap) => {
+        fixedCount += applySelections(graph, conflicts, userSelectionMap);
+        finishProcess(uiInstance, graph, fixedCount);
+    };
+
+    const { count, error: streamError, staleRoots } = await streamFixPaths(queries, dynamicLinks, (res) => {
+        const kind = categorizeResult(res);
+        if (kind === "auto") {
+            applyFixes(graph, [toAutoFix(res)]);
+            fixedCount++;
+            if (!dialog) uiInstance.setButtonState(true, `匹配中... 已修复 ${fixedCount}`);
+            return;
+        }
+        // 对话框异步创建，后续条目按到达顺序排队追加
+        if (!dialog) {
+            uiInstance.setButtonState(true, "等待操作...");
+            dialog = uiInstance.showResultDialog(conflicts, downloads, unknowns, onConfirm, true);
+        }
+        dialog = dialog.then(handle => { handle.add(kind, res); return handle; });
+    });
+
+    if (streamError) error("流式匹配出错:", streamError);
+    warnStaleRoots(staleRoots);
+    if (dialog) {
+        (await dialog).finish();
+    } else if (count === 0 && !streamError) {
+        alert("✅ 所有模型路径均正确。");
+        uiInstance.setButtonState(false);
+    } else {
+        finishProcess(uiInstance, graph, fixedCount);
+    }
+}
+
 function ensureWidgetOption(widget, targetPath) {
     if (!widget.options || !widget.options.values) return targetPath;
     const values = widget.options.values;
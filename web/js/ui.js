@@ -2,6 +2,13 @@ import { api } from "../../../scripts/api.js";
 import { injectCSS } from "./styles.js";
 import { showResultDialog } from "./dialog.js";
 
+function formatEta(seconds) {
+    const s = Math.round(seconds);
+    if (s < 60) return `${s} 秒`;
+    if (s < 3600) return `${Math.floor(s / 60)} 分 ${s % 60} 秒`;
+    return `${Math.floor(s / 3600)} 小时 ${Math.floor((s % 3600) / 60)} 分`;
+}
+
 export class FixerUI {
     
     constructor(onClickHandler) {
@@ -23,8 +30,8 @@ export class FixerUI {
         else el.classList.remove("fixer-processing");
     }
 
-    showResultDialog(conflicts, downloads, unknowns, onConfirm) {
-        showResultDialog(this, conflicts, downloads, unknowns, onConfirm);
+    showResultDialog(conflicts, downloads, unknowns, onConfirm, streaming = false) {
+        return showResultDialog(this, conflicts, downloads, unknowns, onConfirm, streaming);
     }
 
     setupStatusListener() {
@@ -52,18 +59,26 @@ export class FixerUI {
             }
         });
 
-        api.addEventListener("model_fixer_download_progress", (event) => {
-            const data = event.detail; 
-            const safeName = data.filename.replace(/[^\w\-\.]/g, '_');
-            const btn = document.getElementById(`btn-dl-${safeName}`);
-            
-            if (btn) {
+        // 后端按固定间隔合并推送所有下载的进度，只包含有变化的条目；速度与剩余时间由后端计算
+        api.addEventListener("model_fixer_download_batch", (event) => {
+            const { items = {}, done = [] } = event.detail;
+            for (const [filename, data] of Object.entries(items)) {
+                const safeName = filename.replace(/[^\w\-\.]/g, '_');
+                const btn = document.getElementById(`btn-dl-${safeName}`);
+                if (!btn) continue;
                 let pct = 0;
                 if (data.total > 0) pct = Math.round((data.current / data.total) * 100);
-                btn.textContent = `❌ 中断 (${pct}%)`;
+                const speed = data.speed > 0 ? ` · ${(data.speed / 1024 / 1024).toFixed(1)} MB/s` : "";
+                btn.textContent = `❌ 中断 (${pct}%${speed})`;
+                btn.title = data.eta != null ? `剩余约 ${formatEta(data.eta)}` : "";
                 btn.style.background = "#d32f2f";
                 btn.disabled = false;
             }
+            // 结束的下载由 model_fixer_download_status 更新按钮，这里只清掉提示
+            for (const filename of done) {
+                const btn = document.getElementById(`btn-dl-${filename.replace(/[^\w\-\.]/g, '_')}`);
+                if (btn) btn.title = "";
+            }
         });
     }
 
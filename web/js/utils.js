@@ -3,21 +3,73 @@ import { api } from "../../../scripts/api.js";
 export function error(...args) { console.error("[Path-Fixer]", ...args); }
 export function log(...args) { console.log("[Path-Fixer]", ...args); }
 
+// 上一次 /fix 的响应及其 ETag：工作流与相关模型文件都未变化时后端返回 304，直接复用
+let lastFix = { etag: null, data: null };
+
 export async function fetchFixPaths(queries, dynamicLinks = {}) {
     try {
+        const headers = { "Content-Type": "application/json" };
+        if (lastFix.etag) headers["If-None-Match"] = lastFix.etag;
         const response = await api.fetchApi("/model_path_fixer/fix", {
             method: "POST",
             body: JSON.stringify({ queries, dynamic_links: dynamicLinks }),
-            headers: { "Content-Type": "application/json" }
+            headers
         });
+        if (response.status === 304 && lastFix.data) return lastFix.data;
         if (!response.ok) throw new Error(`API Error: ${response.status}`);
-        return await response.json();
+        const data = await response.json();
+        const etag = response.headers.get("ETag");
+        lastFix = etag && !data.error ? { etag, data } : { etag: null, data: null };
+        return data;
     } catch (e) {
         error("请求后端失败:", e);
         return { fixed: [] };
     }
 }
 
+// 流式请求（NDJSON）：后端每解析出一条即推送，可自动替换的条目优先；onResult 逐条回调
+export async function streamFixPaths(queries, dynamicLinks = {}, onResult) {
+    let count = 0;
+    const handleLine = (line) => {
+        if (!line.trim()) return null;
+        const msg = JSON.parse(line);
+        if (msg.fixed) { count++; onResult(msg.fixed); }
+        return msg;
+    };
+    try {
+        const response = await api.fetchApi("/model_path_fixer/fix", {
+            method: "POST",
+            body: JSON.stringify({ queries, dynamic_links: dynamicLinks, stream: true }),
+            headers: { "Content-Type": "application/json", "Accept": "application/x-ndjson" }
+        });
+        if (!response.ok) throw new Error(`API Error: ${response.status}`);
+        if (!response.body?.getReader) {
+            // 不支持流式读取时整体解析
+            const summary = (await response.text()).split("\n").map(handleLine).find(m => m && (m.done || m.error));
+            return { count, error: summary?.error, staleRoots: summary?.stale_roots || [] };
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let summary = null;
+        while (true) {
+            const { value, done } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split("\n");
+            buffer = done ? "" : lines.pop();
+            for (const line of lines) {
+                const msg = handleLine(line);
+                if (msg && (msg.done || msg.error)) summary = msg;
+            }
+            if (done) break;
+        }
+        return { count, error: summary?.error, staleRoots: summary?.stale_roots || [] };
+    } catch (e) {
+        error("流式请求后端失败:", e);
+        return { count, error: String(e) };
+    }
+}
+
 export async function fetchActiveDownloads() {
     try {
         const response = await api.fetchApi("/model_path_fixer/active_tasks");
@@ -27,11 +79,11 @@ export async function fetchActiveDownloads() {
     } catch (e) { return []; }
 }
 
-export async function downloadModelFromServer(url, filename, modelType) {
+export async function downloadModelFromServer(url, filename, modelType, sha256) {
     try {
         const response = await api.fetchApi("/model_path_fixer/download", {
             method: "POST",
-            body: JSON.stringify({ url, model_type: modelType, source: "HF Mirror" }),
+            body: JSON.stringify({ url, model_type: modelType, source: "HF Mirror", sha256 }),
             headers: { "Content-Type": "application/json" }
         });
         if (!response.ok) throw new Error(`Network Error: ${response.status}`);
@@ -39,6 +91,18 @@ export async function downloadModelFromServer(url, filename, modelType) {
     } catch (e) { return { success: false, message: e.message }; }
 }
 
+export async function materializeModelOnServer(sourceType, sourcePath, modelType, filename) {
+    try {
+        const response = await api.fetchApi("/model_path_fixer/materialize", {
+            method: "POST",
+            body: JSON.stringify({ source_type: sourceType, source_path: sourcePath, model_type: modelType, filename }),
+            headers: { "Content-Type": "application/json" }
+        });
+        if (!response.ok) throw new Error(`Network Error: ${response.status}`);
+        return await response.json();
+    } catch (e) { return { success: false, message: e.message }; }
+}
+
 export async function cancelDownloadFromServer(filename) {
     try {
         const response = await api.fetchApi("/model_path_fixer/cancel", {